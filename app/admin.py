@@ -2,7 +2,9 @@ from django.contrib import admin
 
 from .models import (
     Announcement,
+    BeyonicEvent,
     Category,
+    CollectionRequest,
     District,
     Location,
     Order,
@@ -11,6 +13,7 @@ from .models import (
     Product,
     Shop,
     Stock,
+    StockReservation,
     User,
     OrderTracker, Contact,
 )
@@ -20,6 +23,7 @@ admin.site.register(District)
 admin.site.register(Location)
 admin.site.register(Category)
 admin.site.register(Stock)
+admin.site.register(StockReservation)
 admin.site.register(Shop)
 admin.site.register(Product)
 admin.site.register(Payment)
@@ -28,3 +32,5 @@ admin.site.register(OrderItem)
 admin.site.register(Announcement)
 admin.site.register(OrderTracker)
 admin.site.register(Contact)
+admin.site.register(BeyonicEvent)
+admin.site.register(CollectionRequest)
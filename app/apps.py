@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'app'
+
+    def ready(self):
+        # connects the receivers of the stock reservation service, pricing engine, ETA estimator,
+        # product search, typeahead index, order tracker streams and connection health checks
+        from app import (  # noqa: F401
+            db_connections,
+            eta,
+            pricing,
+            search,
+            stock,
+            suggest,
+            tracker_stream,
+        )
@@ -0,0 +1,90 @@
+"""
+Async views for the hottest read paths, routed in front of the sync ones by
+project/asgi_urls.py when the app is served over ASGI (SERVER_MODE=asgi).
+
+Django 3.2 has no async ORM, so each view awaits the existing viewset action
+(caching, filters, pagination and all) on a dedicated pool of
+ASYNC_DB_THREADS threads. Every pool thread holds at most one database
+connection, so the pool is also the connection pool of an ASGI worker, and a
+slow query ties up one pool thread instead of the event loop or the single
+thread Django keeps for sync code.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import re_path
+
+from .db_connections import check_connections
+from .views import (
+    AnnouncementViewSet,
+    CategoryViewSet,
+    OrderViewSet,
+    ProductViewSet,
+)
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+                  'delete': 'destroy'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS,
+                                           thread_name_prefix='async-db')
+        return _executor
+
+
+def run_in_pool(func, *args, **kwargs):
+    """Awaitable running func(*args, **kwargs) on a pool thread."""
+    def call():
+        # the request cycle that normally does this runs on another thread
+        close_old_connections()
+        check_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False, executor=get_executor())()
+
+
+def async_viewset_view(viewset, actions, **initkwargs):
+    """viewset.as_view(actions) as a coroutine view that renders in the pool too."""
+    view = viewset.as_view(actions, **initkwargs)
+
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def async_view(request, *args, **kwargs):
+        return await run_in_pool(respond, request, *args, **kwargs)
+
+    async_view.csrf_exempt = True
+    async_view.cls = viewset
+    return async_view
+
+
+urlpatterns = [
+    re_path(r'^products/?$',
+            async_viewset_view(ProductViewSet, LIST_ACTIONS, basename='products', detail=False),
+            name='products-list'),
+    re_path(r'^categories/?$',
+            async_viewset_view(CategoryViewSet, LIST_ACTIONS, basename='categories', detail=False),
+            name='categories-list'),
+    re_path(r'^announcements/?$',
+            async_viewset_view(AnnouncementViewSet, LIST_ACTIONS, basename='announcements',
+                               detail=False),
+            name='announcements-list'),
+    re_path(r'^orders/(?P<pk>[^/.]+)/?$',
+            async_viewset_view(OrderViewSet, DETAIL_ACTIONS, basename='orders', detail=True),
+            name='orders-detail'),
+]
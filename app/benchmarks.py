@@ -0,0 +1,166 @@
+"""
+Endpoint benchmarks.
+
+Every viewset registered on the API router gets a list, a detail and a create
+scenario (orders also a keyset paginated list). run_scenarios() plays each
+one through the test client against the current database, meant to be
+seeded by seed_benchmark_data. It reports latency percentiles and queries
+per request. Creates run in a transaction that is rolled back, and the
+catalog cache is bypassed so every request does its full work.
+
+Results are saved as JSON baselines. compare() flags a scenario that runs
+more queries than its baseline, or whose p95 latency grew by more than the
+tolerance.
+"""
+import math
+import random
+import statistics
+import time
+import uuid
+
+from django.core.validators import RegexValidator
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from .catalog import bump_catalog_version
+from .models import User
+from .soft_delete import alive_unique_fields
+
+API_ROOT = '/api/v1/'
+# extra list scenarios, on top of one plain list per viewset
+EXTRA_LISTS = {'orders': ['pagination=keyset']}
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Scenario:
+
+    def __init__(self, name, method, path, payload=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.payload = payload
+
+    def request(self, client):
+        if self.method == 'post':
+            with transaction.atomic():
+                response = client.post(self.path, self.payload(), format='json')
+                transaction.set_rollback(True)
+            return response
+        return client.get(self.path)
+
+
+def unique_value(model_field, value):
+    """A value for a unique field that does not collide with value."""
+    if any(isinstance(validator, RegexValidator) for validator in model_field.validators):
+        # the only validated unique strings are phone numbers
+        return '07' + ''.join(random.choices('0123456789', k=8))
+    suffix = '-' + uuid.uuid4().hex[:8]
+    return str(value)[:(model_field.max_length or 255) - len(suffix)] + suffix
+
+
+def create_payload(serializer_class, instance):
+    """Builds create payloads copied from instance, with fresh values for its unique fields."""
+    data = serializer_class(instance).data
+    fields = serializer_class().fields
+    model_fields = {field.name: field for field in instance._meta.concrete_fields}
+    unique_together = {name for names in instance._meta.unique_together for name in names}
+    alive_unique = alive_unique_fields(type(instance))
+
+    def payload():
+        values = {}
+        for name, field in fields.items():
+            if field.read_only or name == 'id' or data.get(name) is None:
+                continue
+            if isinstance(field, (serializers.ManyRelatedField, serializers.FileField)):
+                continue
+            model_field = model_fields.get(field.source)
+            if model_field is not None and (model_field.unique or field.source in alive_unique):
+                values[name] = unique_value(model_field, data[name])
+            elif field.source in unique_together and isinstance(model_field, models.IntegerField):
+                # e.g. the number of an order tracker, unique per order
+                values[name] = random.randrange(10 ** 6, 10 ** 9)
+            else:
+                values[name] = data[name]
+        return values
+    return payload
+
+
+def build_scenarios(registry=None):
+    if registry is None:
+        from .urls import router
+        registry = router.registry
+    scenarios = []
+    for prefix, viewset, basename in registry:
+        list_path = '{}{}/'.format(API_ROOT, prefix)
+        scenarios.append(Scenario(basename + '-list', 'get', list_path))
+        for query in EXTRA_LISTS.get(prefix, []):
+            scenarios.append(Scenario('{}-list?{}'.format(basename, query), 'get',
+                                      '{}?{}'.format(list_path, query)))
+        model = viewset.serializer_class.Meta.model
+        instance = model._default_manager.order_by('pk').first()
+        if instance is None:
+            continue
+        detail_path = '{}{}/'.format(list_path, instance.pk)
+        scenarios.append(Scenario(basename + '-detail', 'get', detail_path))
+        scenarios.append(Scenario(basename + '-create', 'post', list_path,
+                                  create_payload(viewset.serializer_class, instance)))
+    return scenarios
+
+
+def benchmark_user():
+    user = User.objects.filter(username='benchmark').first()
+    if user is None:
+        user = User.objects.create(username='benchmark', role=User.ADMIN, is_staff=True,
+                                   phone='0700000000')
+    return user
+
+
+def run_scenarios(scenarios, iterations=20, warmup=2, user=None):
+    """{scenario name: {status, p50_ms, p95_ms, p99_ms, queries}}"""
+    client = APIClient()
+    client.force_authenticate(user or benchmark_user())
+    results = {}
+    for scenario in scenarios:
+        latencies = []
+        queries = []
+        statuses = set()
+        for i in range(warmup + iterations):
+            bump_catalog_version()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = scenario.request(client)
+                elapsed = time.perf_counter() - started
+            if i >= warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(len(captured))
+                statuses.add(response.status_code)
+        latencies.sort()
+        results[scenario.name] = {
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries': int(statistics.median(queries)),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Regression messages for the scenarios of results that are in baseline."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append('{}: {} queries, baseline {}'.format(
+                name, result['queries'], base['queries']))
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {:.1f} ms, baseline {:.1f} ms'.format(
+                name, result['p95_ms'], base['p95_ms']))
+    return regressions
@@ -0,0 +1,380 @@
+"""
+Bulk writes.
+
+BulkViewSetMixin adds /<prefix>/bulk to a viewset: POST creates, PATCH
+updates and DELETE (soft) deletes a JSON array of rows, at most
+BULK_MAX_ROWS of them. Every row is validated by the viewset's serializer,
+whose related pk fields look their ids up with one in_bulk() query per field
+for the whole array, as its unique fields do their values. If any row is
+invalid nothing is written and the errors are reported per row index.
+Otherwise the rows are written with bulk_create/bulk_update in a single
+transaction. PATCH reads its rows with select_for_update() in that same
+transaction, so a concurrent write to them (say a checkout reserving stock)
+waits instead of being overwritten.
+
+bulk_create, bulk_update and queryset updates send no signals, so
+bulk_create_instances() and after_bulk_save() do in bulk what the post_save
+receivers do for one row: initial contacts, one active contact/location per
+customer, order totals and current trackers, tracker events, collection
+requests, stock settlement, the catalog version and the search, suggest
+and ETA caches.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.validators import UniqueValidator
+
+from . import eta, search, suggest, tracker_stream
+from .catalog import bump_catalog_version
+from .models import (
+    ActiveFlagMixin,
+    Category,
+    CollectionRequest,
+    Contact,
+    Location,
+    Order,
+    OrderItem,
+    OrderTracker,
+    Payment,
+    Product,
+    Shop,
+    Stock,
+    User,
+)
+from .pricing import recompute_totals
+from .soft_delete import SoftDeleteViewSetMixin
+from .stock import fulfil_stock, release_stock
+
+BATCH_SIZE = 1000
+CATALOG_MODELS = (Product, Category, Shop, Stock)
+
+
+def bulk_create_instances(groups, batch_size=BATCH_SIZE):
+    """
+    Inserts {model: instances} with one bulk_create per model, in the given
+    order (referenced models first), with the side effects of their
+    receivers. Customers get their initial contact. Runs in one transaction.
+    """
+    groups = dict(groups)
+    contacts = [Contact(phone=user.phone, customer=user) for user in groups.get(User, [])
+                if user.role == User.CUSTOMER]
+    if contacts:
+        groups[Contact] = contacts + groups.get(Contact, [])
+    with transaction.atomic():
+        for model, instances in groups.items():
+            if issubclass(model, ActiveFlagMixin):
+                model.objects.activate_latest(instances)
+            model.objects.bulk_create(instances, batch_size=batch_size)
+        for model, instances in groups.items():
+            after_bulk_save(model, instances, created=True)
+    return groups
+
+
+def after_bulk_save(model, instances, created=False):
+    """The post_save receivers of model, once for all instances."""
+    pks = [instance.pk for instance in instances]
+    if not pks:
+        return
+    if model is OrderTracker:
+        Order.objects.filter(pk__in=moved_order_ids(instances)).refresh_current_tracker()
+        if created:
+            for tracker in instances:
+                tracker_stream.publish_tracker(OrderTracker, tracker, created=True)
+    elif model is OrderItem:
+        recompute_totals(Order.objects.filter(pk__in=moved_order_ids(instances)))
+    elif model is Payment and created:
+        CollectionRequest.objects.bulk_create([
+            CollectionRequest(payment=payment, phonenumber=payment.momo_phone_number,
+                              amount=payment.amount, description='Order ' + str(payment.order_id))
+            for payment in instances
+            if payment.payment_method == Payment.MOMO and payment.momo_phone_number])
+    elif model is Order and not created:
+        # new orders hold no reservations yet
+        for order in instances:
+            if order.status in (Order.CANCELLED, Order.REJECTED):
+                release_stock(order)
+            elif order.status == Order.DELIVERED:
+                fulfil_stock(order)
+
+    if model in CATALOG_MODELS:
+        bump_catalog_version()
+    if model in (Product, Category, Shop):
+        lookup = 'pk' if model is Product else model._meta.model_name
+        search.refresh_search_vectors(Product.objects.filter(**{lookup + '__in': pks}))
+        search.invalidate_index()
+    if model in suggest.KINDS:
+        suggest.invalidate_index()
+    if model is Location:
+        eta.refresh_districts({location.district_id for location in instances} |
+                              {getattr(location, '_loaded_district_id', None)
+                               for location in instances})
+
+
+def moved_order_ids(instances):
+    """The orders of items/trackers, with the ones they were loaded on if they moved."""
+    order_ids = set()
+    for instance in instances:
+        order_ids |= {instance.order_id, getattr(instance, '_loaded_order_id', None)}
+        instance._loaded_order_id = instance.order_id
+    return order_ids - {None}
+
+
+class PrefetchedQuerySet:
+    """Stands in for a related field's queryset, answering get(pk=) from one in_bulk() result."""
+
+    def __init__(self, model, objects):
+        self.model = model
+        self.objects = objects
+
+    def get(self, pk):
+        try:
+            key = self.model._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise ValueError(pk)
+        try:
+            return self.objects[key]
+        except (KeyError, TypeError):
+            raise self.model.DoesNotExist
+
+
+def prefetch_related_fields(serializer, rows):
+    """Points the writable pk fields of serializer at the rows' objects, one query per field."""
+    for name, field in serializer.fields.items():
+        if field.read_only:
+            continue
+        relation = field
+        if isinstance(field, serializers.ManyRelatedField):
+            relation = field.child_relation
+        if not isinstance(relation, serializers.PrimaryKeyRelatedField):
+            continue
+        queryset = relation.get_queryset()
+        keys = set()
+        for row in rows:
+            if not isinstance(row, dict) or row.get(name) is None:
+                continue
+            for value in row[name] if isinstance(row[name], list) else [row[name]]:
+                try:
+                    keys.add(queryset.model._meta.pk.to_python(value))
+                except (DjangoValidationError, TypeError):
+                    pass
+        keys.discard(None)
+        relation.queryset = PrefetchedQuerySet(queryset.model, queryset.in_bulk(keys))
+
+
+class PrefetchedUniqueValidator:
+    """
+    Stands in for a UniqueValidator, checking against the values taken in the
+    database, fetched with one query, and by the rows validated before.
+    """
+    requires_context = True
+
+    def __init__(self, validator, taken):
+        self.message = validator.message
+        self.taken = taken
+
+    def __call__(self, value, serializer_field):
+        instance = getattr(serializer_field.parent, 'instance', None)
+        owner = self.taken.get(value)
+        if value in self.taken and (instance is None or owner != instance.pk):
+            raise ValidationError(self.message, code='unique')
+        self.taken[value] = instance.pk if instance is not None else None
+
+
+def prefetch_unique_fields(serializer, rows):
+    """Swaps the exact UniqueValidators of serializer for prefetched ones, one query per field."""
+    for name, field in serializer.fields.items():
+        if field.read_only:
+            continue
+        validators = field.validators
+        if not any(isinstance(validator, UniqueValidator) and validator.lookup == 'exact'
+                   for validator in validators):
+            continue
+        values = set()
+        for row in rows:
+            if isinstance(row, dict) and row.get(name) is not None:
+                try:
+                    values.add(field.to_internal_value(row[name]))
+                except ValidationError:
+                    pass
+        source = field.source_attrs[-1]
+        field.validators = [
+            PrefetchedUniqueValidator(validator, dict(validator.queryset.filter(
+                **{source + '__in': values}).values_list(source, 'pk')))
+            if isinstance(validator, UniqueValidator) and validator.lookup == 'exact'
+            else validator
+            for validator in validators]
+
+
+class BulkViewSetMixin:
+    """POST, PATCH and DELETE of a JSON array on /<prefix>/bulk, see the module docstring."""
+    # the order PATCH locks its rows in, to match other writers and not deadlock with them
+    bulk_lock_ordering = ('pk',)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of rows.']})
+        if len(rows) > settings.BULK_MAX_ROWS:
+            raise ValidationError({'non_field_errors': [
+                'At most {} rows per request.'.format(settings.BULK_MAX_ROWS)]})
+        if request.method == 'DELETE':
+            return self.bulk_destroy(rows)
+        if request.method == 'PATCH':
+            return self.bulk_update(rows)
+        return self.bulk_create(rows)
+
+    def bulk_create(self, rows):
+        serializer = self.get_serializer(many=True).child
+        validated, errors = self.validate_rows(serializer, rows, [None] * len(rows))
+        if errors:
+            return self.row_errors_response(errors)
+        model = serializer.Meta.model
+        to_many = self.to_many_sources(serializer)
+        instances = [model(**{key: value for key, value in data.items() if key not in to_many})
+                     for data in validated]
+        with transaction.atomic():
+            self.perform_bulk_create(instances)
+            self.set_to_many(instances, validated, to_many)
+        return Response({'count': len(instances), 'ids': [instance.pk for instance in instances]},
+                        status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, rows):
+        # the rows are locked from read to write, so no concurrent update in between is lost
+        with transaction.atomic():
+            return self.locked_bulk_update(rows)
+
+    def locked_bulk_update(self, rows):
+        serializer = self.get_serializer(many=True, partial=True).child
+        # not in_bulk(), which drops the ordering
+        locked = self.get_queryset().select_for_update(of=('self',)).filter(
+            pk__in=self.row_keys(rows)).order_by(*self.bulk_lock_ordering)
+        found = {instance.pk: instance for instance in locked}
+        instances = []
+        errors = []
+        seen = set()
+        for index, row in enumerate(rows):
+            key = self.row_key(row)
+            if key not in found:
+                errors.append({'index': index, 'errors': {'id': ['Not found.']}})
+            elif key in seen:
+                errors.append({'index': index, 'errors': {'id': ['Duplicate row.']}})
+            seen.add(key)
+            instances.append(found.get(key))
+        if errors:
+            return self.row_errors_response(errors)
+        validated, errors = self.validate_rows(serializer, rows, instances)
+        if errors:
+            return self.row_errors_response(errors)
+
+        to_many = self.to_many_sources(serializer)
+        fields = set()
+        for instance, data in zip(instances, validated):
+            for key, value in data.items():
+                if key not in to_many:
+                    setattr(instance, key, value)
+                    fields.add(key)
+        self.perform_bulk_update(instances, validated, fields)
+        self.set_to_many(instances, validated, to_many)
+        return Response({'count': len(instances), 'ids': [instance.pk for instance in instances]})
+
+    def bulk_destroy(self, rows):
+        found = self.get_queryset().in_bulk(self.row_keys(rows))
+        errors = [{'index': index, 'errors': {'id': ['Not found.']}}
+                  for index, row in enumerate(rows) if self.row_key(row) not in found]
+        if errors:
+            return self.row_errors_response(errors)
+        with transaction.atomic():
+            self.perform_bulk_destroy(list(found.values()))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def perform_bulk_create(self, instances):
+        model = self.get_serializer_class().Meta.model
+        try:
+            bulk_create_instances({model: instances})
+        except IntegrityError as exc:
+            raise ValidationError({'non_field_errors': ['Rows conflict with stored data: {}'.format(
+                exc)]})
+
+    def perform_bulk_update(self, instances, validated, fields):
+        model = self.get_serializer_class().Meta.model
+        if not fields:
+            return
+        if issubclass(model, ActiveFlagMixin) and 'is_active' in fields:
+            activating = [instance for instance, data in zip(instances, validated)
+                          if data.get('is_active')]
+            model.objects.activate_latest(activating)
+            # the other rows of those customers were just switched off in the database
+            customers = {instance.customer_id for instance in activating}
+            winners = {instance.pk for instance in activating if instance.is_active}
+            for instance in instances:
+                if instance.customer_id in customers and instance.pk not in winners:
+                    instance.is_active = False
+        now = timezone.now()
+        for instance in instances:
+            instance.updated_at = now
+        try:
+            model.objects.bulk_update(instances, fields | {'updated_at'}, batch_size=BATCH_SIZE)
+        except IntegrityError as exc:
+            raise ValidationError({'non_field_errors': ['Rows conflict with stored data: {}'.format(
+                exc)]})
+        after_bulk_save(model, instances)
+
+    def perform_bulk_destroy(self, instances):
+        model = self.get_serializer_class().Meta.model
+        queryset = model._default_manager.filter(pk__in=[instance.pk for instance in instances])
+        if isinstance(self, SoftDeleteViewSetMixin):
+            queryset.soft_delete()
+            after_bulk_save(model, instances)
+        else:
+            queryset.delete()
+
+    def validate_rows(self, serializer, rows, instances):
+        """(validated data, [{index, errors}]) of every row, validated by one child serializer."""
+        prefetch_related_fields(serializer, rows)
+        prefetch_unique_fields(serializer, rows)
+        validated = []
+        errors = []
+        for index, (row, instance) in enumerate(zip(rows, instances)):
+            serializer.instance = instance
+            try:
+                validated.append(serializer.run_validation(row))
+            except ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+        serializer.instance = None
+        return validated, errors
+
+    def row_errors_response(self, errors):
+        return Response({
+            'status_code': status.HTTP_400_BAD_REQUEST,
+            'type': 'validation_error',
+            'params': ['rows'],
+            'messages': ['{} invalid row(s), nothing was written'.format(len(errors))],
+            'rows': errors,
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    def row_key(self, row):
+        """The pk of a row given as {"id": pk} or as the bare pk, None when it is not one."""
+        value = row.get('id') if isinstance(row, dict) else row
+        try:
+            return self.get_serializer_class().Meta.model._meta.pk.to_python(value)
+        except (DjangoValidationError, TypeError):
+            return None
+
+    def row_keys(self, rows):
+        return {key for key in map(self.row_key, rows) if key is not None}
+
+    def to_many_sources(self, serializer):
+        return {field.source for field in serializer.fields.values()
+                if isinstance(field, serializers.ManyRelatedField) and not field.read_only}
+
+    def set_to_many(self, instances, validated, to_many):
+        # like ModelSerializer.create/update, one query per row that sends such a list
+        for instance, data in zip(instances, validated):
+            for source in to_many & set(data):
+                getattr(instance, source).set(data[source])
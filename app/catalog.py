@@ -0,0 +1,85 @@
+"""
+Versioned cache for the product catalog (products, categories and shops).
+
+Every catalog write bumps a single version token, so cached responses never
+need to be invalidated one by one: they simply stop being looked up.
+
+The token must be seen by every process that writes the catalog: gunicorn
+workers, the Wagtail admin and management commands. A shared cache
+(memcached, redis) keeps it until the next bump. A process-local
+LocMemCache cannot see the bumps of other processes, so there the token
+expires after CATALOG_VERSION_TIMEOUT seconds, which bounds how long
+another process serves an outdated catalog.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def catalog_version_timeout():
+    if isinstance(caches['default'], LocMemCache):
+        return settings.CATALOG_VERSION_TIMEOUT
+    return None
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, catalog_version_timeout())
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(sender=None, **kwargs):
+    """post_save/post_delete receiver for every model the catalog renders."""
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, catalog_version_timeout())
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class CatalogCacheMixin:
+    """
+    Serves list and detail responses from the catalog cache with a strong ETag.
+    A request carrying a matching If-None-Match gets a 304 without touching
+    the database or the serializer.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, view, *args, **kwargs):
+        # only plain JSON is cached, the browsable API renders per user
+        if request.accepted_renderer.format != 'json':
+            return view(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        url = request.build_absolute_uri()
+        etag = '"%s"' % hashlib.sha1('{}:{}'.format(version, url).encode('utf-8')).hexdigest()
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache_key = 'catalog:{}:{}'.format(version, hashlib.sha1(url.encode('utf-8')).hexdigest())
+        data = cache.get(cache_key)
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(cache_key, data, settings.CATALOG_CACHE_TIMEOUT)
+        return Response(data, headers={'ETag': etag})
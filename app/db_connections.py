@@ -0,0 +1,93 @@
+"""
+Persistent connection health checks and reuse metrics.
+
+With CONN_MAX_AGE > 0 a thread keeps its database connection from one request
+to the next. check_connections() runs as every request starts (and before
+every async view's pool task): a connection carried over from an earlier
+request is pinged first, and closed if the server dropped it, so the request
+reconnects instead of failing. It also counts reused connections against
+newly opened ones for /api/v1/metrics/db.
+"""
+import threading
+
+from django.conf import settings
+from django.core import checks
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+class ConnectionStats:
+    """Per process counters, safe to update from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.opened = 0
+            self.reused = 0
+            self.failed_checks = 0
+
+    def incr(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self.lock:
+            total = self.opened + self.reused
+            return {
+                'opened': self.opened,
+                'reused': self.reused,
+                'failed_health_checks': self.failed_checks,
+                'reuse_rate': round(self.reused / total, 4) if total else None,
+            }
+
+
+stats = ConnectionStats()
+
+
+def count_opened(sender, connection, **kwargs):
+    stats.incr('opened')
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if settings.DATABASE_HEALTH_CHECKS and not connection.is_usable():
+            stats.incr('failed_checks')
+            connection.close()
+        else:
+            stats.incr('reused')
+
+
+def pool_settings():
+    return {
+        'conn_max_age': settings.DATABASE_CONN_MAX_AGE,
+        'health_checks': settings.DATABASE_HEALTH_CHECKS,
+        'pgbouncer': settings.DATABASE_PGBOUNCER,
+        'workers': settings.WEB_CONCURRENCY,
+        'pool_size': settings.DATABASE_POOL_SIZE,
+    }
+
+
+@checks.register()
+def check_pool_size(app_configs, **kwargs):
+    """Warns when a worker's threads can hold more connections than its pool allows."""
+    errors = []
+    for name, threads in (('GUNICORN_THREADS', settings.GUNICORN_THREADS),
+                          ('ASYNC_DB_THREADS + 1', settings.ASYNC_DB_THREADS + 1)):
+        pool_size = settings.DATABASE_POOL_SIZE
+        if threads > pool_size:
+            errors.append(checks.Warning(
+                '{} ({}) exceeds DATABASE_POOL_SIZE ({})'.format(name, threads, pool_size),
+                hint='Raise DATABASE_MAX_CONNECTIONS or lower WEB_CONCURRENCY or the thread count.',
+                id='app.W001',
+            ))
+    return errors
+
+
+connection_created.connect(count_opened)
+request_started.connect(check_connections)
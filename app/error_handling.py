@@ -18,6 +18,14 @@ class ErrorBase(APIException, metaclass=ABCMeta):  # pragma: no cover
         self.param = param
 
 
+class InsufficientStock(ErrorBase):
+    """Raised when an order asks for more units than are left in stock."""
+
+    status_code = 409
+    default_detail = "Insufficient stock"
+    custom_error_type = "insufficient_stock"
+
+
 def exception_to_error_type(exc):  # pragma: no cover
     """Returns the type of an exception."""
     if isinstance(exc, exceptions.ValidationError):
@@ -0,0 +1,195 @@
+"""
+Delivery ETA estimation.
+
+Distances are great circle distances from the delivery origin (the shops in
+Kampala) stretched by ROAD_FACTOR. Locations without coordinates fall back to
+the centroid of their district, looked up in a matrix of origin to district
+centroid distances kept in memory, so estimating an order costs no queries
+once the order's Location is loaded. Location writes recompute the centroids
+of the districts they touch instead of dropping the matrix.
+"""
+import threading
+import time
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import District, Location, Order
+
+EARTH_RADIUS_KM = 6371.0
+ROAD_FACTOR = 1.3
+SPEED_KMH = {
+    Order.MOTORCYCLE: 25.0,
+    Order.VEHICLE: 18.0,
+}
+PREPARATION = {
+    Order.ORDINARY: timedelta(hours=2),
+    Order.EXPRESS: timedelta(minutes=30),
+}
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great circle distance, works on floats and on NumPy arrays alike."""
+    lat1, lng1, lat2, lng2 = (np.radians(value) for value in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def district_centroids(locations):
+    """{district id: (lat, lng)} averaged over the located rows of locations, in one query."""
+    return {
+        row['district']: (row['lat'], row['lng'])
+        for row in locations.filter(district__isnull=False, lat__isnull=False, lng__isnull=False)
+        .order_by().values('district').annotate(lat=Avg('lat'), lng=Avg('lng'))
+    }
+
+
+class DistanceMatrix:
+    """Road distances from the origin to each district centroid."""
+
+    def __init__(self, centroids, origin):
+        self.origin = origin
+        self.from_origin = {}
+        self.update(centroids)
+
+    @classmethod
+    def load(cls):
+        return cls(district_centroids(Location.objects.all()), settings.DELIVERY_ORIGIN)
+
+    def update(self, centroids):
+        if not centroids:
+            return
+        coordinates = np.array(list(centroids.values()), dtype=float).reshape(-1, 2)
+        distances = ROAD_FACTOR * haversine_km(self.origin[0], self.origin[1],
+                                               coordinates[:, 0], coordinates[:, 1])
+        self.from_origin.update(zip(centroids, distances.tolist()))
+
+    def drop(self, district_ids):
+        for district_id in district_ids:
+            self.from_origin.pop(district_id, None)
+
+    def origin_to(self, district_id):
+        return self.from_origin.get(district_id)
+
+
+_matrix = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_matrix():
+    """The shared matrix, loaded lazily and rebuilt every ETA_MATRIX_SECONDS."""
+    global _matrix, _loaded_at
+    with _lock:
+        if _matrix is None or time.monotonic() - _loaded_at > settings.ETA_MATRIX_SECONDS:
+            _matrix = DistanceMatrix.load()
+            _loaded_at = time.monotonic()
+        return _matrix
+
+
+def invalidate_matrix():
+    global _matrix
+    with _lock:
+        _matrix = None
+
+
+def refresh_districts(district_ids):
+    """Recomputes the centroids of some districts, those without located rows are dropped."""
+    district_ids = set(district_ids) - {None}
+    if _matrix is None or not district_ids:
+        return
+    centroids = district_centroids(Location.objects.filter(district__in=district_ids))
+    with _lock:
+        if _matrix is not None:
+            _matrix.drop(district_ids - set(centroids))
+            _matrix.update(centroids)
+
+
+def refresh_location_district(sender, instance, **kwargs):
+    """post_save/post_delete receiver of Location."""
+    refresh_districts({instance.district_id, getattr(instance, '_loaded_district_id', None)})
+    instance._loaded_district_id = instance.district_id
+
+
+def drop_district(sender, instance, **kwargs):
+    """post_delete receiver of District, its locations were moved to no district."""
+    with _lock:
+        if _matrix is not None:
+            _matrix.drop([instance.pk])
+
+
+def distance_km(location):
+    if location is None:
+        return None
+    if location.lat is not None and location.lng is not None:
+        origin = settings.DELIVERY_ORIGIN
+        return ROAD_FACTOR * float(haversine_km(origin[0], origin[1], location.lat, location.lng))
+    if location.district_id is not None:
+        return get_matrix().origin_to(location.district_id)
+    return None
+
+
+def travel_time(distance, delivery_method, delivery_speed):
+    preparation = PREPARATION.get(delivery_speed, PREPARATION[Order.ORDINARY])
+    speed = SPEED_KMH.get(delivery_method)
+    if speed is None or distance is None:
+        # pickups (and unknown destinations) only wait for the order to be packed
+        return preparation
+    return preparation + timedelta(hours=distance / speed)
+
+
+def estimate_delivery(location, delivery_method, delivery_speed, start=None):
+    """Expected delivery time to an already loaded Location, counted from start (default now)."""
+    start = start or timezone.now()
+    return start + travel_time(distance_km(location), delivery_method, delivery_speed)
+
+
+def reestimate_open_orders(batch_size=5000):
+    """Re-estimates every placed order, batch_size rows at a time with vectorized distances."""
+    rows = Order.objects.filter(status=Order.PLACED).values_list(
+        'pk', 'created_at', 'delivery_method', 'delivery_speed',
+        'location__lat', 'location__lng', 'location__district').iterator(chunk_size=batch_size)
+    updated = 0
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return updated
+        orders = reestimate(chunk)
+        Order.objects.bulk_update(orders, ['expected_delivery_date_time'], batch_size=batch_size)
+        updated += len(orders)
+
+
+def reestimate(rows):
+    pks, created, methods, speeds, lats, lngs, districts = zip(*rows)
+
+    lat = np.array([np.nan if value is None else value for value in lats], dtype=float)
+    lng = np.array([np.nan if value is None else value for value in lngs], dtype=float)
+    origin = settings.DELIVERY_ORIGIN
+    distance = ROAD_FACTOR * haversine_km(origin[0], origin[1], lat, lng)
+
+    missing = np.isnan(distance)
+    if missing.any():
+        matrix = get_matrix()
+        fallback = [matrix.origin_to(district) if district else None for district in districts]
+        distance[missing] = np.array(
+            [np.nan if value is None else value for value in fallback])[missing]
+
+    kmh = np.array([SPEED_KMH.get(method, np.nan) for method in methods])
+    travel_seconds = np.nan_to_num(distance / kmh * 3600.0, nan=0.0)
+    preparation_seconds = np.array(
+        [PREPARATION.get(speed, PREPARATION[Order.ORDINARY]).total_seconds() for speed in speeds])
+    offsets = (travel_seconds + preparation_seconds).tolist()
+
+    return [Order(pk=pk, expected_delivery_date_time=start + timedelta(seconds=offset))
+            for pk, start, offset in zip(pks, created, offsets)]
+
+
+post_save.connect(refresh_location_district, sender=Location)
+post_delete.connect(refresh_location_district, sender=Location)
+post_delete.connect(drop_district, sender=District)
@@ -0,0 +1,89 @@
+"""
+Sparse fieldsets: ?fields=id,name,price returns only those fields and
+?omit=orderitems returns everything else.
+
+SparseFieldsSerializerMixin trims the top level serializer (nested
+serializers keep their shape) and SparseFieldsViewSetMixin defers the columns
+and drops the prefetches behind the fields that were left out, so they are
+neither fetched nor serialized. Only GET requests are narrowed.
+"""
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_QUERY_PARAM = 'fields'
+OMIT_QUERY_PARAM = 'omit'
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """(fields, omit) name sets from the query string, each None when not given."""
+    if request is None or request.method != 'GET':
+        return None, None
+    return _names(request, FIELDS_QUERY_PARAM), _names(request, OMIT_QUERY_PARAM)
+
+
+def select_fields(fields, request):
+    keep, omit = requested_fields(request)
+    if keep is None and omit is None:
+        return fields
+    unknown = ((keep or set()) | (omit or set())) - set(fields)
+    if unknown:
+        raise ValidationError({'fields': 'Unknown field(s): {}'.format(', '.join(sorted(unknown)))})
+    return OrderedDict((name, field) for name, field in fields.items()
+                       if (keep is None or name in keep) and name not in (omit or ()))
+
+
+class SparseFieldsSerializerMixin:
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        return select_fields(fields, self.context.get('request'))
+
+
+class SparseFieldsViewSetMixin:
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        keep, omit = requested_fields(self.request)
+        if keep is None and omit is None:
+            return queryset
+
+        all_fields = self.get_serializer_class()(context={}).fields
+        kept = select_fields(all_fields, self.request)
+        kept_sources = {field.source.split('.')[0] for field in kept.values()}
+        dropped = {field.source.split('.')[0] for name, field in all_fields.items()
+                   if name not in kept} - kept_sources
+
+        opts = queryset.model._meta
+        select_related = queryset.query.select_related
+        columns = []
+        for name in dropped:
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if not model_field.concrete or model_field.many_to_many or model_field.primary_key:
+                continue
+            if isinstance(select_related, dict) and name in select_related:
+                continue
+            columns.append(name)
+
+        lookups = [lookup for lookup in queryset._prefetch_related_lookups
+                   if getattr(lookup, 'prefetch_through', lookup).split('__')[0] not in dropped]
+        if len(lookups) != len(queryset._prefetch_related_lookups):
+            queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+        return queryset.defer(*columns) if columns else queryset
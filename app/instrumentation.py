@@ -0,0 +1,306 @@
+"""
+Per request instrumentation.
+
+InstrumentationMiddleware measures every request against the DRF route that
+served it (the URL name, e.g. products-list) and its method: wall time,
+database queries and time, serializer time and response size. Each goes into
+a rolling log-linear histogram (HDR style: a bounded relative error at any
+magnitude, in a few dozen sparse buckets) covering the last
+INSTRUMENTATION_WINDOW_SECONDS. /api/v1/metrics renders them as Prometheus
+summaries. Requests running more than QUERY_BUDGET queries (or a view's own
+query_budget) are logged and counted.
+
+The counters of a request live in a context variable, which sync_to_async
+carries over to the threads that run its queries.
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+from .db_connections import stats as connection_stats
+
+logger = logging.getLogger(__name__)
+
+# buckets per power of two, each at most 1/SUB_BUCKETS wide relative to its value
+SUB_BUCKETS = 16
+QUANTILES = (0.5, 0.9, 0.99)
+SLOTS = 5
+UNMATCHED = 'unmatched'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name, help text and smallest distinguishable value of each histogram
+METRICS = [
+    ('request_duration_seconds', 'Wall time of the view and the middleware below it', 1e-4),
+    ('db_queries', 'Database queries run', 1),
+    ('db_duration_seconds', 'Time spent in database queries', 1e-4),
+    ('serializer_duration_seconds', 'Time spent serializing the response data', 1e-4),
+    ('response_size_bytes', 'Size of the response body', 1),
+]
+
+
+class Histogram:
+    """Counts of values in log-linear buckets, indexed sparsely."""
+
+    def __init__(self, unit):
+        self.unit = unit
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.sum = 0.0
+
+    def index(self, value):
+        scaled = value / self.unit
+        if scaled < 1:
+            return 0
+        mantissa, exponent = math.frexp(scaled)
+        return 1 + (exponent - 1) * SUB_BUCKETS + int((mantissa * 2 - 1) * SUB_BUCKETS)
+
+    def upper_bound(self, index):
+        if index == 0:
+            return self.unit
+        exponent, sub_bucket = divmod(index - 1, SUB_BUCKETS)
+        return self.unit * 2 ** exponent * (1 + (sub_bucket + 1) / SUB_BUCKETS)
+
+    def record(self, value):
+        self.counts[self.index(value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+
+    def quantile(self, q):
+        if not self.total:
+            return float('nan')
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self.upper_bound(index)
+
+
+class RollingHistogram:
+    """A Histogram of the last window seconds, kept as SLOTS histograms of window / SLOTS each."""
+
+    def __init__(self, unit, window, clock=time.monotonic):
+        self.unit = unit
+        self.slot_seconds = window / SLOTS
+        self.clock = clock
+        self.slots = {}
+        self.total = 0
+        self.sum = 0.0
+
+    def current_slot(self):
+        return int(self.clock() // self.slot_seconds)
+
+    def record(self, value):
+        slot = self.current_slot()
+        if slot not in self.slots:
+            self.slots = {s: h for s, h in self.slots.items() if s > slot - SLOTS}
+            self.slots[slot] = Histogram(self.unit)
+        self.slots[slot].record(value)
+        self.total += 1
+        self.sum += value
+
+    def window(self):
+        merged = Histogram(self.unit)
+        oldest = self.current_slot() - SLOTS
+        for slot, histogram in self.slots.items():
+            if slot > oldest:
+                merged.merge(histogram)
+        return merged
+
+
+class Registry:
+    """The histograms of every (route, method), and the query budget overruns."""
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.series = {}
+        self.over_budget = defaultdict(int)
+
+    def observe(self, route, method, values):
+        with self.lock:
+            if (route, method) not in self.series:
+                self.series[(route, method)] = {
+                    name: RollingHistogram(unit, self.window) for name, _, unit in METRICS}
+            histograms = self.series[(route, method)]
+            for name, value in values.items():
+                histograms[name].record(value)
+
+    def flag_over_budget(self, route, method):
+        with self.lock:
+            self.over_budget[(route, method)] += 1
+
+    def exposition(self):
+        """The metrics in the Prometheus text format."""
+        lines = []
+        with self.lock:
+            series = sorted(self.series.items())
+            for name, help_text, _ in METRICS:
+                lines.append('# HELP konv_{} {}'.format(name, help_text))
+                lines.append('# TYPE konv_{} summary'.format(name))
+                for (route, method), histograms in series:
+                    labels = 'route="{}",method="{}"'.format(route, method)
+                    histogram = histograms[name]
+                    window = histogram.window()
+                    for q in QUANTILES:
+                        lines.append('konv_{}{{{},quantile="{}"}} {}'.format(
+                            name, labels, q, format_value(window.quantile(q))))
+                    lines.append('konv_{}_sum{{{}}} {}'.format(
+                        name, labels, format_value(histogram.sum)))
+                    lines.append('konv_{}_count{{{}}} {}'.format(name, labels, histogram.total))
+            lines.append('# HELP konv_query_budget_exceeded_total Requests over their query budget')
+            lines.append('# TYPE konv_query_budget_exceeded_total counter')
+            for (route, method), count in sorted(self.over_budget.items()):
+                lines.append('konv_query_budget_exceeded_total{{route="{}",method="{}"}} {}'.format(
+                    route, method, count))
+        return '\n'.join(lines) + '\n'
+
+
+def format_value(value):
+    if math.isnan(value):
+        return 'NaN'
+    return repr(round(value, 6))
+
+
+registry = Registry(settings.INSTRUMENTATION_WINDOW_SECONDS)
+
+
+def exposition():
+    connections_now = connection_stats.as_dict()
+    lines = []
+    for name in ('opened', 'reused', 'failed_health_checks'):
+        lines.append('# TYPE konv_db_connections_{}_total counter'.format(name))
+        lines.append('konv_db_connections_{}_total {}'.format(name, connections_now[name]))
+    return registry.exposition() + '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        # first, so the wrappers pushed and popped by connection.execute_wrapper() stay on top
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class InstrumentedSerializerMixin:
+    """Adds the time the top level serializer spends in to_representation to the request."""
+
+    def to_representation(self, instance):
+        metrics = current_request.get()
+        if metrics is None or not self.is_top_level():
+            return super().to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_seconds += time.perf_counter() - started
+
+    def is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED, None
+    view_class = getattr(match.func, 'cls', None)
+    return match.view_name or match.route or UNMATCHED, view_class
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # marks the instance as a coroutine function for Django's handler
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, metrics, started)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, metrics, started)
+        return response
+
+    def start(self):
+        # connections opened before this module was loaded
+        for connection in connections.all():
+            install_query_recorder(connection)
+        metrics = RequestMetrics()
+        return metrics, current_request.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, started):
+        elapsed = time.perf_counter() - started
+        route, view_class = route_of(request)
+        values = {
+            'request_duration_seconds': elapsed,
+            'db_queries': metrics.queries,
+            'db_duration_seconds': metrics.db_seconds,
+            'serializer_duration_seconds': metrics.serializer_seconds,
+        }
+        if not response.streaming:
+            values['response_size_bytes'] = len(response.content)
+        registry.observe(route, request.method, values)
+
+        budget = getattr(view_class, 'query_budget', None) or settings.QUERY_BUDGET
+        if metrics.queries > budget:
+            registry.flag_over_budget(route, request.method)
+            logger.warning("%s %s ran %d queries, over its budget of %d (%s)",
+                           request.method, request.get_full_path(), metrics.queries, budget, route)
+
+
+connection_created.connect(install_query_recorder)
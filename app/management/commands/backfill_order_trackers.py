@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Order
+
+
+class Command(BaseCommand):
+    help = "Fills Order.current_tracker_number/name from the latest OrderTracker of every order"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        pks = Order.objects.order_by('pk').values_list('pk', flat=True)
+        updated, last_pk = 0, None
+        while True:
+            batch = pks.filter(pk__gt=last_pk) if last_pk else pks
+            batch = list(batch[:options['batch_size']])
+            if not batch:
+                break
+            updated += Order.objects.filter(pk__in=batch).refresh_current_tracker()
+            last_pk = batch[-1]
+            self.stdout.write("Backfilled {} orders".format(updated))
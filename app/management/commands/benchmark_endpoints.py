@@ -0,0 +1,63 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import build_scenarios, compare, run_scenarios
+from app.models import Category, Order, Product, User
+
+
+def dataset_size():
+    return {model._meta.object_name: model._default_manager.count()
+            for model in (User, Category, Product, Order)}
+
+
+class Command(BaseCommand):
+    help = ("Times the list, detail and create endpoints of every viewset against the current "
+            "database (see seed_benchmark_data) and compares them with a saved baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', default=None, help="only scenarios whose name contains this")
+        parser.add_argument('--baseline', default=None,
+                            help="JSON baseline to compare with, fails on regressions")
+        parser.add_argument('--save-baseline', default=None,
+                            help="writes the results as a baseline")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="allowed p95 latency growth over the baseline, 0.25 is 25%%")
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in build_scenarios()
+                     if not options['only'] or options['only'] in scenario.name]
+        size = dataset_size()
+        # the per request warnings of 4xx answers would bury the table
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        self.stdout.write("Dataset: " + ', '.join(
+            '{} {}'.format(count, name) for name, count in size.items()))
+        results = run_scenarios(scenarios, options['iterations'], options['warmup'])
+
+        self.stdout.write("{:<32} {:>8} {:>9} {:>9} {:>9} {:>8}".format(
+            'scenario', 'status', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+        for name, result in results.items():
+            self.stdout.write("{:<32} {:>8} {:>9.1f} {:>9.1f} {:>9.1f} {:>8}".format(
+                name, ','.join(map(str, result['status'])), result['p50_ms'], result['p95_ms'],
+                result['p99_ms'], result['queries']))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump({'dataset': size, 'results': results}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write("Saved baseline to " + options['save_baseline'])
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline['dataset'] != size:
+                self.stdout.write(self.style.WARNING(
+                    "Baseline dataset differs: {}".format(baseline['dataset'])))
+            regressions = compare(results, baseline['results'], options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against {}:\n{}".format(
+                    options['baseline'], '\n'.join(regressions)))
+            self.stdout.write(self.style.SUCCESS("No regressions against " + options['baseline']))
@@ -0,0 +1,44 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.models import Product, Shop
+from app.suggest import build_index, normalize
+
+
+class Command(BaseCommand):
+    help = "Times typeahead lookups in the in memory prefix index against icontains queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = build_index()
+        self.stdout.write("Built index of {} entries in {:.1f} ms".format(
+            len(index), (time.perf_counter() - started) * 1000))
+
+        names = list(Product.objects.values_list('name', flat=True)) + \
+            list(Shop.objects.values_list('name', flat=True))
+        if not names:
+            self.stdout.write("No products or shops to benchmark with")
+            return
+        prefixes = [normalize(name)[:random.randint(1, 4)]
+                    for name in random.choices(names, k=options['queries'])]
+        limit = options['limit']
+
+        started = time.perf_counter()
+        for prefix in prefixes:
+            index.suggest(prefix, limit)
+        index_ms = (time.perf_counter() - started) * 1000 / len(prefixes)
+
+        started = time.perf_counter()
+        for prefix in prefixes:
+            list(Product.objects.filter(name__icontains=prefix).values_list('pk', 'name')[:limit])
+            list(Shop.objects.filter(name__icontains=prefix).values_list('pk', 'name')[:limit])
+        icontains_ms = (time.perf_counter() - started) * 1000 / len(prefixes)
+
+        self.stdout.write("prefix index: {:.3f} ms per lookup".format(index_ms))
+        self.stdout.write("icontains:    {:.3f} ms per lookup".format(icontains_ms))
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import percentile
+from app.models import Order
+
+MODES = ['wsgi', 'asgi']
+READ_PATHS = ['/api/v1/products/', '/api/v1/categories/', '/api/v1/announcements/']
+
+
+class Command(BaseCommand):
+    help = "Serves the app with gunicorn in each SERVER_MODE and compares req/s and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        paths = list(READ_PATHS)
+        order = Order.objects.order_by('-created_at').values_list('pk', flat=True).first()
+        if order is not None:
+            paths.append('/api/v1/orders/{}/'.format(order))
+
+        results = []
+        for mode in options['modes']:
+            server = self.start_server(mode, options['port'], options['workers'])
+            try:
+                base_url = 'http://127.0.0.1:{}'.format(options['port'])
+                self.wait_until_up(base_url + paths[0], server)
+                results.append((mode,) + self.run_load(
+                    base_url, paths, options['requests'], options['concurrency']))
+            finally:
+                server.terminate()
+                server.wait()
+
+        self.stdout.write("{:<6} {:>9} {:>9} {:>9} {:>7}".format(
+            'mode', 'req/s', 'p50 ms', 'p99 ms', 'errors'))
+        for mode, rate, p50, p99, errors in results:
+            self.stdout.write("{:<6} {:>9.1f} {:>9.1f} {:>9.1f} {:>7}".format(
+                mode, rate, p50, p99, errors))
+
+    def start_server(self, mode, port, workers):
+        env = dict(os.environ, SERVER_MODE=mode, WEB_CONCURRENCY=str(workers))
+        config = os.path.join(settings.PROJECT_ROOT, 'gunicorn.conf.py')
+        command = [sys.executable, '-m', 'gunicorn', '--config', config,
+                   '--bind', '127.0.0.1:{}'.format(port)]
+        return subprocess.Popen(command, cwd=settings.PROJECT_ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def wait_until_up(self, url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("gunicorn exited with {}".format(server.returncode))
+            try:
+                requests.get(url, timeout=5)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise CommandError("gunicorn did not answer {} within {}s".format(url, timeout))
+
+    def run_load(self, base_url, paths, total, concurrency):
+        local = threading.local()
+
+        def fetch(i):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            response = local.session.get(base_url + paths[i % len(paths)])
+            return (time.perf_counter() - started) * 1000, response.status_code >= 400
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # warm up every worker's caches and connections before timing
+            list(pool.map(fetch, range(concurrency * len(paths))))
+            started = time.perf_counter()
+            samples = list(pool.map(fetch, range(total)))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, failed in samples if failed)
+        return total / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99), errors
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.webhooks import process_events
+
+
+class Command(BaseCommand):
+    help = ("Drains the Beyonic webhook inbox: applies collection statuses to payments and "
+            "appends the goods purchased tracker to paid orders")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--forever', action='store_true',
+                            help="keep polling the inbox instead of exiting")
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="seconds to wait when the inbox is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_events(options['batch_size'])
+            if processed:
+                self.stdout.write("Processed {} events".format(processed))
+            elif not options['forever']:
+                return
+            else:
+                time.sleep(options['sleep'])
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import BaseAbstractModel
+from app.soft_delete import purge_deleted
+
+
+class Command(BaseCommand):
+    help = "Hard deletes rows that have been soft deleted for longer than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SOFT_DELETE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        for model in apps.get_app_config('app').get_models():
+            if issubclass(model, BaseAbstractModel):
+                purged = purge_deleted(model, before, options['batch_size'])
+                if purged:
+                    self.stdout.write("Purged {} {} rows".format(purged, model._meta.object_name))
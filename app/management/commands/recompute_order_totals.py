@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Order
+from app.pricing import recompute_totals
+
+
+class Command(BaseCommand):
+    help = ("Recomputes sub_total_amount, delivery_fee and total_amount of stored orders in "
+            "batches. Interrupted runs continue with --after <last printed id>.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--after', default=None,
+                            help="only orders with an id greater than this one")
+
+    def handle(self, *args, **options):
+        pks = Order.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk, updated = options['after'], 0
+        while True:
+            batch = pks.filter(pk__gt=last_pk) if last_pk else pks
+            batch = list(batch[:options['batch_size']])
+            if not batch:
+                break
+            # every batch is its own UPDATE statement, so finished batches survive an interruption
+            updated += recompute_totals(Order.objects.filter(pk__in=batch))
+            last_pk = batch[-1]
+            self.stdout.write("Recomputed {} orders, last id {}".format(updated, last_pk))
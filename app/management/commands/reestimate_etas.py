@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.eta import reestimate_open_orders
+
+
+class Command(BaseCommand):
+    help = "Re-estimates expected_delivery_date_time of every placed order in vectorized batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        updated = reestimate_open_orders(options['batch_size'])
+        self.stdout.write("Re-estimated {} orders".format(updated))
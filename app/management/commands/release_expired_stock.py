@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Puts stock reserved by unpaid orders back once their reservation window has passed"
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write("Released stock of {} orders".format(released))
@@ -0,0 +1,181 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app import search, suggest
+from app.catalog import bump_catalog_version
+from app.models import (
+    ActiveFlagMixin,
+    Category,
+    Contact,
+    District,
+    Location,
+    Order,
+    OrderItem,
+    OrderTracker,
+    Payment,
+    Product,
+    Shop,
+    Stock,
+    User,
+)
+from app.pricing import delivery_fee, sub_total
+from app.search import refresh_search_vectors
+
+ADJECTIVES = ['fresh', 'ripe', 'organic', 'local', 'dried', 'smoked', 'sweet', 'green', 'red',
+              'golden', 'wild', 'roasted', 'spicy', 'crunchy', 'creamy', 'frozen']
+NOUNS = ['mango', 'banana', 'matooke', 'cassava', 'beans', 'rice', 'maize flour', 'tilapia',
+         'chicken', 'milk', 'yoghurt', 'bread', 'tomatoes', 'onions', 'avocado', 'pineapple',
+         'groundnuts', 'sugar', 'tea', 'coffee', 'juice', 'soap', 'cooking oil', 'eggs']
+TRACKERS = ['Order Placed', 'Goods Purchased', 'Out For Delivery', 'Delivered']
+
+
+class Command(BaseCommand):
+    help = ("Bulk loads a realistic catalog, customers and order history for the endpoint "
+            "benchmarks. Rows are written with bulk_create, so the signal side effects "
+            "(contacts, trackers, search vectors, caches) are applied in bulk at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--drivers', type=int, default=200)
+        parser.add_argument('--districts', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--shops', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # keeps the unique names of repeated runs apart
+        self.tag = uuid.UUID(int=self.random.getrandbits(128)).hex[:6]
+        started = time.perf_counter()
+
+        districts = self.create(District, [District(name='District {} {}'.format(self.tag, i))
+                                           for i in range(options['districts'])])
+        customers, locations = self.create_customers(options['customers'], districts)
+        drivers = self.create(User, [
+            User(username='driver-{}-{}'.format(self.tag, i), role=User.DRIVER, password='!')
+            for i in range(options['drivers'])])
+        products = self.create_catalog(options['categories'], options['shops'], options['products'])
+        self.create_orders(options['orders'], options['items_per_order'],
+                           customers, locations, drivers, products)
+        self.refresh_derived_data()
+        self.stdout.write("Seeded in {:.1f} s".format(time.perf_counter() - started))
+
+    def create(self, model, objs):
+        started = time.perf_counter()
+        with transaction.atomic():
+            if issubclass(model, ActiveFlagMixin):
+                model.objects.activate_latest(objs)
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.stdout.write("{:>9} {:<14} {:.1f} s".format(
+            len(objs), model._meta.object_name, time.perf_counter() - started))
+        return objs
+
+    def free_phones(self, count):
+        taken = set(User.objects.exclude(phone=None).values_list('phone', flat=True))
+        taken |= set(Contact.all_with_deleted.exclude(phone=None).values_list('phone', flat=True))
+        phones = []
+        while len(phones) < count:
+            phone = '07{:08d}'.format(self.random.randrange(10 ** 8))
+            if phone not in taken:
+                taken.add(phone)
+                phones.append(phone)
+        return phones
+
+    def create_customers(self, count, districts):
+        customers = [User(username='customer-{}-{}'.format(self.tag, i), phone=phone,
+                          role=User.CUSTOMER, password='!')
+                     for i, phone in enumerate(self.free_phones(count))]
+        self.create(User, customers)
+        # what save_initial_customer_contact does one row at a time
+        self.create(Contact, [Contact(phone=customer.phone, customer=customer)
+                              for customer in customers])
+        locations = self.create(Location, [
+            Location(customer=customer, district=self.random.choice(districts),
+                     name='Home', lat=self.random.uniform(0.2, 0.5),
+                     lng=self.random.uniform(32.4, 32.7))
+            for customer in customers])
+        return customers, locations
+
+    def create_catalog(self, category_count, shop_count, product_count):
+        categories = self.create(Category, [
+            Category(name='{} {} {}'.format(noun, self.tag, i), description='All kinds of ' + noun)
+            for i, noun in enumerate(self.random.choices(NOUNS, k=category_count))])
+        shops = self.create(Shop, [
+            Shop(name='Shop {} {}'.format(self.tag, i), is_special=i % 20 == 0)
+            for i in range(shop_count)])
+        products = []
+        for i in range(product_count):
+            adjective, noun = self.random.choice(ADJECTIVES), self.random.choice(NOUNS)
+            products.append(Product(
+                name='{} {} {}-{}'.format(adjective, noun, self.tag, i),
+                description='{} {}, sold by weight'.format(adjective.capitalize(), noun),
+                price=self.random.randrange(1000, 200000, 500),
+                discount=self.random.choice([0, 0, 0, 5, 10, 25]),
+                weight=round(self.random.uniform(0.1, 20), 2),
+                category=self.random.choice(categories),
+                shop=self.random.choice(shops)))
+        self.create(Product, products)
+        self.create(Stock, [Stock(product=product, name=product.name,
+                                  units_in_stock=self.random.randrange(0, 500))
+                            for product in products])
+        return products
+
+    def create_orders(self, count, items_per_order, customers, locations, drivers, products):
+        started = time.perf_counter()
+        methods = [Order.MOTORCYCLE, Order.MOTORCYCLE, Order.VEHICLE, Order.PICKUP]
+        speeds = [Order.ORDINARY, Order.EXPRESS]
+        statuses = [Order.DELIVERED] * 3 + [Order.PLACED, Order.CANCELLED]
+        for first in range(0, count, self.batch_size):
+            orders, items, trackers, payments = [], [], [], []
+            for _ in range(min(self.batch_size, count - first)):
+                i = self.random.randrange(len(customers))
+                method, speed = self.random.choice(methods), self.random.choice(speeds)
+                status = self.random.choice(statuses)
+                tracker_number = len(TRACKERS) if status == Order.DELIVERED else 1
+                order = Order(customer=customers[i], location=locations[i], delivery_method=method,
+                              delivery_speed=speed, status=status,
+                              driver=self.random.choice(drivers) if drivers else None,
+                              current_tracker_number=tracker_number,
+                              current_tracker_name=TRACKERS[tracker_number - 1])
+                lines = [(self.random.choice(products), self.random.randint(1, 5))
+                         for _ in range(items_per_order)]
+                # what the pricing receivers compute after every OrderItem save
+                order.sub_total_amount = sub_total(lines)
+                order.delivery_fee = delivery_fee(method, speed)
+                order.total_amount = order.sub_total_amount + order.delivery_fee
+                orders.append(order)
+                items.extend(OrderItem(order=order, product=p, units=units) for p, units in lines)
+                trackers.extend(OrderTracker(order=order, number=n, name=TRACKERS[n - 1])
+                                for n in range(1, tracker_number + 1))
+                if status == Order.DELIVERED:
+                    payments.append(Payment(order=order, customer=order.customer,
+                                            amount=order.total_amount, status=Payment.PAID,
+                                            payment_method=Payment.CASH))
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(items)
+                OrderTracker.objects.bulk_create(trackers)
+                Payment.objects.bulk_create(payments)
+            done = first + len(orders)
+            if done % (self.batch_size * 20) == 0 or done == count:
+                self.stdout.write("{:>9} {:<14} {:.1f} s".format(
+                    done, 'Order', time.perf_counter() - started))
+
+    def refresh_derived_data(self):
+        """What the skipped post_save receivers would have done, once for all rows."""
+        refresh_search_vectors(Product.objects.filter(search_vector=None))
+        search.invalidate_index()
+        suggest.invalidate_index()
+        bump_catalog_version()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.payments import pooled_session, send_due_requests
+
+
+class Command(BaseCommand):
+    help = "Sends due Beyonic collection requests from the outbox, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="parallel requests to Beyonic")
+        parser.add_argument('--forever', action='store_true',
+                            help="keep polling the outbox instead of exiting")
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="seconds to wait when nothing is due")
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency'] or settings.BEYONIC_CONCURRENCY
+        # one session for the life of the worker keeps connections to Beyonic warm
+        session = pooled_session(concurrency)
+        while True:
+            sent = send_due_requests(options['batch_size'], concurrency, session)
+            if sent:
+                self.stdout.write("Sent {} collection requests".format(sent))
+            elif not options['forever']:
+                return
+            else:
+                time.sleep(options['sleep'])
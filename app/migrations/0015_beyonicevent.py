@@ -0,0 +1,31 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:24
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BeyonicEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('remote_transaction_id', models.CharField(db_index=True, max_length=255)),
+                ('payload', models.JSONField(default=dict)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+            options={
+                'db_table': 'beyonicEvent',
+                'ordering': ('created_at',),
+            },
+        ),
+    ]
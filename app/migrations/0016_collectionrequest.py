@@ -0,0 +1,43 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:26
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_beyonicevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionRequest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=30)),
+                ('phonenumber', models.CharField(max_length=20)),
+                ('amount', models.IntegerField(validators=[django.core.validators.MinValueValidator(500)])),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('remote_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255, null=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_requests', to='app.payment')),
+            ],
+            options={
+                'db_table': 'collectionRequest',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='collectionrequest',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='collection_due_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_collectionrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='current_tracker_name',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='current_tracker_number',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:36
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# GIN indexes and to_tsvector only exist on Postgres, other databases keep a
+# NULL column and search through app.search's in-process index
+CREATE_INDEX = 'CREATE INDEX product_search_vector_idx ON product USING gin (search_vector)'
+DROP_INDEX = 'DROP INDEX IF EXISTS product_search_vector_idx'
+BACKFILL = '''
+UPDATE product SET search_vector =
+    setweight(to_tsvector('english', coalesce(product.name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(category.name, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(shop.name, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(product.description, '')), 'C')
+FROM category, shop
+WHERE category.id = product.category_id AND shop.id = product.shop_id
+'''
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+        schema_editor.execute(BACKFILL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_order_current_tracker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
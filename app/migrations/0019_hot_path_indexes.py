@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['customer', '-created_at'], name='location_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_curated_list', True)), fields=['is_curated_list'], name='order_curated_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertracker',
+            index=models.Index(fields=['order', 'number'], name='ordertracker_order_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['customer', '-created_at'], name='payment_customer_created_idx'),
+        ),
+    ]
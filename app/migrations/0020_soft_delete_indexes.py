@@ -0,0 +1,73 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='announcement_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beyonicevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='beyonicevent_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='category_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collectionrequest',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='collectionrequest_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='contact_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='district_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='location_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='order_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='orderitem_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertracker',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='ordertracker_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='payment_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='product_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='shop_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='stock_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='stockreservation_alive_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+def keep_latest_active(apps, schema_editor):
+    """Leaves only the most recently updated active row of each customer active."""
+    for model_name in ('Contact', 'Location'):
+        model = apps.get_model('app', model_name)
+        seen = set()
+        stale = []
+        rows = model.objects.filter(is_active=True, is_deleted=False, customer__isnull=False).order_by(
+            'customer_id', '-updated_at').values_list('pk', 'customer_id')
+        for pk, customer_id in rows:
+            if customer_id in seen:
+                stale.append(pk)
+            seen.add(customer_id)
+        model.objects.filter(pk__in=stale).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_soft_delete_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_active, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='contact',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=('customer',), name='one_active_contact'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=('customer',), name='one_active_location'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_one_active_per_customer'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(blank=True, choices=[('pending', 'pending'), ('cancelled', 'cancelled'), ('paid', 'paid'), ('expired', 'expired'), ('failed', 'failed')], default='pending', max_length=30, null=True),
+        ),
+    ]
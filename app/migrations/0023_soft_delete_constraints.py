@@ -0,0 +1,59 @@
+# Generated by Django 3.2.3 on 2026-10-18 11:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_payment_failed_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='contact',
+            name='phone',
+            field=models.CharField(blank=True, max_length=20, null=True, validators=[django.core.validators.RegexValidator(message='Phone number is invalid', regex='^([0]{1}[7]{1}[0-9]{8})$')]),
+        ),
+        migrations.AlterField(
+            model_name='district',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='shop',
+            name='name',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('name',), name='category_name_alive_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='contact',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('phone',), name='contact_phone_alive_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='district',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('name',), name='district_name_alive_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('name',), name='product_name_alive_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='shop',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('name',), name='shop_name_alive_unique'),
+        ),
+    ]
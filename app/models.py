@@ -1,11 +1,25 @@
 import random
 import uuid
 
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
-
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import OuterRef, Prefetch, Q, Subquery
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from app.catalog import bump_catalog_version
+from app.soft_delete import (
+    SoftDeleteManager,
+    SoftDeleteQuerySet,
+    after_soft_delete,
+    alive_index,
+    alive_unique,
+    alive_unique_fields,
+    post_soft_delete,
+)
 from app.utilities.constants import phone_regex
 
 
@@ -52,18 +66,78 @@ class BaseAbstractModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True, editable=False)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_with_deleted = SoftDeleteQuerySet.as_manager()
+    # reverse relations whose rows are soft deleted along with this row
+    soft_delete_cascade = ()
+
     def soft_delete(self):
         """soft  delete a model instance"""
         self.is_deleted = True
         self.save()
+        after_soft_delete(type(self), [self.pk])
+
+    def validate_unique(self, exclude=None):
+        """Also checks the alive_unique() constraints, which Django 3.2 leaves to the database."""
+        errors = {}
+        try:
+            super().validate_unique(exclude)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        for name in alive_unique_fields(type(self)):
+            if self.is_deleted or name in (exclude or ()):
+                continue
+            value = getattr(self, name)
+            if value is not None and type(self).objects.filter(**{name: value}).exclude(
+                    pk=self.pk).exists():
+                errors.setdefault(name, []).append(self.unique_error_message(type(self), (name,)))
+        if errors:
+            raise ValidationError(errors)
 
     class Meta:
         abstract = True
         ordering = ['-created_at']
 
 
-class Contact(BaseAbstractModel):
-    phone = models.CharField(max_length=20, null=True, blank=True, unique=True, validators=[
+class ActiveFlagQuerySet(SoftDeleteQuerySet):
+    def activate_latest(self, objs):
+        """
+        activate_latest() for rows about to be written with bulk_create or
+        bulk_update: the last of each customer's rows becomes its active one,
+        and the other rows active so far are switched off by a single UPDATE
+        instead of one save signal per row. Call it before the write.
+        """
+        latest = {obj.customer_id: obj for obj in objs if obj.customer_id is not None}
+        for obj in objs:
+            if obj.customer_id is not None:
+                obj.is_active = latest[obj.customer_id] is obj
+        self.filter(customer_id__in=list(latest), is_active=True).exclude(
+            pk__in=[obj.pk for obj in latest.values()]).update(is_active=False)
+
+    def bulk_import(self, objs, batch_size=500):
+        """bulk_create for rows of which one per customer is active, see activate_latest()."""
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            self.activate_latest(objs)
+            return self.bulk_create(objs, batch_size=batch_size)
+
+
+class ActiveFlagMixin:
+    """
+    Contacts and locations: a customer has at most one active row, enforced by
+    a partial unique constraint and maintained by activate_latest().
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets activate_latest() skip saves that leave is_active alone
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        return instance
+
+
+class Contact(ActiveFlagMixin, BaseAbstractModel):
+    phone = models.CharField(max_length=20, null=True, blank=True, validators=[
         RegexValidator(
             regex=phone_regex,
             message='Phone number is invalid',
@@ -72,18 +146,38 @@ class Contact(BaseAbstractModel):
     is_active = models.BooleanField(default=False)
     customer = models.ForeignKey('User', on_delete=models.CASCADE, related_name='contacts')
 
+    objects = SoftDeleteManager.from_queryset(ActiveFlagQuerySet)()
+    all_with_deleted = ActiveFlagQuerySet.as_manager()
+
+    class Meta(BaseAbstractModel.Meta):
+        indexes = [
+            alive_index('contact_alive_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['customer'],
+                                    condition=Q(is_active=True, is_deleted=False),
+                                    name='one_active_contact'),
+            alive_unique('phone', 'contact_phone_alive_unique'),
+        ]
+
 
 class District(BaseAbstractModel):
-    name = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=50)
 
     class Meta:
         db_table = "district"
+        indexes = [
+            alive_index('district_alive_idx'),
+        ]
+        constraints = [
+            alive_unique('name', 'district_name_alive_unique'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Location(BaseAbstractModel):
+class Location(ActiveFlagMixin, BaseAbstractModel):
     lat = models.FloatField(validators=[MinValueValidator(
         0.0), MaxValueValidator(50.0)], null=True, blank=True)
     lng = models.FloatField(validators=[MinValueValidator(
@@ -94,20 +188,47 @@ class Location(BaseAbstractModel):
                                  related_name='locations', null=True, blank=True)
     customer = models.ForeignKey('User', on_delete=models.CASCADE, related_name='locations', null=True, blank=True)
 
+    objects = SoftDeleteManager.from_queryset(ActiveFlagQuerySet)()
+    all_with_deleted = ActiveFlagQuerySet.as_manager()
+
     class Meta:
         db_table = "location"
+        indexes = [
+            alive_index('location_alive_idx'),
+            models.Index(fields=['customer', '-created_at'], name='location_customer_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['customer'],
+                                    condition=Q(is_active=True, is_deleted=False),
+                                    name='one_active_location'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets the ETA matrix refresh the district a location moves away from
+        instance._loaded_district_id = instance.__dict__.get('district_id')
+        return instance
 
     def __str__(self):
         return self.name
 
 
 class Category(BaseAbstractModel):
-    name = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    name = models.CharField(max_length=255, null=True, blank=True)
     description = models.CharField(max_length=255, null=True, blank=True)
     image = models.ImageField(upload_to='thumbnail/category/', null=True, blank=True)
 
+    soft_delete_cascade = ('products',)
+
     class Meta:
         db_table = "category"
+        indexes = [
+            alive_index('category_alive_idx'),
+        ]
+        constraints = [
+            alive_unique('name', 'category_name_alive_unique'),
+        ]
 
     def __str__(self):
         return self.name
@@ -123,18 +244,29 @@ class Stock(BaseAbstractModel):
 
     class Meta:
         db_table = "stock"
+        indexes = [
+            alive_index('stock_alive_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
 class Shop(BaseAbstractModel):
-    name = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    name = models.CharField(max_length=255, null=True, blank=True)
     is_special = models.BooleanField(null=True, blank=True, default=False)
     image = models.ImageField(upload_to='thumbnail/shop/', null=True, blank=True)
 
+    soft_delete_cascade = ('products',)
+
     class Meta:
         db_table = "shop"
+        indexes = [
+            alive_index('shop_alive_idx'),
+        ]
+        constraints = [
+            alive_unique('name', 'shop_name_alive_unique'),
+        ]
 
     def __str__(self):
         return self.name
@@ -151,7 +283,7 @@ class Product(BaseAbstractModel):
         (PIECE, PIECE),
         (BUNCH, BUNCH)
     ]
-    name = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
     expiry_date = models.DateTimeField(null=True, blank=True)
     weight = models.FloatField(validators=[MinValueValidator(0.0)],
                                null=True, blank=True, default=0.0)
@@ -165,9 +297,19 @@ class Product(BaseAbstractModel):
         validators=[MinValueValidator(500)], null=True, blank=True, default=500)
     category = models.ForeignKey('Category', on_delete=models.CASCADE, related_name='products')
     shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='products')
+    # maintained by app.search, GIN indexed on Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    soft_delete_cascade = ('stocks',)
 
     class Meta:
         db_table = "product"
+        indexes = [
+            alive_index('product_alive_idx'),
+        ]
+        constraints = [
+            alive_unique('name', 'product_name_alive_unique'),
+        ]
 
     def __str__(self):
         return self.name
@@ -178,11 +320,13 @@ class Payment(BaseAbstractModel):
     CANCELLED = 'cancelled'
     PAID = 'paid'
     EXPIRED = 'expired'
+    FAILED = 'failed'
     STATUS_CHOICES = [
         (PENDING, 'pending'),
         (CANCELLED, 'cancelled'),
         (PAID, 'paid'),
-        (EXPIRED, 'expired')
+        (EXPIRED, 'expired'),
+        (FAILED, 'failed')
     ]
 
     CASH = 'cash'
@@ -205,8 +349,16 @@ class Payment(BaseAbstractModel):
                                       null=True, blank=True, default=CASH)
     order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='payments')
 
+    # a deleted payment's collection requests are never sent
+    soft_delete_cascade = ('collection_requests',)
+
     class Meta:
         db_table = "payment"
+        indexes = [
+            alive_index('payment_alive_idx'),
+            models.Index(fields=['-created_at', '-id'], name='payment_created_id_idx'),
+            models.Index(fields=['customer', '-created_at'], name='payment_customer_created_idx'),
+        ]
 
     def __str__(self):
         return self.customer.username + " " + str(self.status)
@@ -216,6 +368,36 @@ def generate_random_token():
     return str(random.randint(10000000, 99999999))
 
 
+class OrderQuerySet(SoftDeleteQuerySet):
+    def with_related(self):
+        """
+        Loads everything OrderSerializer renders in a fixed number of queries:
+        orderitems and payment ids are prefetched for the whole page.
+        """
+        return self.prefetch_related(
+            'orderitems',
+            Prefetch('payments', queryset=Payment.objects.only('id', 'order_id')),
+        )
+
+    def visible_to(self, user):
+        """The orders user may read: customers their own and the curated lists, staff all."""
+        # anonymous users have no role
+        role = getattr(user, 'role', None)
+        if role == User.CUSTOMER:
+            return self.filter(Q(customer=user) | Q(is_curated_list=True))
+        if role in [User.DEVELOPER, User.ADMIN]:
+            return self.all()
+        return self.filter(is_curated_list=True)
+
+    def refresh_current_tracker(self):
+        """Copies the highest numbered tracker of each order onto current_tracker_number/name."""
+        latest = OrderTracker.objects.filter(order=OuterRef('pk')).order_by('-number')
+        return self.update(
+            current_tracker_number=Subquery(latest.values('number')[:1]),
+            current_tracker_name=Subquery(latest.values('name')[:1]),
+        )
+
+
 class Order(BaseAbstractModel):
     PLACED = 'placed'
     CANCELLED = 'cancelled'
@@ -268,9 +450,25 @@ class Order(BaseAbstractModel):
     customer = models.ForeignKey('User', on_delete=models.SET_NULL,
                                  related_name='customer_orders', null=True, blank=True)
     location = models.ForeignKey('Location', on_delete=models.CASCADE, related_name='orders', null=True, blank=True)
+    # copy of the latest OrderTracker, maintained by OrderTracker.refresh_orders
+    current_tracker_number = models.IntegerField(null=True, blank=True, db_index=True)
+    current_tracker_name = models.CharField(max_length=100, null=True, blank=True)
+
+    objects = SoftDeleteManager.from_queryset(OrderQuerySet)()
+    all_with_deleted = OrderQuerySet.as_manager()
+
+    soft_delete_cascade = ('orderitems', 'ordertrackers', 'payments')
 
     class Meta:
         db_table = "order"
+        indexes = [
+            alive_index('order_alive_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+            # customers see their own orders plus the (few) curated lists
+            models.Index(fields=['is_curated_list'], condition=Q(is_curated_list=True),
+                         name='order_curated_list_idx'),
+        ]
         ordering = ('-created_at',)
 
     def __str__(self):
@@ -285,6 +483,17 @@ class OrderItem(BaseAbstractModel):
 
     class Meta:
         db_table = "orderItem"
+        indexes = [
+            alive_index('orderitem_alive_idx'),
+            models.Index(fields=['-created_at', '-id'], name='orderitem_created_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets the totals of the order an item is moved away from be recomputed
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        return instance
 
     def __str__(self):
         return self.product.name + " " + str(self.id)
@@ -297,12 +506,22 @@ class Announcement(BaseAbstractModel):
 
     class Meta:
         db_table = "announcement"
+        indexes = [
+            alive_index('announcement_alive_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
 class OrderTracker(BaseAbstractModel):
+    ORDER_PLACED = 1
+    GOODS_PURCHASED = 3
+    STAGE_NAMES = {
+        ORDER_PLACED: 'Order Placed',
+        GOODS_PURCHASED: 'Goods Purchased',
+    }
+
     name = models.CharField(max_length=100, null=True, blank=True)
     number = models.IntegerField(validators=[MinValueValidator(1)], default=1)
     order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='ordertrackers', null=True, blank=True)
@@ -310,26 +529,149 @@ class OrderTracker(BaseAbstractModel):
     class Meta:
         unique_together = ('number', 'order')
         ordering = ('number',)
+        indexes = [
+            alive_index('ordertracker_alive_idx'),
+            # the unique constraint leads with number, lookups by order need order first
+            models.Index(fields=['order', 'number'], name='ordertracker_order_number_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets refresh_orders() refresh the order a tracker is moved away from
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.refresh_orders()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.refresh_orders()
+        return result
+
+    def refresh_orders(self):
+        """Copies the latest tracker onto the order this tracker is on and the one it left."""
+        order_ids = {self.order_id, getattr(self, '_loaded_order_id', None)} - {None}
+        if order_ids:
+            Order.objects.filter(pk__in=order_ids).refresh_current_tracker()
+        self._loaded_order_id = self.order_id
 
     def __str__(self):
         return self.order.order_tracking_number + " " + str(self.id)
 
 
+class StockReservation(BaseAbstractModel):
+    """Units taken from a stock row for an order until it is delivered, cancelled or expires."""
+    units = models.IntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField(null=True, blank=True)
+    stock = models.ForeignKey('Stock', on_delete=models.CASCADE, related_name='reservations')
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='stock_reservations')
+
+    class Meta:
+        db_table = "stockReservation"
+        indexes = [
+            alive_index('stockreservation_alive_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.units) + " " + str(self.stock_id)
+
+
+class BeyonicEvent(BaseAbstractModel):
+    """Inbox row for a Beyonic webhook delivery, drained by the process_beyonic_events command."""
+    remote_transaction_id = models.CharField(max_length=255, db_index=True)
+    payload = models.JSONField(default=dict)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        db_table = "beyonicEvent"
+        indexes = [
+            alive_index('beyonicevent_alive_idx'),
+        ]
+        ordering = ('created_at',)
+
+    def __str__(self):
+        return self.remote_transaction_id
+
+
+class CollectionRequest(BaseAbstractModel):
+    """
+    Outbox row for a Beyonic mobile money collection request, sent by the
+    send_collection_requests command.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'pending'),
+        (SENT, 'sent'),
+        (FAILED, 'failed')
+    ]
+
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default=PENDING)
+    phonenumber = models.CharField(max_length=20)
+    amount = models.IntegerField(validators=[MinValueValidator(500)])
+    description = models.CharField(max_length=255, null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    remote_id = models.CharField(max_length=100, null=True, blank=True)
+    last_error = models.CharField(max_length=255, null=True, blank=True)
+    payment = models.ForeignKey('Payment', on_delete=models.CASCADE,
+                                related_name='collection_requests')
+
+    class Meta:
+        db_table = "collectionRequest"
+        indexes = [
+            alive_index('collectionrequest_alive_idx'),
+            models.Index(fields=['status', 'next_attempt_at'], name='collection_due_idx'),
+        ]
+
+    def __str__(self):
+        return self.phonenumber + " " + str(self.status)
+
+
 def save_initial_customer_contact(sender, instance, created, update_fields, **kwargs):
     if created and instance.role == User.CUSTOMER:
         Contact(phone=instance.phone, customer=instance, is_active=True).save()
 
 
-def deactivate_mm_numbers(sender, instance, created, update_fields, **kwargs):
-    Contact.objects.filter(customer=instance.customer).update(is_active=False)
-    Contact.objects.filter(id=instance.id).update(is_active=True)
+def enqueue_collection_request(sender, instance, created, update_fields, **kwargs):
+    if created and instance.payment_method == Payment.MOMO and instance.momo_phone_number:
+        CollectionRequest.objects.create(payment=instance, phonenumber=instance.momo_phone_number,
+                                         amount=instance.amount,
+                                         description='Order ' + str(instance.order_id))
 
 
-def deactivate_locations(sender, instance, created, update_fields, **kwargs):
-    Location.objects.filter(customer=instance.customer).update(is_active=False)
-    Location.objects.filter(id=instance.id).update(is_active=True)
+def activate_latest(sender, instance, raw, **kwargs):
+    """
+    A new contact/location becomes the customer's active one, as does a row
+    saved with is_active switched on. Either way the previously active row is
+    switched off with one UPDATE before the write; saves that leave is_active
+    alone cost nothing.
+    """
+    if raw or instance.customer_id is None:
+        return
+    if instance._state.adding:
+        instance.is_active = True
+    elif not instance.is_active or getattr(instance, '_loaded_is_active', None):
+        return
+    sender.objects.filter(customer_id=instance.customer_id, is_active=True).exclude(
+        pk=instance.pk).update(is_active=False)
+    instance._loaded_is_active = True
 
 
 post_save.connect(save_initial_customer_contact, sender=User)
-post_save.connect(deactivate_mm_numbers, sender=Contact)
-post_save.connect(deactivate_locations, sender=Location)
+post_save.connect(enqueue_collection_request, sender=Payment)
+pre_save.connect(activate_latest, sender=Contact)
+pre_save.connect(activate_latest, sender=Location)
+
+for catalog_model in (Product, Category, Shop, Stock):
+    post_save.connect(bump_catalog_version, sender=catalog_model)
+    post_delete.connect(bump_catalog_version, sender=catalog_model)
+    post_soft_delete.connect(bump_catalog_version, sender=catalog_model)
@@ -0,0 +1,105 @@
+import uuid
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    LimitOffsetPagination with an opt-in keyset mode for deep listings.
+    Clients pass ?pagination=keyset (or follow a `next` link carrying ?cursor=)
+    and pages are walked on (created_at, id) from BaseAbstractModel, newest first.
+    Keyset pages run no COUNT(*) and no OFFSET scan. They cannot be reordered,
+    so any other ?ordering= is answered with a 400.
+    """
+    pagination_query_param = 'pagination'
+    keyset_mode = 'keyset'
+    cursor_query_param = 'cursor'
+    keyset_ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    invalid_ordering_message = 'Keyset pages are ordered by -created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.is_keyset_request(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.check_ordering(request)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.request = request
+
+        queryset = queryset.order_by(*self.keyset_ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__lt=created_at) |
+                                       Q(created_at=created_at, id__lt=pk))
+
+        # one extra row tells us whether there is a next page without counting
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        results = results[:self.limit]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_previous_link(self):
+        if self.keyset:
+            return None
+        return super().get_previous_link()
+
+    def is_keyset_request(self, request):
+        return (request.query_params.get(self.pagination_query_param) == self.keyset_mode or
+                self.cursor_query_param in request.query_params)
+
+    def check_ordering(self, request):
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+        if not ordering:
+            return
+        fields = tuple(field.strip() for field in ordering.split(','))
+        if fields not in (self.keyset_ordering, self.keyset_ordering[:1]):
+            raise ValidationError({api_settings.ORDERING_PARAM: [self.invalid_ordering_message]})
+
+    def encode_cursor(self, instance):
+        position = '{}|{}'.format(instance.created_at.isoformat(), instance.pk)
+        return b64encode(position.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            created_at = parse_datetime(created_at)
+            pk = uuid.UUID(pk)
+        except (TypeError, ValueError):
+            raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+        if created_at is None:
+            raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+        return created_at, pk
@@ -1,15 +1,123 @@
+"""
+Beyonic collection requests.
+
+Requests are never sent from a web request: Payment creation stores a
+CollectionRequest row and send_due_requests() (the send_collection_requests
+command) sends due rows from a thread pool over one pooled HTTP session,
+retrying failures with exponential backoff.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 import beyonic
-from project.settings import BEYONIC_KEY
+import requests
+from beyonic.api_client import RequestsClient
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CollectionRequest
+
+beyonic.api_key = settings.BEYONIC_KEY
+beyonic.api_endpoint_base = settings.BEYONIC_API_BASE
+
+# how long a claimed request stays invisible to other senders
+CLAIM_SECONDS = 120
+MAX_BACKOFF_SECONDS = 60 * 60
+
+
+class SessionClient(RequestsClient):
+    """beyonic http client that reuses the connections of a single requests.Session."""
+
+    def __init__(self, session, verify_ssl_certs=True):
+        super().__init__(verify_ssl_certs=verify_ssl_certs)
+        self.session = session
+
+    def request(self, method, url, headers, params=None):
+        response = self.session.request(method, url, headers=headers,
+                                        data=self.transform_params_metadata(params),
+                                        timeout=30, verify=self._verify_ssl_certs)
+        return response.content, response.status_code
+
+
+def pooled_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def initialize_payment(phonenumber, description, metadata, amount=500, client=None,
+                       duplicate_check_key=None):
+    return beyonic.CollectionRequest.create(client=client,
+                                            phonenumber=phonenumber,
+                                            amount=amount,
+                                            currency='UGX',
+                                            description=description,
+                                            callback_url=settings.BEYONIC_CALLBACK_URL,
+                                            metadata=metadata,
+                                            send_instructions=True,
+                                            duplicate_check_key=duplicate_check_key)
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(settings.BEYONIC_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+                                 MAX_BACKOFF_SECONDS))
+
+
+def claim_due_requests(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(CollectionRequest.objects.select_for_update(skip_locked=True).filter(
+            status=CollectionRequest.PENDING, next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')[:batch_size])
+        CollectionRequest.objects.filter(pk__in=[request.pk for request in due]).update(
+            next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS))
+    return due
+
+
+def send(collection_request, client):
+    """Runs in a pool thread: only talks HTTP, the database is updated by the caller."""
+    try:
+        result = initialize_payment(collection_request.phonenumber,
+                                    collection_request.description,
+                                    {'payment_id': str(collection_request.payment_id)},
+                                    amount=collection_request.amount,
+                                    client=client,
+                                    duplicate_check_key=str(collection_request.pk))
+        return result.get('id') if isinstance(result, dict) else None, None
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+
 
-beyonic.api_key = BEYONIC_KEY
+def send_due_requests(batch_size=100, concurrency=None, session=None):
+    """Sends one batch of due collection requests and returns how many were attempted."""
+    concurrency = concurrency or settings.BEYONIC_CONCURRENCY
+    due = claim_due_requests(batch_size)
+    if not due:
+        return 0
 
+    session = session or pooled_session(concurrency)
+    client = SessionClient(session, verify_ssl_certs=beyonic.verify_ssl_certs)
+    beyonic.api_endpoint_base = settings.BEYONIC_API_BASE
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda request: send(request, client), due))
 
-def initialize_payment(phonenumber, description, metadata, amount=500):
-    collection_request = beyonic.CollectionRequest.create(phonenumber=phonenumber,
-                                                          amount=amount,
-                                                          currency='UGX',
-                                                          description=description,
-                                                          callback_url='https://my.website/payments/callback',
-                                                          metadata=metadata,
-                                                          send_instructions=True)
-    print(collection_request)
+    now = timezone.now()
+    for collection_request, (remote_id, error) in zip(due, outcomes):
+        collection_request.attempts += 1
+        if error is None:
+            collection_request.status = CollectionRequest.SENT
+            collection_request.sent_at = now
+            collection_request.remote_id = remote_id
+            collection_request.last_error = None
+        else:
+            collection_request.last_error = error[:255]
+            if collection_request.attempts >= settings.BEYONIC_MAX_ATTEMPTS:
+                collection_request.status = CollectionRequest.FAILED
+            else:
+                collection_request.next_attempt_at = now + backoff(collection_request.attempts)
+    CollectionRequest.objects.bulk_update(
+        due, ['status', 'attempts', 'sent_at', 'remote_id', 'last_error', 'next_attempt_at'])
+    return len(due)
@@ -0,0 +1,103 @@
+"""
+Server-side order amounts. Clients never get to choose what an order costs.
+
+sub_total_amount is the sum of OrderItem units at the discounted product
+price, delivery_fee follows delivery_method/delivery_speed and total_amount
+is their sum. The same rules exist as Python (for orders built in memory)
+and as SQL expressions (to recompute stored orders in bulk).
+"""
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+
+from .models import Order, OrderItem
+
+DELIVERY_FEES = {
+    (Order.MOTORCYCLE, Order.ORDINARY): 5000,
+    (Order.MOTORCYCLE, Order.EXPRESS): 8000,
+    (Order.VEHICLE, Order.ORDINARY): 10000,
+    (Order.VEHICLE, Order.EXPRESS): 15000,
+    (Order.PICKUP, Order.ORDINARY): 0,
+    (Order.PICKUP, Order.EXPRESS): 0,
+}
+DEFAULT_DELIVERY_FEE = DELIVERY_FEES[(Order.MOTORCYCLE, Order.ORDINARY)]
+
+
+def discounted_price(product):
+    """Unit price of a product after its percentage discount, in whole UGX."""
+    price = product.price or 0
+    discount = product.discount or 0
+    return price * (100 - discount) // 100
+
+
+def sub_total(lines):
+    """Sum of (product, units) lines at their discounted prices."""
+    return sum(discounted_price(product) * units for product, units in lines)
+
+
+def delivery_fee(delivery_method, delivery_speed):
+    return DELIVERY_FEES.get((delivery_method, delivery_speed), DEFAULT_DELIVERY_FEE)
+
+
+def line_total_expression():
+    """OrderItem units at the discounted product price, mirroring discounted_price()."""
+    discounted = (Coalesce(F('product__price'), 0) *
+                  (100 - Coalesce(F('product__discount'), 0))) / 100
+    return Sum(F('units') * discounted, output_field=IntegerField())
+
+
+def sub_total_expression():
+    """Per order sub total as a correlated subquery, to be evaluated against Order rows."""
+    totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=line_total_expression()).values('total')
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def delivery_fee_expression():
+    return Case(
+        *[When(delivery_method=method, delivery_speed=speed, then=Value(fee))
+          for (method, speed), fee in DELIVERY_FEES.items()],
+        default=Value(DEFAULT_DELIVERY_FEE),
+        output_field=IntegerField(),
+    )
+
+
+def recompute_totals(orders):
+    """Recomputes the amounts of every order in a queryset with one UPDATE."""
+    return orders.update(
+        sub_total_amount=sub_total_expression(),
+        delivery_fee=delivery_fee_expression(),
+        total_amount=sub_total_expression() + delivery_fee_expression(),
+    )
+
+
+def update_order_totals(order):
+    """Recomputes one order with a single aggregate query and saves the amounts."""
+    aggregate = OrderItem.objects.filter(order=order).aggregate(total=line_total_expression())
+    order.sub_total_amount = aggregate['total'] or 0
+    order.delivery_fee = delivery_fee(order.delivery_method, order.delivery_speed)
+    order.total_amount = order.sub_total_amount + order.delivery_fee
+    Order.objects.filter(pk=order.pk).update(sub_total_amount=order.sub_total_amount,
+                                             delivery_fee=order.delivery_fee,
+                                             total_amount=order.total_amount)
+    return order
+
+
+def refresh_order_totals(sender, instance, **kwargs):
+    order_ids = {instance.order_id, getattr(instance, '_loaded_order_id', None)} - {None}
+    if order_ids:
+        recompute_totals(Order.objects.filter(pk__in=order_ids))
+    instance._loaded_order_id = instance.order_id
+
+
+post_save.connect(refresh_order_totals, sender=OrderItem)
+post_delete.connect(refresh_order_totals, sender=OrderItem)
@@ -0,0 +1,52 @@
+"""
+Reverse relations listed by id (Category.products, District.locations,
+User.payments/orders).
+
+By default the ids are prefetched for the whole page with one narrow query per
+relation. With ?related=count the lists are replaced by a count annotated on
+the main query, which keeps responses small for categories with thousands of
+products.
+"""
+from django.db.models import Count, Prefetch, Q
+from rest_framework import serializers
+
+RELATED_QUERY_PARAM = 'related'
+IDS = 'ids'
+COUNT = 'count'
+
+
+def related_mode(request):
+    if request is None or request.method != 'GET':
+        return IDS
+    return COUNT if request.query_params.get(RELATED_QUERY_PARAM) == COUNT else IDS
+
+
+class RelatedCountSerializerMixin:
+    """Renders Meta.related_fields as <name>_count integers when the request asks for counts."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if related_mode(self.context.get('request')) == COUNT:
+            for name in self.Meta.related_fields:
+                fields[name] = serializers.IntegerField(source=name + '_count', read_only=True)
+        return fields
+
+
+class RelatedCountViewSetMixin:
+    """Prefetches (or counts) the serializer's Meta.related_fields for every object of the page."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        names = self.get_serializer_class().Meta.related_fields
+        if related_mode(self.request) == COUNT:
+            # the join sees every row, soft deleted ones have to be left out explicitly
+            return queryset.annotate(**{
+                name + '_count': Count(name, filter=Q(**{name + '__is_deleted': False}),
+                                       distinct=True)
+                for name in names})
+        prefetches = []
+        for name in names:
+            relation = queryset.model._meta.get_field(name)
+            related = relation.related_model._default_manager.only('pk', relation.field.attname)
+            prefetches.append(Prefetch(name, queryset=related))
+        return queryset.prefetch_related(*prefetches)
@@ -0,0 +1,145 @@
+"""
+Product full-text search.
+
+On Postgres every product stores a weighted tsvector (name A, category and
+shop names B, description C) in Product.search_vector, kept current by the
+receivers below and GIN indexed, and search_products() ranks matches with
+ts_rank. Other databases (the SQLite test runs) use an in-process inverted
+index over the same text with the same weights, rebuilt lazily after catalog
+writes.
+"""
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.signals import post_delete, post_save
+
+from .models import Category, Product, Shop
+from .soft_delete import post_soft_delete
+
+SEARCH_CONFIG = 'english'
+# ts_rank's default weights for A, B and C
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+TOKEN_RE = re.compile(r'\w+')
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector_expression():
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    shop_name = Subquery(Shop.objects.filter(pk=OuterRef('shop_id')).values('name')[:1])
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG) +
+            SearchVector(category_name, weight='B', config=SEARCH_CONFIG) +
+            SearchVector(shop_name, weight='B', config=SEARCH_CONFIG) +
+            SearchVector('description', weight='C', config=SEARCH_CONFIG))
+
+
+def refresh_search_vectors(products):
+    """Recomputes the stored vectors of a Product queryset with one UPDATE."""
+    if uses_postgres():
+        return products.update(search_vector=search_vector_expression())
+    return 0
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """token -> {product id: weighted term frequency}, for databases without full-text search."""
+
+    def __init__(self, rows):
+        self.postings = defaultdict(lambda: defaultdict(float))
+        for pk, name, description, category_name, shop_name in rows:
+            fields = ((name, 'A'), (category_name, 'B'), (shop_name, 'B'), (description, 'C'))
+            for text, weight in fields:
+                for token in tokenize(text):
+                    self.postings[token][pk] += WEIGHTS[weight]
+
+    @classmethod
+    def load(cls):
+        return cls(Product.objects.values_list(
+            'pk', 'name', 'description', 'category__name', 'shop__name'))
+
+    def search(self, query):
+        """Ids of the products matching every query token, best first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        scores = None
+        for token in tokens:
+            postings = self.postings.get(token, {})
+            if scores is None:
+                scores = dict(postings)
+            else:
+                scores = {pk: score + postings[pk]
+                          for pk, score in scores.items() if pk in postings}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda pk: (-scores[pk], str(pk)))
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _lock:
+        if _index is None:
+            _index = InvertedIndex.load()
+        return _index
+
+
+def search_products(query, products=None):
+    """The products (a Product queryset, default all) matching query, best ranked first."""
+    products = Product.objects.all() if products is None else products
+    if uses_postgres():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return products.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)).order_by('-rank', 'pk')
+    ids = get_index().search(query)
+    if not ids:
+        return products.none()
+    rank = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+                output_field=IntegerField())
+    return products.filter(pk__in=ids).order_by(rank)
+
+
+def refresh_product_vector(sender, instance, **kwargs):
+    refresh_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+def refresh_related_vectors(sender, instance, **kwargs):
+    refresh_search_vectors(Product.objects.filter(**{sender._meta.model_name: instance}))
+
+
+def invalidate_index(sender=None, **kwargs):
+    global _index
+    _index = None
+
+
+post_save.connect(refresh_product_vector, sender=Product)
+for related_model in (Category, Shop):
+    post_save.connect(refresh_related_vectors, sender=related_model)
+for indexed_model in (Product, Category, Shop):
+    post_save.connect(invalidate_index, sender=indexed_model)
+    post_delete.connect(invalidate_index, sender=indexed_model)
+    post_soft_delete.connect(invalidate_index, sender=indexed_model)
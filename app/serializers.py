@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import serializers
 from djoser.serializers import TokenSerializer
 from rest_framework.authtoken.models import Token
@@ -16,9 +17,17 @@ from .models import (
     User,
     OrderTracker, Contact,
 )
+from .eta import estimate_delivery
+from .fieldsets import SparseFieldsSerializerMixin
+from .instrumentation import InstrumentedSerializerMixin
+from .relations import RelatedCountSerializerMixin
+from .soft_delete import AliveUniqueSerializerMixin
+from .pricing import delivery_fee, sub_total, update_order_totals
+from .stock import reserve_stock
 
 
-class UserPostSerializer(serializers.ModelSerializer):
+class UserPostSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                         serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['dob', 'verified', 'phone', 'role', 'email', 'first_name', 'last_name', 'username', 'password']
@@ -34,7 +43,8 @@ class UserPostSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                     RelatedCountSerializerMixin, serializers.ModelSerializer):
     payments = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=Payment.objects.all(),
@@ -49,6 +59,7 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'dob', 'verified', 'first_name', 'last_name', 'phone', 'role', 'payments', 'orders']
+        related_fields = ['payments', 'orders']
         # required to resolve swagger schema conflict
         ref_name = "UserModel"
 
@@ -68,7 +79,9 @@ class CustomTokenSerializer(TokenSerializer):
         )
 
 
-class DistrictSerializer(serializers.ModelSerializer):
+class DistrictSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                         RelatedCountSerializerMixin, AliveUniqueSerializerMixin,
+                         serializers.ModelSerializer):
     locations = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=Location.objects.all(),
@@ -78,9 +91,11 @@ class DistrictSerializer(serializers.ModelSerializer):
     class Meta:
         model = District
         fields = ['id', 'name', 'locations', 'created_at']
+        related_fields = ['locations']
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                         serializers.ModelSerializer):
     district = serializers.PrimaryKeyRelatedField(
         queryset=District.objects.all(),
         required=False
@@ -91,7 +106,9 @@ class LocationSerializer(serializers.ModelSerializer):
         fields = ['id', 'lat', 'lng', 'name', 'district', 'is_active', 'customer', 'created_at']
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                         RelatedCountSerializerMixin, AliveUniqueSerializerMixin,
+                         serializers.ModelSerializer):
     products = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=Product.objects.all(),
@@ -101,9 +118,11 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'image', 'products', 'created_at']
+        related_fields = ['products']
 
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                      serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
     )
@@ -113,19 +132,22 @@ class StockSerializer(serializers.ModelSerializer):
         fields = ['id', 'units_in_stock', 'units_on_order', 'created_at', 'name', 'product', 'created_at']
 
 
-class ShopSerializer(serializers.ModelSerializer):
+class ShopSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                     AliveUniqueSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Shop
         fields = ['id', 'name', 'image', 'is_special', 'created_at']
 
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                        AliveUniqueSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = ['id', 'phone', 'is_active', 'customer', 'created_at']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                        AliveUniqueSerializerMixin, serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
     )
@@ -139,7 +161,8 @@ class ProductSerializer(serializers.ModelSerializer):
                   'description', 'color', 'price', 'category', 'shop', 'metric', 'created_at']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                        serializers.ModelSerializer):
     customer = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
     )
@@ -155,14 +178,11 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 class LastOrderTrackerStatusSerializer(serializers.Field):
     def to_representation(self, order):
-        try:
-            return OrderTracker.objects.filter(order=order).last().name
-        except AttributeError as e:
-            print(e)
-            return "Order Placed"
+        return order.current_tracker_name or "Order Placed"
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                          serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
     )
@@ -175,7 +195,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'units', 'valid', 'product', 'order', 'created_at']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                      serializers.ModelSerializer):
     payments = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=Payment.objects.all(),
@@ -197,13 +218,105 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ['id', 'created_at', 'status', 'valid', 'delivery_method', 'expected_delivery_date_time',
-                  'delivery_date_time', 'total_amount', 'payments', 'driver', 'location', 'delivery_speed',
-                  'orderitems', 'customer', 'delivery_fee', 'sub_total_amount', 'order_tracking_number', 'description',
-                  'is_curated_list', 'image', 'name', 'last_tracker_status', 'created_at']
+        fields = ['id', 'created_at', 'status', 'valid', 'delivery_method',
+                  'expected_delivery_date_time', 'delivery_date_time', 'total_amount', 'payments',
+                  'driver', 'location', 'delivery_speed', 'orderitems', 'customer', 'delivery_fee',
+                  'sub_total_amount', 'order_tracking_number', 'description', 'is_curated_list',
+                  'image', 'name', 'last_tracker_status', 'current_tracker_number', 'created_at']
+        # amounts are computed by app.pricing from the order items and delivery options
+        read_only_fields = ['current_tracker_number', 'total_amount', 'sub_total_amount',
+                            'delivery_fee']
+
+    def create(self, validated_data):
+        if not validated_data.get('expected_delivery_date_time'):
+            validated_data['expected_delivery_date_time'] = estimate_delivery(
+                validated_data.get('location'),
+                validated_data.get('delivery_method', Order.MOTORCYCLE),
+                validated_data.get('delivery_speed', Order.ORDINARY))
+        return super().create(validated_data)
+
+    def save(self, **kwargs):
+        return update_order_totals(super().save(**kwargs))
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    # plain ids, CheckoutSerializer resolves every product in a single query
+    product = serializers.UUIDField()
+    units = serializers.IntegerField(min_value=1, default=1)
 
 
-class OrderTrackerSerializer(serializers.ModelSerializer):
+class CheckoutPaymentSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                                serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['payment_method', 'momo_phone_number', 'card_number']
+
+
+class CheckoutSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                         serializers.ModelSerializer):
+    """
+    Places an order with its items, payment and initial tracker in one transaction.
+    Amounts are computed server side from product prices and discounts, and
+    the ordered units are reserved from stock. The customer is always the
+    requesting user, who has to be signed in and deliver to one of their own
+    locations.
+    """
+    location = serializers.PrimaryKeyRelatedField(
+        queryset=Location.objects.all(),
+    )
+    items = CheckoutItemSerializer(many=True, allow_empty=False)
+    payment = CheckoutPaymentSerializer(required=False)
+
+    class Meta:
+        model = Order
+        fields = ['location', 'delivery_method', 'delivery_speed', 'description', 'name', 'items',
+                  'payment']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        user = getattr(self.context.get('request'), 'user', None)
+        locations = Location.objects.none()
+        if user is not None and user.is_authenticated:
+            locations = Location.objects.filter(customer=user)
+        if 'location' in fields:
+            fields['location'].queryset = locations
+        return fields
+
+    def validate_items(self, items):
+        product_ids = {item['product'] for item in items}
+        products = Product.objects.in_bulk(product_ids)
+        missing = product_ids - set(products)
+        if missing:
+            raise serializers.ValidationError(
+                'Invalid product ids: ' + ', '.join(sorted(str(pk) for pk in missing)))
+        return [dict(item, product=products[item['product']]) for item in items]
+
+    def create(self, validated_data):
+        items = validated_data.pop('items')
+        payment = validated_data.pop('payment', {})
+        validated_data['customer'] = self.context['request'].user
+
+        with transaction.atomic():
+            order = Order(**validated_data)
+            order.sub_total_amount = sub_total((item['product'], item['units']) for item in items)
+            order.delivery_fee = delivery_fee(order.delivery_method, order.delivery_speed)
+            order.expected_delivery_date_time = estimate_delivery(
+                order.location, order.delivery_method, order.delivery_speed)
+            order.total_amount = order.sub_total_amount + order.delivery_fee
+            order.save()
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=item['product'], units=item['units'])
+                for item in items])
+            reserve_stock(order, [(item['product'].pk, item['units']) for item in items])
+            Payment.objects.create(order=order, customer=order.customer,
+                                   amount=order.total_amount, **payment)
+            OrderTracker.objects.create(order=order, number=OrderTracker.ORDER_PLACED,
+                                        name=OrderTracker.STAGE_NAMES[OrderTracker.ORDER_PLACED])
+        return order
+
+
+class OrderTrackerSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                             serializers.ModelSerializer):
     order = serializers.PrimaryKeyRelatedField(
         queryset=Order.objects.all(),
     )
@@ -213,7 +326,8 @@ class OrderTrackerSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'name', 'number', 'created_at']
 
 
-class AnnouncementSerializer(serializers.ModelSerializer):
+class AnnouncementSerializer(InstrumentedSerializerMixin, SparseFieldsSerializerMixin,
+                             serializers.ModelSerializer):
     class Meta:
         model = Announcement
         fields = ['id', 'title', 'body', 'image', 'created_at']
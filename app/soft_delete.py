@@ -0,0 +1,138 @@
+"""
+Soft deletion for every BaseAbstractModel.
+
+`Model.objects` never returns soft deleted rows and `Model.all_with_deleted`
+returns everything. The viewsets soft delete on DELETE and the
+purge_soft_deleted command hard deletes rows that have been soft deleted for
+longer than SOFT_DELETE_RETENTION_DAYS.
+
+Soft deleting a row also soft deletes the rows of its model's
+soft_delete_cascade relations (a category's products, a product's stocks)
+and sends post_soft_delete with the pks of every model's deleted rows, for
+the receivers whose work post_save does for a single row. The purge skips
+rows whose hard delete would cascade to a row that is still alive.
+
+Unique fields are unique among the alive rows only (alive_unique()), so the
+name of a deleted row can be taken again.
+"""
+from django.db import models
+from django.db.models import Exists, OuterRef, Q
+from django.dispatch import Signal
+from django.utils import timezone
+from rest_framework.validators import UniqueValidator
+
+ALIVE = Q(is_deleted=False)
+
+# sent with sender=model and pks=[...] once rows of model are soft deleted
+post_soft_delete = Signal()
+
+
+def alive_index(name):
+    """Partial index for the usual "not deleted, newest first" list query."""
+    return models.Index(fields=['-created_at'], condition=ALIVE, name=name)
+
+
+def alive_unique(field, name):
+    """Partial unique constraint on a field, which leaves soft deleted rows out."""
+    return models.UniqueConstraint(fields=[field], condition=ALIVE, name=name)
+
+
+def alive_unique_fields(model):
+    return {constraint.fields[0] for constraint in model._meta.constraints
+            if isinstance(constraint, models.UniqueConstraint) and
+            constraint.condition == ALIVE and len(constraint.fields) == 1}
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(is_deleted=False)
+
+    def deleted(self):
+        return self.filter(is_deleted=True)
+
+    def soft_delete(self):
+        pks = list(self.values_list('pk', flat=True))
+        count = self.model.all_with_deleted.filter(pk__in=pks).update(
+            is_deleted=True, updated_at=timezone.now())
+        after_soft_delete(self.model, pks)
+        return count
+
+
+def after_soft_delete(model, pks):
+    """Soft deletes the model.soft_delete_cascade rows referencing pks, sends post_soft_delete."""
+    if not pks:
+        return
+    for name in model.soft_delete_cascade:
+        relation = model._meta.get_field(name)
+        relation.related_model.objects.filter(**{relation.field.name + '__in': pks}).soft_delete()
+    post_soft_delete.send(sender=model, pks=pks)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Default manager of BaseAbstractModel, hides soft deleted rows."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class SoftDeleteViewSetMixin:
+    """DELETE marks the row as deleted instead of removing it."""
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+
+
+class AliveUniqueSerializerMixin:
+    """Validates alive_unique() fields the way ModelSerializer validates unique fields."""
+
+    def build_standard_field(self, field_name, model_field):
+        field_class, field_kwargs = super().build_standard_field(field_name, model_field)
+        if model_field.name in alive_unique_fields(model_field.model):
+            message = model_field.error_messages['unique'] % {
+                'model_name': model_field.model._meta.verbose_name,
+                'field_label': model_field.verbose_name,
+            }
+            field_kwargs['validators'] = field_kwargs.get('validators', []) + [
+                UniqueValidator(queryset=model_field.model.objects.all(), message=message)]
+        return field_class, field_kwargs
+
+
+def live_dependents(model):
+    """
+    Condition matching the rows of model whose hard delete would cascade to a
+    row that is alive: a row of a model without soft deletion, a row not
+    deleted, or one with live dependents of its own. None if nothing cascades.
+    """
+    condition = None
+    for relation in model._meta.related_objects:
+        if relation.on_delete is not models.CASCADE:
+            continue
+        related = relation.related_model
+        alive = Q()
+        if hasattr(related, 'all_with_deleted'):
+            alive = ALIVE
+            nested = live_dependents(related)
+            if nested is not None:
+                alive |= nested
+        rows = Q(Exists(related._base_manager.filter(
+            alive, **{relation.field.name: OuterRef('pk')})))
+        condition = rows if condition is None else condition | rows
+    return condition
+
+
+def purge_deleted(model, before, batch_size=1000):
+    """
+    Hard deletes model rows soft deleted before `before`, batch_size rows per
+    query, except those with live dependents.
+    """
+    rows = model.all_with_deleted.filter(is_deleted=True, updated_at__lt=before)
+    condition = live_dependents(model)
+    if condition is not None:
+        rows = rows.exclude(condition)
+    purged = 0
+    while True:
+        batch = list(rows.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return purged
+        model.all_with_deleted.filter(pk__in=batch).delete()
+        purged += len(batch)
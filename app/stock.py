@@ -0,0 +1,136 @@
+"""
+Stock reservation service.
+
+Placing an order moves units from units_in_stock to units_on_order and records
+a StockReservation per stock row, so the exact units can be handed back when
+the order is cancelled, rejected, deleted or left unpaid past its reservation
+window.
+Stock rows are always locked in (product_id, id) order, so concurrent checkouts
+for overlapping products queue up instead of deadlocking.
+Products without any stock rows are not stock tracked and are never reserved.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .error_handling import InsufficientStock
+from .models import Order, Payment, Stock, StockReservation
+from .soft_delete import post_soft_delete
+
+
+def reserve_stock(order, lines):
+    """
+    Reserves (product_id, units) lines for an order.
+    Raises InsufficientStock and changes nothing when any product falls short.
+    """
+    wanted = OrderedDict()
+    for product_id, units in sorted(lines, key=lambda line: str(line[0])):
+        wanted[product_id] = wanted.get(product_id, 0) + units
+
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    with transaction.atomic():
+        stocks = Stock.objects.select_for_update().filter(
+            product_id__in=wanted.keys()).order_by('product_id', 'id')
+        by_product = OrderedDict()
+        for stock in stocks:
+            by_product.setdefault(stock.product_id, []).append(stock)
+
+        changed, reservations = [], []
+        for product_id, units in wanted.items():
+            rows = by_product.get(product_id)
+            if not rows:
+                continue
+            if sum(row.units_in_stock or 0 for row in rows) < units:
+                raise InsufficientStock(
+                    'Insufficient stock for product ' + str(product_id), 'product')
+            for row in rows:
+                taken = min(units, row.units_in_stock or 0)
+                if not taken:
+                    continue
+                row.units_in_stock -= taken
+                row.units_on_order = (row.units_on_order or 0) + taken
+                changed.append(row)
+                reservations.append(StockReservation(
+                    order=order, stock=row, units=taken, expires_at=expires_at))
+                units -= taken
+                if not units:
+                    break
+
+        Stock.objects.bulk_update(changed, ['units_in_stock', 'units_on_order'])
+        StockReservation.objects.bulk_create(reservations)
+    return reservations
+
+
+def _settle(order, restock):
+    with transaction.atomic():
+        reservations = list(StockReservation.objects.select_for_update(of=('self',)).filter(
+            order=order).order_by('stock__product_id', 'stock_id'))
+        for reservation in reservations:
+            Stock.objects.filter(pk=reservation.stock_id).update(
+                units_in_stock=F('units_in_stock') + (reservation.units if restock else 0),
+                units_on_order=F('units_on_order') - reservation.units,
+            )
+        StockReservation.objects.filter(
+            pk__in=[reservation.pk for reservation in reservations]).delete()
+    return len(reservations)
+
+
+def release_stock(order):
+    """Puts an order's reserved units back in stock. Safe to call more than once."""
+    return _settle(order, restock=True)
+
+
+def fulfil_stock(order):
+    """Delivered orders take their reserved units off units_on_order for good."""
+    return _settle(order, restock=False)
+
+
+def confirm_stock(order):
+    """Paid orders keep their reservation until delivery, however long that takes."""
+    return StockReservation.objects.filter(order=order).update(expires_at=None)
+
+
+def release_expired_reservations(now=None):
+    """Releases reservations of placed but unpaid orders whose window has passed."""
+    now = now or timezone.now()
+    orders = Order.all_with_deleted.filter(
+        stock_reservations__expires_at__lt=now, status=Order.PLACED,
+    ).exclude(payments__status=Payment.PAID).distinct()
+    released = 0
+    for order in orders:
+        release_stock(order)
+        released += 1
+    return released
+
+
+def adjust_stock(stock_id, units):
+    """
+    Adds (or with a negative value removes) units in a single conditional UPDATE,
+    so concurrent adjustments never read-modify-write over each other.
+    """
+    updated = Stock.objects.filter(pk=stock_id, units_in_stock__gte=-units).update(
+        units_in_stock=F('units_in_stock') + units)
+    if not updated:
+        raise InsufficientStock('Insufficient stock', 'units')
+
+
+def settle_order_stock(sender, instance, created, update_fields, **kwargs):
+    if instance.status in (Order.CANCELLED, Order.REJECTED):
+        release_stock(instance)
+    elif instance.status == Order.DELIVERED:
+        fulfil_stock(instance)
+
+
+def release_deleted_orders(sender, pks, **kwargs):
+    orders = Order.all_with_deleted.filter(pk__in=pks, stock_reservations__isnull=False)
+    for order in orders.distinct():
+        release_stock(order)
+
+
+post_save.connect(settle_order_stock, sender=Order)
+post_soft_delete.connect(release_deleted_orders, sender=Order)
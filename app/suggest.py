@@ -0,0 +1,171 @@
+"""
+Typeahead suggestions over product and shop names, served from memory.
+
+PrefixIndex keeps two sorted arrays of (key, kind, id): one keyed by whole
+names and one by the later words of each name, so "jui" finds "Mango Juice".
+A prefix lookup is two bisections. The index is built on first use, kept
+current by the Product/Shop signals below and holds at most
+SUGGEST_MAX_ENTRIES entries; names that do not fit are left to /search.
+Signals only reach the index of the process that wrote, so every process
+rebuilds its own after SUGGEST_INDEX_SECONDS to pick up the writes of the
+others.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .models import Product, Shop
+from .search import tokenize
+from .soft_delete import post_soft_delete
+
+PRODUCT = 'product'
+SHOP = 'shop'
+KINDS = {Product: PRODUCT, Shop: SHOP}
+# longer keys add nothing to a typeahead and only cost memory
+MAX_KEY_LENGTH = 40
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))[:MAX_KEY_LENGTH]
+
+
+class PrefixIndex:
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.names = []
+        self.words = []
+        self.display = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names) + len(self.words)
+
+    @staticmethod
+    def keys(name):
+        key = normalize(name)
+        words = key.split(' ')
+        return key, [' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(1, len(words))]
+
+    def _add(self, kind, pk, name, insort=bisect.insort):
+        name_key, word_keys = self.keys(name)
+        if not name_key or len(self) + 1 + len(word_keys) > self.max_entries:
+            return False
+        self.display[(kind, pk)] = (name, name_key, word_keys)
+        insort(self.names, (name_key, kind, pk))
+        for word_key in word_keys:
+            insort(self.words, (word_key, kind, pk))
+        return True
+
+    def _remove(self, kind, pk):
+        entry = self.display.pop((kind, pk), None)
+        if entry is None:
+            return
+        _, name_key, word_keys = entry
+        entries = [(self.names, name_key)] + [(self.words, word_key) for word_key in word_keys]
+        for array, key in entries:
+            i = bisect.bisect_left(array, (key, kind, pk))
+            if i < len(array) and array[i] == (key, kind, pk):
+                del array[i]
+
+    def add(self, kind, pk, name):
+        with self.lock:
+            self._remove(kind, pk)
+            return self._add(kind, pk, name)
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._remove(kind, pk)
+
+    def load(self, rows):
+        """Adds new (kind, pk, name) rows and sorts once, instead of one insort per key."""
+        with self.lock:
+            for kind, pk, name in rows:
+                if not self._add(kind, pk, name, insort=list.append):
+                    break
+            self.names.sort()
+            self.words.sort()
+
+    def suggest(self, prefix, limit=10):
+        """Up to limit {type, id, name} dicts, names starting with prefix before inner words."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        with self.lock:
+            for array in (self.names, self.words):
+                i = bisect.bisect_left(array, (prefix,))
+                while i < len(array) and len(found) < limit and array[i][0].startswith(prefix):
+                    _, kind, pk = array[i]
+                    if (kind, pk) not in seen:
+                        seen.add((kind, pk))
+                        found.append({'type': kind, 'id': pk, 'name': self.display[(kind, pk)][0]})
+                    i += 1
+        return found
+
+
+def build_index():
+    index = PrefixIndex(settings.SUGGEST_MAX_ENTRIES)
+    index.load((kind, str(pk), name)
+               for model, kind in KINDS.items()
+               for pk, name in model.objects.values_list('pk', 'name').order_by('name').iterator())
+    return index
+
+
+_index = None
+_built_at = 0.0
+_build_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _built_at
+    with _build_lock:
+        if _index is None or time.monotonic() - _built_at > settings.SUGGEST_INDEX_SECONDS:
+            _index = build_index()
+            _built_at = time.monotonic()
+        return _index
+
+
+def invalidate_index():
+    """Drops the index, to be rebuilt on next use, after writes that skip the signals."""
+    global _index
+    with _build_lock:
+        _index = None
+
+
+def suggest(prefix, limit=10):
+    return get_index().suggest(prefix, limit)
+
+
+def update_suggestion(sender, instance, **kwargs):
+    # read once, invalidate_index() may drop it meanwhile
+    index = _index
+    if index is None:
+        return
+    if instance.is_deleted:
+        index.remove(KINDS[sender], str(instance.pk))
+    else:
+        index.add(KINDS[sender], str(instance.pk), instance.name)
+
+
+def remove_suggestion(sender, instance, **kwargs):
+    index = _index
+    if index is not None:
+        index.remove(KINDS[sender], str(instance.pk))
+
+
+def remove_suggestions(sender, pks, **kwargs):
+    index = _index
+    if index is not None:
+        for pk in pks:
+            index.remove(KINDS[sender], str(pk))
+
+
+for suggest_model in KINDS:
+    post_save.connect(update_suggestion, sender=suggest_model)
+    post_delete.connect(remove_suggestion, sender=suggest_model)
+    post_soft_delete.connect(remove_suggestions, sender=suggest_model)
@@ -1,24 +1,47 @@
+from .activeFlag_test import *
 from .announcement_test import *
 from .announcementSerializer_test import *
+from .asyncViews_test import *
+from .benchmarks_test import *
+from .beyonicWebhook_test import *
+from .bulkEndpoints_test import *
+from .bulkFactories_test import *
+from .catalogCache_test import *
 from .category_test import *
 from .categorySerializer_test import *
-from .deliverySpeed_test import *
-from .deliverySpeedSerializer_test import *
+from .checkout_test import *
+from .collectionRequest_test import *
+from .dbConnections_test import *
 from .district_test import *
 from .districtSerializer_test import *
+from .eta_test import *
+from .instrumentation_test import *
+from .keysetPagination_test import *
 from .location_test import *
 from .locationSerializer_test import *
 from .order_test import *
+from .orderCurrentTracker_test import *
 from .orderItem_test import *
 from .orderItemSerializer_test import *
+from .orderQueryCount_test import *
 from .orderSerializer_test import *
 from .payment_test import *
 from .paymentSerializer_test import *
+from .pricing_test import *
 from .product_test import *
+from .productSearch_test import *
 from .productSerializer_test import *
+from .productSuggest_test import *
+from .queryPlan_test import *
+from .relatedCount_test import *
 from .shop_test import *
 from .shopSerializer_test import *
+from .snapshotRunner_test import *
+from .softDelete_test import *
+from .sparseFields_test import *
 from .stock_test import *
+from .stockReservation_test import *
 from .stockSerializer_test import *
+from .trackerStream_test import *
 from .user_test import *
 from .userSerializer_test import *
@@ -0,0 +1,60 @@
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Contact, Location, User
+
+
+class ActiveFlag_Test(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create(
+            username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.other = User.objects.create(username='other', phone='0700000002', role=User.CUSTOMER)
+        self.home = Location.objects.create(name='home', customer=self.customer)
+
+    def active_locations(self, customer):
+        active = Location.objects.filter(customer=customer, is_active=True)
+        return list(active.values_list('name', flat=True))
+
+    def test_new_location_becomes_the_active_one(self):
+        assert self.active_locations(self.customer) == ['home']
+        Location.objects.create(name='work', customer=self.customer)
+        assert self.active_locations(self.customer) == ['work']
+
+    def test_saves_that_leave_is_active_alone_do_not_update_other_rows(self):
+        home = Location.objects.get(pk=self.home.pk)
+        home.name = 'house'
+        with CaptureQueriesContext(connection) as context:
+            home.save()
+        assert len(context.captured_queries) == 1
+
+    def test_reactivating_a_row_deactivates_the_current_one_once(self):
+        Location.objects.create(name='work', customer=self.customer)
+        home = Location.objects.get(pk=self.home.pk)
+        home.is_active = True
+        with CaptureQueriesContext(connection) as context:
+            home.save()
+        assert len(context.captured_queries) == 2
+        assert self.active_locations(self.customer) == ['home']
+
+    def test_customer_contact_is_created_active(self):
+        contacts = Contact.objects.filter(customer=self.customer)
+        assert list(contacts.values_list('is_active', flat=True)) == [True]
+        Contact.objects.create(phone='0700000003', customer=self.customer)
+        assert Contact.objects.get(is_active=True, customer=self.customer).phone == '0700000003'
+
+    def test_database_allows_one_active_row_per_customer(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Location.objects.filter(customer=self.customer).update(is_active=False)
+            Location.objects.bulk_create([
+                Location(name=str(i), customer=self.customer, is_active=True) for i in range(2)])
+
+    def test_bulk_import_activates_the_last_row_per_customer(self):
+        rows = [Location(name=name, customer=customer) for name, customer in (
+            ('a', self.customer), ('b', self.other), ('c', self.customer), ('d', self.other))]
+        with CaptureQueriesContext(connection) as context:
+            Location.objects.bulk_import(rows)
+        assert self.active_locations(self.customer) == ['c']
+        assert self.active_locations(self.other) == ['d']
+        # one UPDATE and one INSERT inside a savepoint
+        assert len([q for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]) == 2
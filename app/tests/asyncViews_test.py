@@ -0,0 +1,68 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import (
+    AsyncClient,
+    Client,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import resolve
+
+from ..instrumentation import registry
+from ..middleware import WhiteNoiseMiddleware
+from ..models import Announcement, Category, Order, Product, Shop, User
+
+
+@override_settings(ROOT_URLCONF='project.asgi_urls')
+class AsyncViews_Test(TransactionTestCase):
+    # the views query from the pool threads, so the rows have to be committed
+    available_apps = ['app', 'django.contrib.auth', 'django.contrib.contenttypes']
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        Product.objects.create(name='mango', category=category, shop=shop)
+        Announcement.objects.create(title='opening hours', body='8 to 8')
+        customer = User.objects.create(username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.order = Order.objects.create(customer=customer, is_curated_list=True)
+
+    def test_hot_read_paths_resolve_to_coroutine_views(self):
+        paths = ['/api/v1/products/', '/api/v1/categories', '/api/v1/announcements/',
+                 '/api/v1/orders/{}/'.format(self.order.pk)]
+        for path in paths:
+            assert asyncio.iscoroutinefunction(resolve(path).func), path
+        assert not asyncio.iscoroutinefunction(resolve('/api/v1/shops/').func)
+
+    async def test_async_views_answer_like_the_sync_ones(self):
+        for path in ['/api/v1/products/', '/api/v1/categories/', '/api/v1/announcements/',
+                     '/api/v1/orders/{}/'.format(self.order.pk)]:
+            cache.clear()
+            response = await AsyncClient().get(path)
+            assert response.status_code == 200, path
+            cache.clear()
+            sync_response = await sync_to_async(Client().get)(path)
+            assert response.json() == sync_response.json(), path
+
+    async def test_async_order_detail_still_accepts_writes(self):
+        response = await AsyncClient().patch('/api/v1/orders/{}/'.format(self.order.pk),
+                                             {'status': Order.DELIVERED},
+                                             content_type='application/json')
+        assert response.status_code == 200
+        assert response.json()['status'] == Order.DELIVERED
+
+    async def test_queries_on_pool_threads_count_toward_the_request(self):
+        registry.series.clear()
+        await AsyncClient().get('/api/v1/products/')
+        histograms = registry.series[('products-list', 'GET')]
+        assert histograms['db_queries'].sum >= 1
+        assert histograms['serializer_duration_seconds'].sum > 0
+
+    def test_whitenoise_middleware_stays_async_in_an_async_chain(self):
+        async def get_response(request):
+            return None
+
+        assert asyncio.iscoroutinefunction(WhiteNoiseMiddleware(get_response))
+        assert not asyncio.iscoroutinefunction(WhiteNoiseMiddleware(lambda request: None))
@@ -0,0 +1,50 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ..benchmarks import build_scenarios, compare, run_scenarios
+from ..models import Contact, Order, OrderItem, OrderTracker, Product, User
+
+
+class SeedBenchmarkData_Test(TestCase):
+    def setUp(self):
+        call_command('seed_benchmark_data', customers=20, drivers=2, districts=3, categories=4,
+                     shops=3, products=30, orders=50, items_per_order=2, batch_size=20, seed=1,
+                     stdout=StringIO())
+
+    def test_rows_are_seeded_with_their_signal_side_effects(self):
+        assert User.objects.filter(role=User.CUSTOMER).count() == 20
+        assert Contact.objects.filter(is_active=True).count() == 20
+        if connection.vendor == 'postgresql':
+            assert Product.objects.exclude(search_vector=None).count() == 30
+        assert Order.objects.count() == 50
+        assert OrderItem.objects.count() == 100
+        for order in Order.objects.all()[:10]:
+            trackers = OrderTracker.objects.filter(order=order)
+            assert trackers.count() == order.current_tracker_number
+            assert order.total_amount == order.sub_total_amount + order.delivery_fee
+
+    def test_every_scenario_answers_successfully(self):
+        scenarios = [scenario for scenario in build_scenarios()
+                     if scenario.name.startswith(('products', 'orders', 'categories'))]
+        results = run_scenarios(scenarios, iterations=2, warmup=0)
+        assert {'products-list', 'products-detail', 'products-create',
+                'orders-list?pagination=keyset'} <= set(results)
+        for name, result in results.items():
+            assert all(200 <= code < 300 for code in result['status']), (name, result)
+            assert result['queries'] >= 1
+        assert Product.objects.count() == 30
+
+
+class Compare_Test(SimpleTestCase):
+    baseline = {'products-list': {'p95_ms': 10.0, 'queries': 3}}
+
+    def test_more_queries_or_slower_p95_are_regressions(self):
+        assert compare({'products-list': {'p95_ms': 12.0, 'queries': 3}}, self.baseline) == []
+        regressions = compare({'products-list': {'p95_ms': 13.0, 'queries': 4}}, self.baseline)
+        assert len(regressions) == 2
+
+    def test_scenarios_missing_from_the_baseline_are_skipped(self):
+        assert compare({'orders-list': {'p95_ms': 99.0, 'queries': 9}}, self.baseline) == []
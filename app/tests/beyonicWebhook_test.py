@@ -0,0 +1,123 @@
+import base64
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import BeyonicEvent, Order, OrderTracker, Payment, User
+
+
+def basic_auth(password):
+    return 'Basic ' + base64.b64encode('beyonic:{}'.format(password).encode()).decode()
+
+
+@override_settings(BEYONIC_WEBHOOK_SECRET='webhook-secret')
+class BeyonicWebhook_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        self.api_client.credentials(HTTP_AUTHORIZATION=basic_auth('webhook-secret'))
+        customer = User.objects.create(
+            username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.order = Order.objects.create(customer=customer)
+        self.payment = Payment.objects.create(order=self.order, customer=customer, amount=5500)
+
+    def deliver(self, remote_transaction_id, payment_id, collection_status='successful'):
+        return self.api_client.post(reverse('beyonic webhook'), {
+            'remote_transaction_id': remote_transaction_id,
+            'status': collection_status,
+            'metadata': {'payment_id': str(payment_id)},
+        }, format='json')
+
+    def drain(self):
+        call_command('process_beyonic_events', stdout=StringIO())
+
+    def test_webhook_only_stores_the_event(self):
+        response = self.deliver('tx-1', self.payment.pk)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data == 'ACCEPT tx-1'
+        assert BeyonicEvent.objects.get().processed_at is None
+        assert Payment.objects.get().status == Payment.PENDING
+
+    def test_webhook_requires_the_shared_secret(self):
+        for authorization in (basic_auth('guess'), 'Basic !!', ''):
+            self.api_client.credentials(HTTP_AUTHORIZATION=authorization)
+            response = self.deliver('tx-1', self.payment.pk)
+            assert response.status_code in (status.HTTP_401_UNAUTHORIZED,
+                                            status.HTTP_403_FORBIDDEN)
+        with self.settings(BEYONIC_WEBHOOK_SECRET=''):
+            self.api_client.credentials(HTTP_AUTHORIZATION=basic_auth(''))
+            assert self.deliver('tx-1', self.payment.pk).status_code == status.HTTP_403_FORBIDDEN
+        assert not BeyonicEvent.objects.exists()
+
+    def test_webhook_without_transaction_id_is_rejected(self):
+        response = self.api_client.post(reverse('beyonic webhook'), {}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not BeyonicEvent.objects.exists()
+
+    def test_worker_marks_payment_paid_and_tracks_goods_purchased(self):
+        self.deliver('tx-1', self.payment.pk)
+        self.drain()
+        payment = Payment.objects.get()
+        assert payment.status == Payment.PAID
+        assert payment.paid_at is not None
+        tracker = self.order.ordertrackers.get()
+        assert tracker.number == OrderTracker.GOODS_PURCHASED
+        assert BeyonicEvent.objects.get().processed_at is not None
+
+    def test_duplicate_deliveries_are_applied_once(self):
+        self.deliver('tx-1', self.payment.pk)
+        self.deliver('tx-1', self.payment.pk)
+        self.drain()
+        self.deliver('tx-1', self.payment.pk)
+        self.drain()
+        errors = BeyonicEvent.objects.values_list('error', flat=True)
+        assert list(errors) == [None, 'duplicate', 'duplicate']
+        assert self.order.ordertrackers.count() == 1
+
+    def test_unknown_payment_is_recorded_not_retried(self):
+        self.deliver('tx-2', 'not-a-payment')
+        self.drain()
+        event = BeyonicEvent.objects.get()
+        assert event.processed_at is not None
+        assert event.error
+
+    def test_failed_collection_fails_the_payment(self):
+        self.deliver('tx-1', self.payment.pk, 'failed')
+        self.drain()
+        assert Payment.objects.get().status == Payment.FAILED
+        assert not self.order.ordertrackers.exists()
+        assert BeyonicEvent.objects.get().error is None
+
+    def test_unsettled_status_changes_nothing(self):
+        self.deliver('tx-1', self.payment.pk, 'pending')
+        self.drain()
+        assert Payment.objects.get().status == Payment.PENDING
+        assert BeyonicEvent.objects.get().error
+
+    def test_paid_payment_is_not_failed_by_a_later_event(self):
+        self.deliver('tx-1', self.payment.pk)
+        self.deliver('tx-2', self.payment.pk, 'expired')
+        self.drain()
+        assert Payment.objects.get().status == Payment.PAID
+
+    def test_unexpected_error_only_fails_its_own_event(self):
+        customer = self.payment.customer
+        other = Payment.objects.create(order=Order.objects.create(customer=customer),
+                                       customer=customer, amount=500)
+        self.deliver('tx-1', self.payment.pk)
+        self.deliver('tx-2', other.pk)
+
+        def confirm_stock(order):
+            if order == self.order:
+                raise RuntimeError('boom')
+
+        with mock.patch('app.webhooks.confirm_stock', side_effect=confirm_stock):
+            self.drain()
+        errors = dict(BeyonicEvent.objects.values_list('remote_transaction_id', 'error'))
+        assert errors == {'tx-1': 'RuntimeError: boom', 'tx-2': None}
+        assert Payment.objects.get(pk=self.payment.pk).status == Payment.PENDING
+        assert Payment.objects.get(pk=other.pk).status == Payment.PAID
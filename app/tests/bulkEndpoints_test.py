@@ -0,0 +1,141 @@
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..catalog import get_catalog_version
+from ..models import (
+    Category,
+    Contact,
+    Order,
+    OrderItem,
+    OrderTracker,
+    Product,
+    Shop,
+    Stock,
+    User,
+)
+
+
+class BulkEndpoints_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api_client = APIClient()
+        self.admin = User.objects.create(username='admin', phone='0700000000', role=User.ADMIN)
+        self.api_client.force_authenticate(user=self.admin)
+        self.categories = [Category.objects.create(name=name) for name in ('fruits', 'greens')]
+        self.shops = [Shop.objects.create(name=name) for name in ('market', 'corner')]
+        self.url = reverse('products-bulk')
+
+    def product_rows(self, size, prefix='product'):
+        return [{'name': '{} {}'.format(prefix, n), 'price': 1000 + n,
+                 'category': str(self.categories[n % 2].pk), 'shop': str(self.shops[n % 2].pk)}
+                for n in range(size)]
+
+    def test_create_looks_related_ids_up_once_per_field(self):
+        version = get_catalog_version()
+        with CaptureQueriesContext(connection) as few:
+            response = self.api_client.post(self.url, self.product_rows(2), format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        with CaptureQueriesContext(connection) as many:
+            response = self.api_client.post(self.url, self.product_rows(50, 'item'), format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['count'] == 50
+        assert len(many) == len(few)
+        assert Product.objects.filter(pk__in=response.data['ids']).count() == 50
+        assert get_catalog_version() != version
+
+    def test_an_invalid_row_writes_nothing(self):
+        rows = self.product_rows(3)
+        rows[1]['category'] = '00000000-0000-0000-0000-000000000000'
+        del rows[2]['name']
+        response = self.api_client.post(self.url, rows, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert [row['index'] for row in response.data['rows']] == [1, 2]
+        assert 'category' in response.data['rows'][0]['errors']
+        assert 'name' in response.data['rows'][1]['errors']
+        assert not Product.objects.exists()
+
+    def test_update_changes_only_the_given_fields(self):
+        ids = self.api_client.post(self.url, self.product_rows(3), format='json').data['ids']
+        response = self.api_client.patch(
+            self.url, [{'id': pk, 'price': 500} for pk in ids[:2]], format='json')
+        assert response.status_code == status.HTTP_200_OK
+        prices = dict(Product.objects.values_list('name', 'price'))
+        assert prices == {'product 0': 500, 'product 1': 500, 'product 2': 1002}
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'SQLite has no row locks')
+    def test_update_locks_its_rows_in_reservation_order(self):
+        product = Product.objects.create(name='mango', category=self.categories[0],
+                                         shop=self.shops[0])
+        stock = Stock.objects.create(product=product, units_in_stock=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.patch(
+                reverse('stock-bulk'), [{'id': str(stock.pk), 'units_in_stock': 5}], format='json')
+        assert response.status_code == status.HTTP_200_OK
+        select = next(query['sql'] for query in queries if query['sql'].startswith('SELECT'))
+        assert select.endswith('FOR UPDATE OF "stock"')
+        assert '"stock"."product_id" ASC, "stock"."id" ASC' in select
+
+    def test_update_reports_unknown_and_duplicate_rows(self):
+        pk = self.api_client.post(self.url, self.product_rows(1), format='json').data['ids'][0]
+        rows = [{'id': pk, 'price': 500}, {'id': pk, 'price': 600}, {'id': 'nope', 'price': 700}]
+        response = self.api_client.patch(self.url, rows, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['rows'] == [
+            {'index': 1, 'errors': {'id': ['Duplicate row.']}},
+            {'index': 2, 'errors': {'id': ['Not found.']}},
+        ]
+        assert Product.objects.get().price == 1000
+
+    def test_delete_soft_deletes(self):
+        ids = self.api_client.post(self.url, self.product_rows(3), format='json').data['ids']
+        Stock.objects.create(product_id=ids[0], units_in_stock=1)
+        response = self.api_client.delete(self.url, ids[:2], format='json')
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert list(Product.objects.values_list('name', flat=True)) == ['product 2']
+        assert Product.all_with_deleted.count() == 3
+        assert not Stock.objects.exists()
+
+    def test_rows_must_be_a_bounded_list(self):
+        response = self.api_client.post(self.url, {'name': 'mango'}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        with self.settings(BULK_MAX_ROWS=2):
+            response = self.api_client.post(self.url, self.product_rows(3), format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Product.objects.exists()
+
+    def test_one_contact_per_customer_stays_active(self):
+        customer = User.objects.create(username='jane', phone='0700000001', role=User.CUSTOMER)
+        url = reverse('contacts-bulk')
+        rows = [{'phone': '07000000{:02d}'.format(n), 'customer': str(customer.pk),
+                 'is_active': True} for n in range(10, 13)]
+        ids = self.api_client.post(url, rows, format='json').data['ids']
+        active = Contact.objects.filter(customer=customer, is_active=True)
+        assert list(active.values_list('pk', flat=True)) == [ids[-1]]
+
+        response = self.api_client.patch(url, [{'id': ids[0], 'is_active': True}], format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert list(active.values_list('pk', flat=True)) == [ids[0]]
+
+    def test_moving_rows_to_another_order_refreshes_both_orders(self):
+        product = Product.objects.create(name='apple', price=1000, category=self.categories[0],
+                                         shop=self.shops[0])
+        old, new = Order.objects.create(), Order.objects.create()
+        item = OrderItem.objects.create(order=old, product=product, units=2)
+        OrderTracker.objects.create(order=old, number=1, name='Order Placed')
+        tracker = OrderTracker.objects.create(order=old, number=3, name='Goods Purchased')
+
+        for url, pk in (('orderItems-bulk', item.pk), ('ordertrackers-bulk', tracker.pk)):
+            response = self.api_client.patch(
+                reverse(url), [{'id': str(pk), 'order': str(new.pk)}], format='json')
+            assert response.status_code == status.HTTP_200_OK
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert (old.sub_total_amount, old.current_tracker_number) == (0, 1)
+        assert (new.sub_total_amount, new.current_tracker_number) == (2000, 3)
@@ -0,0 +1,69 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..catalog import get_catalog_version
+from ..models import (
+    Contact,
+    Location,
+    Order,
+    OrderItem,
+    OrderTracker,
+    Payment,
+    Product,
+    Stock,
+    User,
+)
+from ..pricing import discounted_price
+from .factories import (
+    OrderFactory,
+    OrderItemFactory,
+    OrderWithForeignFactory,
+    ProductWithForeignFactory,
+    UserFactory,
+    bulk_batch,
+)
+
+
+class BulkFactories_Test(TestCase):
+    def test_object_graphs_are_written_with_bulk_inserts_per_model(self):
+        with CaptureQueriesContext(connection) as queries:
+            orders = OrderWithForeignFactory.create_batch_in_bulk(50, payments=2)
+        # users, locations, orders, payments and contacts, split by SQLite's parameter limit
+        assert len(queries) < 15
+        assert Order.objects.filter(pk__in=[order.pk for order in orders]).count() == 50
+        assert Payment.objects.filter(order__in=orders).count() == 100
+        assert Location.objects.filter(orders__in=orders).distinct().count() == 50
+
+    def test_customers_get_their_initial_contact(self):
+        customers = UserFactory.create_batch_in_bulk(10, role=User.CUSTOMER)
+        for customer in customers:
+            contacts = Contact.objects.filter(customer=customer)
+            assert [(c.phone, c.is_active) for c in contacts] == [(customer.phone, True)]
+
+    def test_only_the_latest_location_of_a_customer_is_active(self):
+        customer = UserFactory(role=User.DRIVER)
+        Location.objects.create(customer=customer)
+        locations = [Location(customer=customer) for n in range(3)]
+        with bulk_batch() as batch:
+            for location in locations:
+                batch.add(location)
+        assert list(Location.objects.filter(customer=customer, is_active=True)) == [locations[-1]]
+
+    def test_orders_get_their_totals_and_current_tracker(self):
+        with bulk_batch() as batch:
+            order = OrderFactory.build()
+            batch.add(OrderItemFactory.build(order=order, units=2))
+            batch.add(OrderTracker(order=order, number=1, name='Order Placed'))
+            batch.add(OrderTracker(order=order, number=2, name='Goods Purchased'))
+        order.refresh_from_db()
+        item = OrderItem.objects.get(order=order)
+        assert order.sub_total_amount == discounted_price(item.product) * item.units
+        assert order.current_tracker_name == 'Goods Purchased'
+
+    def test_catalog_version_moves_with_bulk_products(self):
+        version = get_catalog_version()
+        products = ProductWithForeignFactory.create_batch_in_bulk(3, stocks=2, orderitems=1)
+        assert get_catalog_version() != version
+        assert Stock.objects.filter(product__in=products).count() == 6
+        assert Product.objects.filter(pk__in=[p.pk for p in products]).count() == 3
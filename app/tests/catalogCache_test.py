@@ -0,0 +1,66 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Category, Product, Shop, Stock
+
+
+class CatalogCache_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api_client = APIClient()
+        self.category = Category.objects.create(name='fruits')
+        self.shop = Shop.objects.create(name='market')
+        self.product = Product.objects.create(name='mango', category=self.category, shop=self.shop)
+
+    def test_list_is_served_with_strong_etag(self):
+        response = self.api_client.get(reverse('products-list'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'].startswith('"')
+
+    def test_matching_etag_returns_not_modified_without_queries(self):
+        etag = self.api_client.get(reverse('products-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.api_client.get(reverse('products-list'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+    def test_cached_list_is_served_without_queries(self):
+        first = self.api_client.get(reverse('categories-list'))
+        with self.assertNumQueries(0):
+            second = self.api_client.get(reverse('categories-list'))
+        assert first.data == second.data
+
+    def test_catalog_writes_change_the_etag(self):
+        for write in (lambda: Product.objects.create(name='orange', category=self.category,
+                                                     shop=self.shop),
+                      lambda: Stock.objects.create(product=self.product, units_in_stock=3),
+                      lambda: self.shop.delete()):
+            etag = self.api_client.get(reverse('shops-list'))['ETag']
+            write()
+            response = self.api_client.get(reverse('shops-list'), HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == status.HTTP_200_OK
+            assert response['ETag'] != etag
+
+    def test_detail_response_reflects_updates(self):
+        url = reverse('products-detail', kwargs={'pk': self.product.pk})
+        assert self.api_client.get(url).data['price'] == 500
+        self.product.price = 900
+        self.product.save()
+        assert self.api_client.get(url).data['price'] == 900
+
+    def test_local_cache_sees_other_processes_writes_after_the_version_expires(self):
+        url = reverse('products-detail', kwargs={'pk': self.product.pk})
+        assert self.api_client.get(url).data['price'] == 500
+        # another worker's bump never reaches this process' LocMemCache
+        Product.objects.filter(pk=self.product.pk).update(price=900)
+        assert self.api_client.get(url).data['price'] == 500
+        later = time.time() + settings.CATALOG_VERSION_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            assert self.api_client.get(url).data['price'] == 900
@@ -0,0 +1,112 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import (
+    Category,
+    Location,
+    Order,
+    OrderItem,
+    OrderTracker,
+    Payment,
+    Product,
+    Shop,
+    Stock,
+    User,
+)
+
+
+class Checkout_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        self.customer = User.objects.create(
+            username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.api_client.force_authenticate(user=self.customer)
+        self.location = Location.objects.create(name='home', customer=self.customer)
+        category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        self.mango = Product.objects.create(
+            name='mango', price=1000, discount=10, category=category, shop=shop)
+        self.orange = Product.objects.create(name='orange', price=600, category=category, shop=shop)
+
+    def checkout(self, items, **extra):
+        data = dict({'location': str(self.location.pk), 'items': items}, **extra)
+        return self.api_client.post(reverse('orders-checkout'), data, format='json')
+
+    def test_checkout_creates_order_items_payment_and_tracker(self):
+        response = self.checkout([{'product': str(self.mango.pk), 'units': 2},
+                                  {'product': str(self.orange.pk), 'units': 3}],
+                                 payment={'payment_method': Payment.MOMO,
+                                          'momo_phone_number': '0700000001'})
+        assert response.status_code == status.HTTP_201_CREATED
+        order = Order.objects.get(pk=response.data['id'])
+
+        assert order.customer == self.customer
+        assert order.sub_total_amount == 2 * 900 + 3 * 600
+        assert order.total_amount == order.sub_total_amount + order.delivery_fee
+        assert order.orderitems.count() == 2
+        payment = order.payments.get()
+        assert payment.amount == order.total_amount
+        assert payment.payment_method == Payment.MOMO
+        assert order.ordertrackers.get().number == OrderTracker.ORDER_PLACED
+        assert response.data['last_tracker_status'] == 'Order Placed'
+
+    def test_client_amounts_are_ignored(self):
+        response = self.checkout([{'product': str(self.orange.pk), 'units': 1}],
+                                 total_amount=1, sub_total_amount=1)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['sub_total_amount'] == 600
+
+    def test_orders_are_placed_for_the_requesting_user_only(self):
+        other = User.objects.create(username='other', phone='0700000002', role=User.CUSTOMER)
+        response = self.checkout([{'product': str(self.orange.pk), 'units': 1}],
+                                 customer=str(other.pk))
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Order.objects.get(pk=response.data['id']).customer == self.customer
+        assert not Order.objects.filter(customer=other).exists()
+
+    def test_unknown_product_is_rejected(self):
+        response = self.checkout([{'product': str(self.mango.pk), 'units': 1},
+                                  {'product': str(self.location.pk), 'units': 1}])
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['params'] == ['items']
+
+    def test_failed_reservation_rolls_back_everything(self):
+        # the order and its items are written before the stock turns out to be short
+        Stock.objects.create(product=self.orange, units_in_stock=1)
+        response = self.checkout([{'product': str(self.mango.pk), 'units': 1},
+                                  {'product': str(self.orange.pk), 'units': 2}],
+                                 payment={'payment_method': Payment.CASH})
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert not Order.all_with_deleted.exists()
+        assert not OrderItem.all_with_deleted.exists()
+        assert not Payment.all_with_deleted.exists()
+        assert not OrderTracker.all_with_deleted.exists()
+        assert self.orange.stocks.get().units_in_stock == 1
+
+    def test_other_customers_locations_are_rejected(self):
+        other = User.objects.create(username='other', phone='0700000002', role=User.CUSTOMER)
+        self.location = Location.objects.create(name='away', customer=other)
+        response = self.checkout([{'product': str(self.orange.pk), 'units': 1}])
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['params'] == ['location']
+        assert not Order.objects.exists()
+
+    def test_checkout_requires_a_signed_in_customer(self):
+        self.api_client.force_authenticate(user=None)
+        response = self.checkout([{'product': str(self.orange.pk), 'units': 1}],
+                                 payment={'payment_method': Payment.CASH})
+        assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+        assert not Order.objects.exists()
+        assert not Payment.objects.exists()
+
+    def test_query_count_does_not_grow_with_items(self):
+        with CaptureQueriesContext(connection) as one_item:
+            self.checkout([{'product': str(self.mango.pk), 'units': 1}])
+        with CaptureQueriesContext(connection) as two_items:
+            self.checkout([{'product': str(self.mango.pk), 'units': 1},
+                           {'product': str(self.orange.pk), 'units': 1}])
+        assert len(one_item.captured_queries) == len(two_items.captured_queries)
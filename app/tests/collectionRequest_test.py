@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import CollectionRequest, Order, Payment, User
+from ..payments import send_due_requests
+
+
+class StubBeyonic(BaseHTTPRequestHandler):
+    """Stands in for the Beyonic collectionrequests endpoint."""
+    failures_left = 0
+    in_flight = 0
+    max_in_flight = 0
+    received = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            fail = cls.failures_left > 0
+            cls.failures_left -= 1
+        time.sleep(0.05)
+        self.rfile.read(int(self.headers['Content-Length']))
+        cls.received.append(self.headers.get('Duplicate-Check-Key'))
+        body = json.dumps({'error': 'down'} if fail else {'id': 4242, 'status': 'pending'}).encode()
+        self.send_response(500 if fail else 201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with cls.lock:
+            cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class CollectionRequest_Test(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBeyonic)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(
+            BEYONIC_API_BASE='http://127.0.0.1:{}/api/'.format(cls.server.server_port),
+            BEYONIC_MAX_ATTEMPTS=2)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubBeyonic.failures_left = 0
+        StubBeyonic.max_in_flight = 0
+        StubBeyonic.received = []
+        self.customer = User.objects.create(
+            username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.order = Order.objects.create(customer=self.customer)
+
+    def create_payment(self):
+        return Payment.objects.create(order=self.order, customer=self.customer, amount=5500,
+                                      payment_method=Payment.MOMO, momo_phone_number='0700000001')
+
+    def test_momo_payment_enqueues_instead_of_sending(self):
+        payment = self.create_payment()
+        collection_request = CollectionRequest.objects.get()
+        assert collection_request.payment == payment
+        assert collection_request.status == CollectionRequest.PENDING
+        assert StubBeyonic.received == []
+
+    def test_cash_payment_is_not_enqueued(self):
+        Payment.objects.create(order=self.order, customer=self.customer, amount=5500)
+        assert not CollectionRequest.objects.exists()
+
+    def test_due_requests_are_sent(self):
+        self.create_payment()
+        call_command('send_collection_requests', stdout=StringIO())
+        collection_request = CollectionRequest.objects.get()
+        assert collection_request.status == CollectionRequest.SENT
+        assert collection_request.remote_id == '4242'
+        assert StubBeyonic.received == [str(collection_request.pk)]
+
+    def test_failures_back_off_then_give_up(self):
+        StubBeyonic.failures_left = 2
+        self.create_payment()
+        assert send_due_requests() == 1
+        collection_request = CollectionRequest.objects.get()
+        assert collection_request.status == CollectionRequest.PENDING
+        assert collection_request.attempts == 1
+        assert collection_request.next_attempt_at > timezone.now()
+        assert send_due_requests() == 0
+
+        CollectionRequest.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        send_due_requests()
+        collection_request.refresh_from_db()
+        assert collection_request.status == CollectionRequest.FAILED
+        assert collection_request.last_error
+
+    def test_concurrency_is_limited(self):
+        for i in range(8):
+            self.create_payment()
+        assert send_due_requests(concurrency=3) == 8
+        assert CollectionRequest.objects.filter(status=CollectionRequest.SENT).count() == 8
+        assert 1 < StubBeyonic.max_in_flight <= 3
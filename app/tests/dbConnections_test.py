@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..db_connections import (
+    check_connections,
+    check_pool_size,
+    count_opened,
+    stats,
+)
+from ..models import User
+
+
+def fake_connection(open=True, usable=True):
+    connection = mock.Mock(in_atomic_block=False)
+    connection.connection = object() if open else None
+    connection.is_usable.return_value = usable
+    return connection
+
+
+class DbConnections_Test(SimpleTestCase):
+    def setUp(self):
+        stats.reset()
+
+    def check(self, *fakes):
+        with mock.patch('app.db_connections.connections') as connections:
+            connections.all.return_value = list(fakes)
+            check_connections()
+
+    def test_kept_connection_is_checked_and_counted_as_reused(self):
+        connection = fake_connection()
+        self.check(connection)
+        connection.is_usable.assert_called_once_with()
+        connection.close.assert_not_called()
+        assert stats.as_dict()['reused'] == 1
+
+    def test_dropped_connection_is_closed_so_the_request_reconnects(self):
+        connection = fake_connection(usable=False)
+        self.check(connection)
+        connection.close.assert_called_once_with()
+        assert stats.as_dict()['failed_health_checks'] == 1
+        assert stats.as_dict()['reused'] == 0
+
+    def test_closed_connection_is_skipped(self):
+        connection = fake_connection(open=False)
+        self.check(connection)
+        connection.is_usable.assert_not_called()
+        assert stats.as_dict()['reused'] == 0
+
+    @override_settings(DATABASE_HEALTH_CHECKS=False)
+    def test_health_checks_can_be_turned_off(self):
+        connection = fake_connection(usable=False)
+        self.check(connection)
+        connection.is_usable.assert_not_called()
+        assert stats.as_dict()['reused'] == 1
+
+    def test_reuse_rate(self):
+        assert stats.as_dict()['reuse_rate'] is None
+        count_opened(sender=None, connection=None)
+        for _ in range(3):
+            self.check(fake_connection())
+        assert stats.as_dict()['reuse_rate'] == 0.75
+
+    @override_settings(DATABASE_POOL_SIZE=4, GUNICORN_THREADS=8, ASYNC_DB_THREADS=3)
+    def test_threads_beyond_the_pool_size_are_reported(self):
+        warnings = check_pool_size(None)
+        assert [warning.id for warning in warnings] == ['app.W001']
+        assert 'GUNICORN_THREADS' in warnings[0].msg
+
+
+class DbConnectionMetrics_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+
+    def test_metrics_are_for_admins_only(self):
+        response = self.api_client.get(reverse('database-metrics'))
+        assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics_report_reuse_and_pool_settings(self):
+        admin = User.objects.create(username='admin', phone='0700000009', is_staff=True)
+        self.api_client.force_authenticate(admin)
+        response = self.api_client.get(reverse('database-metrics'))
+        assert response.status_code == status.HTTP_200_OK
+        assert {'opened', 'reused', 'reuse_rate', 'conn_max_age', 'pool_size'} <= set(response.data)
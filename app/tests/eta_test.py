@@ -0,0 +1,80 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import eta
+from ..models import District, Location, Order
+from ..serializers import OrderSerializer
+
+
+class Eta_Test(TestCase):
+    def setUp(self):
+        eta.invalidate_matrix()
+        self.district = District.objects.create(name='Wakiso')
+        Location.objects.create(name='a', lat=0.40, lng=32.50, district=self.district)
+        Location.objects.create(name='b', lat=0.50, lng=32.60, district=self.district)
+        self.far = District.objects.create(name='Gulu')
+        Location.objects.create(name='c', lat=2.78, lng=32.30, district=self.far)
+
+    def test_distance_matrix_uses_district_centroids(self):
+        matrix = eta.get_matrix()
+        assert 300 < matrix.origin_to(self.far.pk) < 400
+        assert matrix.origin_to(self.far.pk) > matrix.origin_to(self.district.pk)
+
+    def test_location_writes_update_their_districts_in_place(self):
+        matrix = eta.get_matrix()
+        near = matrix.origin_to(self.district.pk)
+        moved = Location.objects.get(name='c')
+        moved.district = self.district
+        moved.save()
+        assert eta.get_matrix() is matrix
+        assert matrix.origin_to(self.far.pk) is None
+        assert matrix.origin_to(self.district.pk) > near
+
+        Location.objects.create(name='e', lat=2.78, lng=32.30, district=self.far)
+        location = Location.objects.create(name='no coordinates', district=self.far)
+        with self.assertNumQueries(0):
+            eta.estimate_delivery(location, Order.VEHICLE, Order.ORDINARY)
+        assert 300 < matrix.origin_to(self.far.pk) < 400
+
+        self.far.delete()
+        assert matrix.origin_to(self.far.pk) is None
+
+    def test_estimate_costs_no_queries(self):
+        location = Location.objects.create(name='no coordinates', district=self.far)
+        start = timezone.now()
+        eta.get_matrix()
+        with self.assertNumQueries(0):
+            by_motorcycle = eta.estimate_delivery(location, Order.MOTORCYCLE, Order.ORDINARY, start)
+            by_vehicle = eta.estimate_delivery(location, Order.VEHICLE, Order.ORDINARY, start)
+            pickup = eta.estimate_delivery(location, Order.PICKUP, Order.EXPRESS, start)
+        assert start + timedelta(hours=2) < by_motorcycle < by_vehicle
+        assert pickup == start + eta.PREPARATION[Order.EXPRESS]
+
+    def test_new_orders_get_an_expected_delivery_time(self):
+        location = Location.objects.get(name='c')
+        serializer = OrderSerializer(data={'location': str(
+            location.pk), 'delivery_speed': Order.EXPRESS})
+        assert serializer.is_valid(), serializer.errors
+        order = serializer.save()
+        assert order.expected_delivery_date_time > timezone.now() + timedelta(hours=10)
+
+    def test_batch_mode_matches_single_estimates(self):
+        near = Location.objects.get(name='a')
+        orders = [Order.objects.create(location=near, delivery_method=Order.VEHICLE),
+                  Order.objects.create(location=Location.objects.create(
+                      name='d', district=self.far)),
+                  Order.objects.create(location=near, delivery_method=Order.PICKUP),
+                  Order.objects.create(location=near, status=Order.DELIVERED)]
+        call_command('reestimate_etas', '--batch-size', '2', stdout=StringIO())
+
+        for order in orders[:3]:
+            order.refresh_from_db()
+            expected = eta.estimate_delivery(order.location, order.delivery_method,
+                                             order.delivery_speed, order.created_at)
+            assert abs(order.expected_delivery_date_time - expected) < timedelta(seconds=1)
+        orders[3].refresh_from_db()
+        assert orders[3].expected_delivery_date_time is None
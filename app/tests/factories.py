@@ -1,3 +1,5 @@
+import contextvars
+from contextlib import contextmanager
 from datetime import timedelta, timezone
 from random import randint, uniform
 
@@ -6,10 +8,10 @@ from factory import LazyAttribute, LazyFunction, SubFactory, fuzzy
 from factory.django import DjangoModelFactory
 from faker import Factory
 
+from app.bulk import bulk_create_instances
 from app.models import (
     Announcement,
     Category,
-    DeliverySpeed,
     District,
     Location,
     Order,
@@ -23,44 +25,110 @@ from app.models import (
 
 faker = Factory.create()
 
+current_batch = contextvars.ContextVar('current_batch', default=None)
 
-class UserFactory(DjangoModelFactory):
+
+class BulkBatch:
+    """
+    Built, unsaved instances, written with one bulk_create per model.
+
+    add() takes the unsaved objects an instance points to (its SubFactory
+    parents) along, so each model is inserted after the models it references.
+    save() hands them to app.bulk.bulk_create_instances(), which also does in
+    bulk what the receivers do after each save(). Instances are not
+    refreshed, amounts computed in the database need a refresh_from_db().
+    """
+
+    def __init__(self):
+        # id() -> instance, parents before children
+        self.instances = {}
+
+    def add(self, instance):
+        if id(instance) in self.instances or not instance._state.adding:
+            return
+        for field in instance._meta.concrete_fields:
+            if field.many_to_one or field.one_to_one:
+                parent = field.get_cached_value(instance, default=None)
+                if parent is not None:
+                    self.add(parent)
+        self.instances[id(instance)] = instance
+
+    def by_model(self):
+        groups = {}
+        for instance in self.instances.values():
+            groups.setdefault(type(instance), []).append(instance)
+        return groups
+
+    def save(self):
+        return bulk_create_instances(self.by_model())
+
+
+@contextmanager
+def bulk_batch():
+    """
+    Collects what is add()ed to the yielded batch, and what the *WithForeign
+    post_generation hooks build, then saves it all in bulk on exit.
+    """
+    batch = BulkBatch()
+    token = current_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        current_batch.reset(token)
+    batch.save()
+
+
+def generate_related(factory_class, create, extracted, **kwargs):
+    """
+    The post_generation hooks: extracted (or 1 to 10) related rows, created one
+    by one, or built into the current batch in batch mode.
+    """
+    batch = current_batch.get()
+    if not create and batch is None:
+        return
+    for n in range(extracted or randint(1, 10)):
+        if batch is None:
+            factory_class(**kwargs)
+        else:
+            batch.add(factory_class.build(**kwargs))
+
+
+class BulkModelFactory(DjangoModelFactory):
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def create_batch_in_bulk(cls, size, **kwargs):
+        """create_batch(), with whole object graphs written by one bulk_create per model."""
+        with bulk_batch() as batch:
+            instances = cls.build_batch(size, **kwargs)
+            for instance in instances:
+                batch.add(instance)
+        return instances
+
+
+class UserFactory(BulkModelFactory):
     class Meta:
         model = User
 
+    username = factory.Sequence(lambda n: 'user{}'.format(n))
     dob = LazyFunction(faker.date)
     verified = LazyFunction(faker.boolean)
-    phone = LazyAttribute(lambda o: faker.text(max_nb_chars=15))
+    phone = factory.Sequence(lambda n: '079{:07d}'.format(n))
     role = fuzzy.FuzzyChoice(User.ROLE_CHOICES, getter=lambda c: c[0])
 
 
 class UserWithForeignFactory(UserFactory):
     @factory.post_generation
     def payments(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                PaymentFactory(customer=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                PaymentFactory(customer=obj)
+        generate_related(PaymentFactory, create, extracted, customer=obj)
 
     @factory.post_generation
     def orders(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                OrderFactory(driver=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                OrderFactory(driver=obj)
+        generate_related(OrderFactory, create, extracted, driver=obj)
 
 
-class DistrictFactory(DjangoModelFactory):
+class DistrictFactory(BulkModelFactory):
     class Meta:
         model = District
 
@@ -70,18 +138,10 @@ class DistrictFactory(DjangoModelFactory):
 class DistrictWithForeignFactory(DistrictFactory):
     @factory.post_generation
     def locations(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                LocationFactory(district=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                LocationFactory(district=obj)
+        generate_related(LocationFactory, create, extracted, district=obj)
 
 
-class LocationFactory(DjangoModelFactory):
+class LocationFactory(BulkModelFactory):
     class Meta:
         model = Location
 
@@ -92,53 +152,29 @@ class LocationFactory(DjangoModelFactory):
 class LocationWithForeignFactory(LocationFactory):
     @factory.post_generation
     def users(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                UserFactory(location=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                UserFactory(location=obj)
+        generate_related(UserFactory, create, extracted, location=obj)
 
     @factory.post_generation
     def orders(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                OrderFactory(location=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                OrderFactory(location=obj)
+        generate_related(OrderFactory, create, extracted, location=obj)
 
 
-class CategoryFactory(DjangoModelFactory):
+class CategoryFactory(BulkModelFactory):
     class Meta:
         model = Category
 
     name = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
     description = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
-    image = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
+    image = LazyAttribute(lambda o: faker.text(max_nb_chars=100))
 
 
 class CategoryWithForeignFactory(CategoryFactory):
     @factory.post_generation
     def products(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                ProductFactory(category=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                ProductFactory(category=obj)
+        generate_related(ProductFactory, create, extracted, category=obj)
 
 
-class StockFactory(DjangoModelFactory):
+class StockFactory(BulkModelFactory):
     class Meta:
         model = Stock
 
@@ -149,7 +185,7 @@ class StockFactory(DjangoModelFactory):
     name = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
 
 
-class ShopFactory(DjangoModelFactory):
+class ShopFactory(BulkModelFactory):
     class Meta:
         model = Shop
 
@@ -160,18 +196,10 @@ class ShopFactory(DjangoModelFactory):
 class ShopWithForeignFactory(ShopFactory):
     @factory.post_generation
     def products(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                ProductFactory(shop=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                ProductFactory(shop=obj)
+        generate_related(ProductFactory, create, extracted, shop=obj)
 
 
-class ProductFactory(DjangoModelFactory):
+class ProductFactory(BulkModelFactory):
     class Meta:
         model = Product
 
@@ -181,7 +209,7 @@ class ProductFactory(DjangoModelFactory):
     expiry_date = LazyAttribute(lambda o: faker.date_time(
         tzinfo=timezone(timedelta(0))).isoformat())
     weight = LazyAttribute(lambda o: uniform(0.0, 10000))
-    image = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
+    image = LazyAttribute(lambda o: faker.text(max_nb_chars=100))
     discount = LazyAttribute(lambda o: randint(0, 99))
     description = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
     color = LazyAttribute(lambda o: faker.text(max_nb_chars=50))
@@ -191,30 +219,14 @@ class ProductFactory(DjangoModelFactory):
 class ProductWithForeignFactory(ProductFactory):
     @factory.post_generation
     def stocks(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                StockFactory(product=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                StockFactory(product=obj)
+        generate_related(StockFactory, create, extracted, product=obj)
 
     @factory.post_generation
     def orderitems(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                OrderItemFactory(product=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                OrderItemFactory(product=obj)
+        generate_related(OrderItemFactory, create, extracted, product=obj)
 
 
-class PaymentFactory(DjangoModelFactory):
+class PaymentFactory(BulkModelFactory):
     class Meta:
         model = Payment
 
@@ -226,12 +238,12 @@ class PaymentFactory(DjangoModelFactory):
     status = fuzzy.FuzzyChoice(Payment.STATUS_CHOICES, getter=lambda c: c[0])
 
 
-class OrderFactory(DjangoModelFactory):
+class OrderFactory(BulkModelFactory):
     class Meta:
         model = Order
 
     location = factory.SubFactory('app.tests.factories.LocationFactory')
-    deliveryspeed = factory.SubFactory('app.tests.factories.DeliverySpeedFactory')
+    delivery_speed = fuzzy.FuzzyChoice(Order.TYPE_CHOICES, getter=lambda c: c[0])
     created_at = LazyAttribute(lambda o: faker.date_time(tzinfo=timezone(timedelta(0))).isoformat())
     status = fuzzy.FuzzyChoice(Order.STATUS_CHOICES, getter=lambda c: c[0])
     valid = LazyFunction(faker.boolean)
@@ -246,18 +258,10 @@ class OrderFactory(DjangoModelFactory):
 class OrderWithForeignFactory(OrderFactory):
     @factory.post_generation
     def payments(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                PaymentFactory(order=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                PaymentFactory(order=obj)
+        generate_related(PaymentFactory, create, extracted, order=obj)
 
 
-class OrderItemFactory(DjangoModelFactory):
+class OrderItemFactory(BulkModelFactory):
     class Meta:
         model = OrderItem
 
@@ -266,32 +270,10 @@ class OrderItemFactory(DjangoModelFactory):
     valid = LazyFunction(faker.boolean)
 
 
-class DeliverySpeedFactory(DjangoModelFactory):
-    class Meta:
-        model = DeliverySpeed
-
-    type = fuzzy.FuzzyChoice(DeliverySpeed.TYPE_CHOICES, getter=lambda c: c[0])
-    description = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
-
-
-class DeliverySpeedWithForeignFactory(DeliverySpeedFactory):
-    @factory.post_generation
-    def orders(obj, create, extracted, **kwargs):
-        if not create:
-            return
-        if extracted:
-            for n in range(extracted):
-                OrderFactory(deliveryspeed=obj)
-        else:
-            number_of_units = randint(1, 10)
-            for n in range(number_of_units):
-                OrderFactory(deliveryspeed=obj)
-
-
-class AnnouncementFactory(DjangoModelFactory):
+class AnnouncementFactory(BulkModelFactory):
     class Meta:
         model = Announcement
 
     title = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
     body = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
-    image = LazyAttribute(lambda o: faker.text(max_nb_chars=255))
+    image = LazyAttribute(lambda o: faker.text(max_nb_chars=100))
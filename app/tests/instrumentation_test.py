@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..instrumentation import Histogram, RollingHistogram, registry
+from ..models import Category, Product, Shop, User
+
+
+class Histogram_Test(SimpleTestCase):
+    def test_quantiles_stay_within_the_bucket_error(self):
+        histogram = Histogram(unit=1)
+        for value in range(1, 1001):
+            histogram.record(value)
+        for q, exact in ((0.5, 500), (0.9, 900), (0.99, 990)):
+            assert exact <= histogram.quantile(q) <= exact * (1 + 1 / 8), q
+        assert histogram.total == 1000
+        assert histogram.sum == sum(range(1, 1001))
+
+    def test_values_below_the_unit_share_the_first_bucket(self):
+        histogram = Histogram(unit=1e-4)
+        histogram.record(0.00001)
+        assert histogram.quantile(0.99) == 1e-4
+
+    def test_rolling_window_forgets_old_slots(self):
+        now = [0.0]
+        histogram = RollingHistogram(unit=1, window=50, clock=lambda: now[0])
+        histogram.record(1000)
+        now[0] = 30
+        histogram.record(10)
+        assert histogram.window().quantile(0.99) >= 1000
+        now[0] = 55
+        assert histogram.window().quantile(0.99) < 20
+        assert histogram.total == 2
+
+
+class InstrumentationMiddleware_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.series.clear()
+        registry.over_budget.clear()
+        self.api_client = APIClient()
+        category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        for name in ('mango', 'orange'):
+            Product.objects.create(name=name, category=category, shop=shop)
+
+    def test_requests_are_measured_per_route_and_method(self):
+        response = self.api_client.get(reverse('products-list'))
+        assert response.status_code == status.HTTP_200_OK
+        histograms = registry.series[('products-list', 'GET')]
+        assert histograms['request_duration_seconds'].total == 1
+        assert histograms['db_queries'].sum >= 1
+        assert histograms['db_duration_seconds'].sum > 0
+        assert histograms['serializer_duration_seconds'].sum > 0
+        assert histograms['response_size_bytes'].sum == len(response.content)
+
+    @override_settings(QUERY_BUDGET=1)
+    def test_requests_over_the_query_budget_are_flagged(self):
+        with self.assertLogs('app.instrumentation', 'WARNING') as logs:
+            self.api_client.get(reverse('products-list'))
+        assert registry.over_budget[('products-list', 'GET')] == 1
+        assert 'over its budget of 1' in logs.output[0]
+
+    def test_metrics_endpoint_is_prometheus_text_for_admins(self):
+        self.api_client.get(reverse('products-list'))
+        assert self.api_client.get(reverse('metrics')).status_code in (
+            status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create(username='admin', phone='0700000009', is_staff=True)
+        self.api_client.force_authenticate(admin)
+        response = self.api_client.get(reverse('metrics'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        body = response.content.decode()
+        assert '# TYPE konv_request_duration_seconds summary' in body
+        assert 'konv_db_queries_count{route="products-list",method="GET"} 1' in body
+        assert ('konv_request_duration_seconds{route="products-list",method="GET",quantile="0.99"}'
+                in body)
+        assert 'konv_db_connections_opened_total' in body
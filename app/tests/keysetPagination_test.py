@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Order, User
+
+
+class KeysetPagination_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        admin = User.objects.create(username='admin', phone='0700000000', role=User.ADMIN)
+        self.api_client.force_authenticate(user=admin)
+        for i in range(5):
+            Order.objects.create(customer=admin)
+
+    def test_keyset_pages_cover_every_order_once(self):
+        client = self.api_client
+        response = client.get(reverse('orders-list'), {'pagination': 'keyset', 'limit': 2})
+        seen = []
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            seen += [order['id'] for order in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = client.get(response.data['next'])
+
+        expected = [str(pk) for pk in Order.objects.order_by(
+            '-created_at', '-id').values_list('id', flat=True)]
+        assert seen == expected
+
+    def test_keyset_page_skips_count_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.api_client.get(reverse('orders-list'), {'pagination': 'keyset'})
+        assert response.status_code == status.HTTP_200_OK
+        assert not any('COUNT(' in query['sql'] for query in context.captured_queries)
+
+    def test_offset_pagination_remains_default(self):
+        response = self.api_client.get(reverse('orders-list'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 5
+
+    def test_invalid_cursor(self):
+        response = self.api_client.get(reverse('orders-list'), {'cursor': 'not-a-cursor'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_keyset_pages_reject_other_orderings(self):
+        url = reverse('orders-list')
+        response = self.api_client.get(url, {'pagination': 'keyset', 'ordering': '-created_at'})
+        assert response.status_code == status.HTTP_200_OK
+        response = self.api_client.get(
+            url, {'pagination': 'keyset', 'ordering': 'current_tracker_number'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['params'] == ['ordering']
+        response = self.api_client.get(url, {'ordering': 'current_tracker_number'})
+        assert response.status_code == status.HTTP_200_OK
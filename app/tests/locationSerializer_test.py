@@ -9,7 +9,6 @@ from rest_framework.test import APIRequestFactory
 from app.serializers import LocationSerializer
 
 from .factories import (
-    DeliverySpeedFactory,
     DistrictFactory,
     LocationFactory,
     LocationWithForeignFactory,
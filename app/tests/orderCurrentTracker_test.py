@@ -0,0 +1,72 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Order, OrderTracker, User
+
+
+class OrderCurrentTracker_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        admin = User.objects.create(username='admin', phone='0700000000', role=User.ADMIN)
+        self.api_client.force_authenticate(user=admin)
+        self.order = Order.objects.create(customer=admin)
+
+    def test_tracker_writes_update_the_order(self):
+        OrderTracker.objects.create(order=self.order, number=1, name='Order Placed')
+        purchased = OrderTracker.objects.create(order=self.order, number=3, name='Goods Purchased')
+        self.order.refresh_from_db()
+        assert self.order.current_tracker_number == 3
+        assert self.order.current_tracker_name == 'Goods Purchased'
+
+        purchased.delete()
+        self.order.refresh_from_db()
+        assert self.order.current_tracker_number == 1
+
+    def test_moving_a_tracker_refreshes_both_orders(self):
+        other = Order.objects.create()
+        OrderTracker.objects.create(order=self.order, number=1, name='Order Placed')
+        purchased = OrderTracker.objects.create(order=self.order, number=3, name='Goods Purchased')
+
+        response = self.api_client.patch(
+            reverse('ordertrackers-detail', args=[purchased.pk]), {'order': str(other.pk)},
+            format='json')
+        assert response.status_code == status.HTTP_200_OK
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        assert self.order.current_tracker_number == 1
+        assert other.current_tracker_name == 'Goods Purchased'
+
+    def test_failed_refresh_rolls_back_the_tracker(self):
+        with mock.patch('app.models.OrderQuerySet.refresh_current_tracker',
+                        side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                OrderTracker.objects.create(order=self.order, number=1, name='Order Placed')
+        assert not OrderTracker.objects.exists()
+
+    def test_filter_and_sort_by_tracker_stage(self):
+        other = Order.objects.create()
+        OrderTracker.objects.create(order=self.order, number=3, name='Goods Purchased')
+        OrderTracker.objects.create(order=other, number=1, name='Order Placed')
+
+        response = self.api_client.get(reverse('orders-list'), {'current_tracker_number': 3})
+        assert response.status_code == status.HTTP_200_OK
+        assert [order['id'] for order in response.data['results']] == [str(self.order.pk)]
+
+        response = self.api_client.get(
+            reverse('orders-list'), {'ordering': '-current_tracker_number'})
+        assert [order['last_tracker_status'] for order in response.data['results']] == [
+            'Goods Purchased', 'Order Placed']
+
+    def test_backfill_command(self):
+        OrderTracker.objects.create(order=self.order, number=2, name='Shopping')
+        Order.objects.update(current_tracker_number=None, current_tracker_name=None)
+        call_command('backfill_order_trackers', batch_size=1, stdout=StringIO())
+        self.order.refresh_from_db()
+        assert self.order.current_tracker_name == 'Shopping'
@@ -0,0 +1,65 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import (
+    Category,
+    Order,
+    OrderItem,
+    OrderTracker,
+    Payment,
+    Product,
+    Shop,
+    User,
+)
+
+
+class OrderQueryCount_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        self.admin = User.objects.create(username='admin', phone='0700000000', role=User.ADMIN)
+        self.api_client.force_authenticate(user=self.admin)
+        category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        self.product = Product.objects.create(name='mango', category=category, shop=shop)
+
+    def create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(customer=self.admin)
+            OrderItem.objects.create(order=order, product=self.product, units=2)
+            Payment.objects.create(order=order, customer=self.admin, amount=1000)
+            OrderTracker.objects.create(order=order, number=1, name='Order Placed')
+            OrderTracker.objects.create(order=order, number=2, name='Goods Purchased')
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.api_client.get(reverse('orders-list'))
+        assert response.status_code == status.HTTP_200_OK
+        return len(context.captured_queries), response
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.create_orders(2)
+        small_page_queries, _ = self.count_list_queries()
+        self.create_orders(8)
+        large_page_queries, response = self.count_list_queries()
+
+        assert len(response.data['results']) == 10
+        assert small_page_queries == large_page_queries
+
+    def test_list_renders_prefetched_relations(self):
+        self.create_orders(3)
+        _, response = self.count_list_queries()
+
+        for order in response.data['results']:
+            assert order['last_tracker_status'] == 'Goods Purchased'
+            assert len(order['orderitems']) == 1
+            assert len(order['payments']) == 1
+
+    def test_detail_without_trackers_reports_order_placed(self):
+        order = Order.objects.create(customer=self.admin)
+        response = self.api_client.get(reverse('orders-detail', kwargs={'pk': order.pk}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['last_tracker_status'] == 'Order Placed'
@@ -11,7 +11,6 @@ from rest_framework.test import APIClient
 
 from ..models import Order
 from .factories import (
-    DeliverySpeedFactory,
     LocationFactory,
     OrderFactory,
     PaymentFactory,
@@ -24,10 +23,9 @@ faker = Factory.create()
 class Order_Test(TestCase):
     def setUp(self):
         self.api_client = APIClient()
-        OrderFactory.create_batch(size=3)
+        OrderFactory.create_batch_in_bulk(3)
         self.driver = UserFactory.create()
         self.location = LocationFactory.create()
-        self.deliveryspeed = DeliverySpeedFactory.create()
 
     def test_create_order(self):
         """
@@ -36,7 +34,7 @@ class Order_Test(TestCase):
         client = self.api_client
         order_count = Order.objects.count()
         order_dict = factory.build(dict, FACTORY_CLASS=OrderFactory, driver=self.driver.id,
-                                   location=self.location.id, deliveryspeed=self.deliveryspeed.id)
+                                   location=self.location.id)
         response = client.post(reverse('order-list'), order_dict)
         created_order_pk = response.data['id']
         assert response.status_code == status.HTTP_201_CREATED
@@ -90,7 +88,7 @@ class Order_Test(TestCase):
         order_pk = Order.objects.first().pk
         order_detail_url = reverse('order-detail', kwargs={'pk': order_pk})
         order_dict = factory.build(dict, FACTORY_CLASS=OrderFactory, driver=self.driver.id,
-                                   location=self.location.id, deliveryspeed=self.deliveryspeed.id)
+                                   location=self.location.id)
         response = client.patch(order_detail_url, data=order_dict)
         assert response.status_code == status.HTTP_200_OK
 
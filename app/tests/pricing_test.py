@@ -0,0 +1,73 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Category, Location, Order, OrderItem, Product, Shop
+from ..pricing import DELIVERY_FEES, update_order_totals
+
+
+class Pricing_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        self.mango = Product.objects.create(
+            name='mango', price=1000, discount=15, category=category, shop=shop)
+        self.orange = Product.objects.create(
+            name='orange', price=999, discount=0, category=category, shop=shop)
+        self.order = Order.objects.create(
+            delivery_method=Order.VEHICLE, delivery_speed=Order.EXPRESS)
+
+    def add_items(self, order):
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=self.mango, units=3),
+                                       OrderItem(order=order, product=self.orange, units=2)])
+
+    def test_totals_use_one_aggregate_query(self):
+        self.add_items(self.order)
+        with CaptureQueriesContext(connection) as context:
+            update_order_totals(self.order)
+        assert len(context.captured_queries) == 2
+        self.order.refresh_from_db()
+        assert self.order.sub_total_amount == 3 * 850 + 2 * 999
+        assert self.order.delivery_fee == DELIVERY_FEES[(Order.VEHICLE, Order.EXPRESS)]
+        assert self.order.total_amount == self.order.sub_total_amount + self.order.delivery_fee
+
+    def test_order_item_writes_refresh_totals(self):
+        item = OrderItem.objects.create(order=self.order, product=self.orange, units=1)
+        self.order.refresh_from_db()
+        assert self.order.sub_total_amount == 999
+        item.delete()
+        self.order.refresh_from_db()
+        assert self.order.sub_total_amount == 0
+
+    def test_client_amounts_are_ignored(self):
+        location = Location.objects.create(name='home')
+        response = self.api_client.post(reverse('orders-list'), {
+            'location': str(location.pk), 'delivery_method': Order.PICKUP, 'total_amount': 1,
+            'delivery_fee': 1,
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['delivery_fee'] == 0
+        assert response.data['total_amount'] == 0
+
+    def test_recompute_command_is_resumable(self):
+        orders = [self.order] + [Order.objects.create() for i in range(4)]
+        for order in orders:
+            self.add_items(order)
+        Order.objects.update(sub_total_amount=500, total_amount=500)
+        first = sorted(order.pk for order in orders)[1]
+
+        call_command('recompute_order_totals', batch_size=2, after=str(first), stdout=StringIO())
+        amounts = dict(Order.objects.values_list('pk', 'sub_total_amount'))
+        assert [amounts[pk] for pk in sorted(amounts)] == [500, 500] + [4548] * 3
+
+        call_command('recompute_order_totals', batch_size=2, stdout=StringIO())
+        assert set(Order.objects.values_list('sub_total_amount', flat=True)) == {4548}
+        self.order.refresh_from_db()
+        assert self.order.total_amount == 4548 + DELIVERY_FEES[(Order.VEHICLE, Order.EXPRESS)]
@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Category, Product, Shop
+from ..search import InvertedIndex, search_products
+
+
+class ProductSearch_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api_client = APIClient()
+        fruits = Category.objects.create(name='fruits')
+        drinks = Category.objects.create(name='drinks')
+        self.market = Shop.objects.create(name='owino market')
+        self.mango = Product.objects.create(name='mango', category=fruits, shop=self.market,
+                                            description='sweet apple mango')
+        self.juice = Product.objects.create(name='mango juice', category=drinks, shop=self.market)
+        self.apple = Product.objects.create(name='apple', category=fruits, shop=self.market)
+
+    def search(self, **params):
+        return self.api_client.get(reverse('products-search'), params)
+
+    def test_results_are_ranked(self):
+        response = self.search(q='mango')
+        assert response.status_code == status.HTTP_200_OK
+        names = [product['name'] for product in response.data['results']]
+        assert set(names) == {'mango', 'mango juice'}
+
+        # a name match outranks a description match
+        names = [product['name'] for product in self.search(q='apple').data['results']]
+        assert names == ['apple', 'mango']
+
+    def test_category_and_shop_names_are_searched(self):
+        assert [p['name'] for p in self.search(q='drinks').data['results']] == ['mango juice']
+        assert self.search(q='owino').data['count'] == 3
+
+    def test_every_term_must_match(self):
+        names = [product['name'] for product in self.search(q='mango fruits').data['results']]
+        assert names == ['mango']
+
+    def test_results_are_paginated_and_filterable(self):
+        response = self.search(q='owino', limit=1)
+        assert response.data['count'] == 3
+        assert len(response.data['results']) == 1
+        assert response.data['next']
+
+        response = self.search(q='mango', category=self.juice.category_id)
+        assert [product['name'] for product in response.data['results']] == ['mango juice']
+
+    def test_index_follows_catalog_writes(self):
+        assert not search_products('pawpaw').exists()
+        self.apple.name = 'pawpaw'
+        self.apple.save()
+        assert list(search_products('pawpaw')) == [self.apple]
+
+        self.market.name = 'nakasero'
+        self.market.save()
+        assert search_products('nakasero').count() == 3
+
+    def test_query_is_required(self):
+        assert self.search().status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_inverted_index_weights(self):
+        index = InvertedIndex([(1, 'tea', None, 'drinks', 'shop'),
+                               (2, 'cup', 'for tea', 'kitchen', 'shop')])
+        assert index.search('tea') == [1, 2]
+        assert index.search('tea shop') == [1, 2]
+        assert index.search('coffee') == []
@@ -0,0 +1,88 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .. import suggest as suggest_module
+from ..models import Category, Product, Shop
+from ..suggest import PrefixIndex
+
+
+class ProductSuggest_Test(TestCase):
+    def setUp(self):
+        suggest_module._index = None
+        self.api_client = APIClient()
+        self.category = Category.objects.create(name='fruits')
+        self.shop = Shop.objects.create(name='Mango Palace')
+        self.mango = Product.objects.create(name='Mango', category=self.category, shop=self.shop)
+        self.juice = Product.objects.create(
+            name='Passion Juice', category=self.category, shop=self.shop)
+
+    def tearDown(self):
+        suggest_module._index = None
+
+    def suggest(self, q, **params):
+        return self.api_client.get(reverse('products-suggest'), dict(params, q=q))
+
+    def test_prefix_matches_names_before_inner_words(self):
+        response = self.suggest('ma')
+        assert response.status_code == status.HTTP_200_OK
+        assert [(s['type'], s['name']) for s in response.data] == [
+            ('product', 'Mango'), ('shop', 'Mango Palace')]
+        assert [s['name'] for s in self.suggest('jui').data] == ['Passion Juice']
+        assert [s['name'] for s in self.suggest('PAL').data] == ['Mango Palace']
+
+    def test_lookups_do_not_query_the_database(self):
+        self.suggest('ma')
+        with CaptureQueriesContext(connection) as context:
+            assert len(self.suggest('pass').data) == 1
+        assert len(context.captured_queries) == 0
+
+    def test_index_follows_saves_and_deletes(self):
+        self.suggest('ma')
+        self.mango.name = 'Pawpaw'
+        self.mango.save()
+        names = [s['name'] for s in self.suggest('pa').data]
+        assert names == ['Passion Juice', 'Pawpaw', 'Mango Palace']
+        self.mango.delete()
+        assert [s['name'] for s in self.suggest('paw').data] == []
+
+    def test_writes_of_other_processes_show_after_the_index_expires(self):
+        self.suggest('ma')
+        # another worker's save never reaches this process' signals
+        Product.objects.filter(pk=self.mango.pk).update(name='Pawpaw')
+        assert self.suggest('paw').data == []
+        later = time.monotonic() + settings.SUGGEST_INDEX_SECONDS + 1
+        with mock.patch('time.monotonic', return_value=later):
+            assert [s['name'] for s in self.suggest('paw').data] == ['Pawpaw']
+
+    def test_limit_and_empty_query(self):
+        assert len(self.suggest('ma', limit=1).data) == 1
+        assert self.suggest('').data == []
+        assert self.suggest('ma', limit='x').status_code == status.HTTP_400_BAD_REQUEST
+
+    @override_settings(SUGGEST_MAX_ENTRIES=2)
+    def test_index_is_bounded(self):
+        index = suggest_module.build_index()
+        assert len(index) <= 2
+
+    def test_prefix_index_removes_stale_keys(self):
+        index = PrefixIndex(100)
+        index.add('product', '1', 'Green Tea')
+        index.add('product', '1', 'Black Coffee')
+        assert index.suggest('tea') == []
+        assert index.suggest('cof') == [{'type': 'product', 'id': '1', 'name': 'Black Coffee'}]
+        assert len(index) == 2
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_suggest', queries=5, stdout=out)
+        assert 'prefix index' in out.getvalue()
@@ -24,7 +24,7 @@ faker = Factory.create()
 class Product_Test(TestCase):
     def setUp(self):
         self.api_client = APIClient()
-        ProductFactory.create_batch(size=3)
+        ProductFactory.create_batch_in_bulk(3)
         self.category = CategoryFactory.create()
         self.shop = ShopFactory.create()
 
@@ -0,0 +1,51 @@
+import unittest
+
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+
+from ..models import Location, Order, OrderTracker, Payment, User
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans need a local Postgres')
+class QueryPlan_Test(TestCase):
+    """The hot filter paths are answered from their indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customers = User.objects.bulk_create([
+            User(username='customer{}'.format(i), phone='07000{:05d}'.format(i), role=User.CUSTOMER)
+            for i in range(50)])
+        orders = Order.objects.bulk_create([
+            Order(customer=customers[i % 50], is_curated_list=i % 500 == 0) for i in range(5000)])
+        Payment.objects.bulk_create([
+            Payment(order=order, customer=order.customer, amount=1000) for order in orders])
+        OrderTracker.objects.bulk_create([
+            OrderTracker(order=order, number=number) for order in orders for number in (1, 2)])
+        Location.objects.bulk_create([Location(customer=customers[i % 50]) for i in range(5000)])
+        cls.customer = customers[0]
+        cls.order = orders[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def plan(self, queryset):
+        return queryset.explain()
+
+    def test_customer_orders_use_customer_and_curated_indexes(self):
+        plan = self.plan(Order.objects.filter(Q(customer=self.customer) | Q(is_curated_list=True)))
+        assert 'order_customer_created_idx' in plan
+        assert 'order_curated_list_idx' in plan
+
+    def test_customer_payments_use_customer_created_index(self):
+        plan = self.plan(
+            Payment.objects.filter(customer=self.customer).order_by('-created_at')[:20])
+        assert 'payment_customer_created_idx' in plan
+
+    def test_customer_locations_use_customer_created_index(self):
+        plan = self.plan(
+            Location.objects.filter(customer=self.customer).order_by('-created_at')[:20])
+        assert 'location_customer_created_idx' in plan
+
+    def test_latest_tracker_uses_order_number_index(self):
+        plan = self.plan(OrderTracker.objects.filter(order=self.order).order_by('-number')[:1])
+        assert 'ordertracker_order_number_idx' in plan
@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import (
+    Category,
+    District,
+    Location,
+    Order,
+    Payment,
+    Product,
+    Shop,
+    User,
+)
+
+
+class RelatedCount_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api_client = APIClient()
+        self.shop = Shop.objects.create(name='market')
+
+    def create_categories(self, count, products=3):
+        start = Category.objects.count()
+        for i in range(start, start + count):
+            category = Category.objects.create(name='category {}'.format(i))
+            for j in range(products):
+                Product.objects.create(name='product {} {}'.format(i, j),
+                                       category=category, shop=self.shop)
+
+    def get(self, url, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.api_client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        return len(context.captured_queries), response
+
+    def test_category_list_keeps_product_ids_by_default(self):
+        self.create_categories(1)
+        _, response = self.get(reverse('categories-list'))
+        category = Category.objects.get()
+        assert sorted(response.data['results'][0]['products']) == sorted(
+            category.products.values_list('pk', flat=True))
+
+    def test_category_list_query_count_does_not_grow_with_page_size(self):
+        self.create_categories(2)
+        small_page_queries, _ = self.get(reverse('categories-list'))
+        self.create_categories(6)
+        large_page_queries, response = self.get(reverse('categories-list'))
+        assert len(response.data['results']) == 8
+        assert small_page_queries == large_page_queries
+
+    def test_category_list_counts_products_when_asked(self):
+        self.create_categories(2, products=4)
+        queries, response = self.get(reverse('categories-list'), related='count')
+        assert [category['products'] for category in response.data['results']] == [4, 4]
+        # the page and the pagination count, nothing per relation
+        assert queries == 2
+
+    def test_district_detail_counts_locations(self):
+        district = District.objects.create(name='Kampala')
+        Location.objects.create(name='home', district=district)
+        Location.objects.create(name='work', district=district)
+        _, response = self.get(
+            reverse('districts-detail', kwargs={'pk': district.pk}), related='count')
+        assert response.data['locations'] == 2
+
+    def test_user_counts_are_not_multiplied_by_joins(self):
+        customer = User.objects.create(username='customer', phone='0700000001', role=User.CUSTOMER)
+        driver = User.objects.create(username='driver', phone='0700000002', role=User.DRIVER)
+        for i in range(3):
+            order = Order.objects.create(customer=customer, driver=driver)
+            Payment.objects.create(order=order, customer=driver, amount=1000)
+        _, response = self.get(reverse('users-detail', kwargs={'pk': driver.pk}), related='count')
+        assert response.data['payments'] == 3
+        assert response.data['orders'] == 3
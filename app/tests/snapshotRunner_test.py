@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from project import test_runner
+
+
+class SnapshotTestRunner_Test(SimpleTestCase):
+    def test_fingerprint_is_stable(self):
+        assert test_runner.schema_fingerprint() == test_runner.schema_fingerprint()
+
+    def test_workers_get_their_own_in_memory_database(self):
+        assert test_runner.memory_database_name('default', 1) != (
+            test_runner.memory_database_name('default', 2))
+
+    def test_snapshot_holds_the_migrated_schema(self):
+        if connection.alias not in test_runner.snapshots:
+            self.skipTest('databases set up without a schema snapshot')
+        snapshot = sqlite3.connect(str(test_runner.snapshots[connection.alias]))
+        try:
+            tables = {name for name, in snapshot.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            applied = snapshot.execute(
+                "SELECT COUNT(*) FROM django_migrations WHERE app = 'app'").fetchone()[0]
+        finally:
+            snapshot.close()
+        assert {'order', 'app_user', 'django_migrations'} <= tables
+        assert applied > 0
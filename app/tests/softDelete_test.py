@@ -0,0 +1,141 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import (
+    Category,
+    CollectionRequest,
+    Location,
+    Order,
+    OrderItem,
+    Payment,
+    Product,
+    Shop,
+    Stock,
+    User,
+)
+from ..stock import reserve_stock
+
+
+class SoftDelete_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api_client = APIClient()
+        self.admin = User.objects.create(username='admin', phone='0700000000', role=User.ADMIN)
+        self.api_client.force_authenticate(user=self.admin)
+        self.category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        self.mango = Product.objects.create(name='mango', category=self.category, shop=shop)
+        self.apple = Product.objects.create(name='apple', category=self.category, shop=shop)
+
+    def test_default_manager_hides_deleted_rows(self):
+        self.mango.soft_delete()
+        assert list(Product.objects.all()) == [self.apple]
+        assert Product.all_with_deleted.count() == 2
+        assert list(self.category.products.all()) == [self.apple]
+
+    def test_destroy_soft_deletes(self):
+        response = self.api_client.delete(reverse('products-detail', kwargs={'pk': self.mango.pk}))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert Product.all_with_deleted.get(pk=self.mango.pk).is_deleted
+
+        response = self.api_client.get(reverse('products-detail', kwargs={'pk': self.mango.pk}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = self.api_client.get(reverse('products-list'))
+        assert [product['name'] for product in response.data['results']] == ['apple']
+
+    def test_related_ids_and_counts_skip_deleted_rows(self):
+        self.mango.soft_delete()
+        url = reverse('categories-detail', kwargs={'pk': self.category.pk})
+        assert self.api_client.get(url).data['products'] == [self.apple.pk]
+        cache.clear()
+        assert self.api_client.get(url, {'related': 'count'}).data['products'] == 1
+
+    def test_orders_keep_their_queryset_methods(self):
+        order = Order.objects.create(customer=self.admin)
+        OrderItem.objects.create(order=order, product=self.mango, units=1)
+        Order.objects.filter(pk=order.pk).soft_delete()
+        assert not Order.objects.with_related().exists()
+        assert Order.all_with_deleted.with_related().get() == order
+        assert OrderItem.all_with_deleted.get().is_deleted
+
+    def test_purge_removes_old_soft_deleted_rows_only(self):
+        self.mango.soft_delete()
+        self.apple.soft_delete()
+        Product.all_with_deleted.filter(pk=self.mango.pk).update(
+            updated_at=timezone.now() - timedelta(days=31))
+
+        out = StringIO()
+        call_command('purge_soft_deleted', days=30, batch_size=1, stdout=out)
+        assert 'Purged 1 Product rows' in out.getvalue()
+        assert list(Product.all_with_deleted.all()) == [self.apple]
+
+    def test_deleting_a_category_deletes_its_products_and_their_stock(self):
+        Stock.objects.create(product=self.mango, units_in_stock=1)
+        other = Product.objects.create(name='kale', category=Category.objects.create(name='greens'),
+                                       shop=self.mango.shop)
+        response = self.api_client.delete(
+            reverse('categories-detail', kwargs={'pk': self.category.pk}))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert list(Product.objects.all()) == [other]
+        assert not Stock.objects.exists()
+        response = self.api_client.get(reverse('products-list'))
+        assert [product['name'] for product in response.data['results']] == ['kale']
+
+    def test_a_deleted_name_can_be_taken_again(self):
+        url = reverse('categories-list')
+        response = self.api_client.post(url, {'name': 'fruits'}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        self.api_client.delete(reverse('categories-detail', kwargs={'pk': self.category.pk}))
+        response = self.api_client.post(url, {'name': 'fruits'}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Category.all_with_deleted.filter(name='fruits').count() == 2
+
+    def test_deleting_an_order_releases_its_stock_and_drops_its_collection(self):
+        Stock.objects.create(product=self.mango, units_in_stock=5)
+        orders = []
+        for _ in range(2):
+            order = Order.objects.create(customer=self.admin)
+            reserve_stock(order, [(self.mango.pk, 2)])
+            Payment.objects.create(order=order, customer=self.admin, amount=2000,
+                                   payment_method=Payment.MOMO, momo_phone_number='0700000000')
+            orders.append(order)
+        orders[0].soft_delete()
+        assert self.mango.stocks.get().units_in_stock == 3
+        Order.objects.filter(pk=orders[1].pk).soft_delete()
+        assert self.mango.stocks.get().units_in_stock == 5
+        assert self.mango.stocks.get().units_on_order == 0
+        assert not Payment.objects.exists()
+        assert not CollectionRequest.objects.exists()
+        assert CollectionRequest.all_with_deleted.count() == 2
+
+    def test_purge_keeps_rows_with_live_dependents(self):
+        customer = User.objects.create(username='jane', phone='0700000001', role=User.CUSTOMER)
+        location = Location.objects.create(name='home', customer=customer)
+        order = Order.objects.create(customer=customer, location=location)
+        OrderItem.objects.create(order=order, product=self.mango, units=1)
+        location.soft_delete()
+        self.category.soft_delete()
+        greens = Category.objects.create(name='greens')
+        Product.objects.create(name='kale', category=greens, shop=self.mango.shop)
+        greens.soft_delete()
+
+        call_command('purge_soft_deleted', days=0, stdout=StringIO())
+        assert Order.objects.get() == order
+        assert Location.all_with_deleted.get() == location
+        # mango is still on an order, so its category stays
+        assert list(Product.all_with_deleted.all()) == [self.mango]
+        assert list(Category.all_with_deleted.all()) == [self.category]
+
+        order.soft_delete()
+        call_command('purge_soft_deleted', days=0, stdout=StringIO())
+        assert not Category.all_with_deleted.exists()
+        assert not Location.all_with_deleted.exists()
+        assert not OrderItem.all_with_deleted.exists()
@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Category, Order, OrderItem, Payment, Product, Shop, User
+
+
+class SparseFields_Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api_client = APIClient()
+        self.admin = User.objects.create(username='admin', phone='0700000000', role=User.ADMIN)
+        self.api_client.force_authenticate(user=self.admin)
+        category = Category.objects.create(name='fruits')
+        shop = Shop.objects.create(name='market')
+        self.product = Product.objects.create(
+            name='mango', category=category, shop=shop, price=1000, description='sweet')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.api_client.get(url, params)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_fields_selects_fields_and_columns(self):
+        response, queries = self.get(reverse('products-list'), fields='id,name,price,image')
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data['results'][0]) == ['id', 'name', 'image', 'price']
+        assert not any('"description"' in sql for sql in queries)
+
+    def test_omit_drops_fields(self):
+        url = reverse('products-detail', kwargs={'pk': self.product.pk})
+        response, _ = self.get(url, omit='description')
+        assert response.status_code == status.HTTP_200_OK
+        assert 'description' not in response.data
+        assert response.data['name'] == 'mango'
+
+    def test_omitted_relations_are_not_prefetched(self):
+        order = Order.objects.create(customer=self.admin)
+        OrderItem.objects.create(order=order, product=self.product, units=1)
+        Payment.objects.create(order=order, customer=self.admin, amount=1000)
+
+        response, queries = self.get(reverse('orders-list'), omit='orderitems,payments')
+        assert response.status_code == status.HTTP_200_OK
+        assert 'orderitems' not in response.data['results'][0]
+        assert not any('"orderItem"' in sql or '"payment"' in sql for sql in queries)
+
+    def test_nested_serializers_keep_their_fields(self):
+        order = Order.objects.create(customer=self.admin)
+        OrderItem.objects.create(order=order, product=self.product, units=1)
+        response, _ = self.get(reverse('orders-list'), fields='id,orderitems')
+        assert set(response.data['results'][0]) == {'id', 'orderitems'}
+        assert 'units' in response.data['results'][0]['orderitems'][0]
+
+    def test_unknown_fields_are_rejected(self):
+        response, _ = self.get(reverse('products-list'), fields='id,secret')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_writes_are_not_narrowed(self):
+        url = reverse('products-detail', kwargs={'pk': self.product.pk}) + '?fields=id'
+        response = self.api_client.patch(url, {'name': 'pawpaw'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['name'] == 'pawpaw'
@@ -0,0 +1,137 @@
+import threading
+import unittest
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..error_handling import InsufficientStock
+from ..models import (
+    Category,
+    Location,
+    Order,
+    Product,
+    Shop,
+    Stock,
+    StockReservation,
+    User,
+)
+from ..stock import release_expired_reservations, reserve_stock
+
+
+def create_product(name, units_in_stock):
+    category, _ = Category.objects.get_or_create(name='fruits')
+    shop, _ = Shop.objects.get_or_create(name='market')
+    product = Product.objects.create(name=name, price=1000, category=category, shop=shop)
+    Stock.objects.create(product=product, units_in_stock=units_in_stock, units_on_order=0)
+    return product
+
+
+class StockReservation_Test(TestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        self.customer = User.objects.create(
+            username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.api_client.force_authenticate(user=self.customer)
+        self.location = Location.objects.create(name='home', customer=self.customer)
+        self.product = create_product('mango', 5)
+
+    def checkout(self, units):
+        return self.api_client.post(reverse('orders-checkout'), {
+            'location': str(self.location.pk),
+            'items': [{'product': str(self.product.pk), 'units': units}],
+        }, format='json')
+
+    def test_checkout_reserves_stock(self):
+        response = self.checkout(3)
+        assert response.status_code == status.HTTP_201_CREATED
+        stock = self.product.stocks.get()
+        assert stock.units_in_stock == 2
+        assert stock.units_on_order == 3
+
+    def test_checkout_beyond_stock_is_rejected(self):
+        response = self.checkout(6)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert Order.objects.count() == 0
+        assert self.product.stocks.get().units_in_stock == 5
+
+    def test_reservation_spans_stock_rows(self):
+        Stock.objects.create(product=self.product, units_in_stock=4, units_on_order=0)
+        order = Order.objects.create(customer=self.customer)
+        reserve_stock(order, [(self.product.pk, 7)])
+        assert sum(stock.units_in_stock for stock in self.product.stocks.all()) == 2
+        assert sum(reservation.units for reservation in order.stock_reservations.all()) == 7
+
+    def test_cancelling_an_order_releases_stock_once(self):
+        order = Order.objects.get(pk=self.checkout(3).data['id'])
+        order.status = Order.CANCELLED
+        order.save()
+        order.save()
+        stock = self.product.stocks.get()
+        assert stock.units_in_stock == 5
+        assert stock.units_on_order == 0
+        assert not StockReservation.objects.exists()
+
+    def test_delivering_an_order_consumes_the_reservation(self):
+        order = Order.objects.get(pk=self.checkout(3).data['id'])
+        order.status = Order.DELIVERED
+        order.save()
+        stock = self.product.stocks.get()
+        assert stock.units_in_stock == 2
+        assert stock.units_on_order == 0
+
+    def test_expired_reservations_are_released(self):
+        self.checkout(3)
+        assert release_expired_reservations() == 0
+        assert release_expired_reservations(timezone.now() + timedelta(days=1)) == 1
+        assert self.product.stocks.get().units_in_stock == 5
+        call_command('release_expired_stock', stdout=StringIO())
+
+    def test_adjust_is_conditional(self):
+        stock = self.product.stocks.get()
+        url = reverse('stock-adjust', kwargs={'pk': stock.pk})
+        assert self.api_client.post(url, {'units': -5}, format='json').data['units_in_stock'] == 0
+        assert self.api_client.post(
+            url, {'units': -1}, format='json').status_code == status.HTTP_409_CONFLICT
+
+    def test_insufficient_stock_error(self):
+        order = Order.objects.create(customer=self.customer)
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(order, [(self.product.pk, 6)])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'row level locking needs a local Postgres')
+class StockReservationConcurrency_Test(TransactionTestCase):
+    # limits (and cascades) the flush between tests to tables this test touches
+    available_apps = ['app', 'django.contrib.auth', 'django.contrib.contenttypes']
+
+    def test_concurrent_reservations_never_oversell(self):
+        product = create_product('mango', 10)
+        orders = [Order.objects.create() for i in range(40)]
+        outcomes = []
+
+        def reserve(order):
+            try:
+                reserve_stock(order, [(product.pk, 1)])
+                outcomes.append(True)
+            except InsufficientStock:
+                outcomes.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stock = product.stocks.get()
+        assert outcomes.count(True) == 10
+        assert stock.units_in_stock == 0
+        assert stock.units_on_order == 10
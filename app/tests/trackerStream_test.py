@@ -0,0 +1,106 @@
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from project.asgi import application
+
+from ..models import Order, OrderTracker, User
+from ..tracker_stream import stop_listener
+
+
+class TrackerStream_Test(TransactionTestCase):
+    # the stream reads from its own thread, so the rows have to be committed
+    available_apps = ['app', 'django.contrib.auth', 'django.contrib.contenttypes',
+                      'rest_framework.authtoken']
+
+    def setUp(self):
+        customer = User.objects.create(username='customer', phone='0700000001', role=User.CUSTOMER)
+        self.token = Token.objects.create(user=customer).key
+        self.order = Order.objects.create(customer=customer)
+        OrderTracker.objects.create(order=self.order, number=1, name='Order Placed')
+        OrderTracker.objects.create(order=self.order, number=2, name='Goods Purchased')
+
+    def tearDown(self):
+        # the Postgres LISTEN connection would keep the test database open
+        stop_listener()
+
+    def connect(self, headers=(), method='GET', token=None):
+        token = token or self.token
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': method,
+            'path': '/api/v1/orders/{}/trackers/stream'.format(self.order.pk),
+            'query_string': b'',
+            'headers': [(b'authorization', 'Token {}'.format(token).encode())] + list(headers),
+        })
+        return communicator
+
+    async def start(self, communicator):
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        return await communicator.receive_output(5)
+
+    def add_tracker(self, number, name):
+        OrderTracker.objects.create(order=self.order, number=number, name=name)
+
+    async def test_stream_replays_history_then_pushes_new_trackers(self):
+        communicator = self.connect()
+        start = await self.start(communicator)
+        assert start['status'] == 200
+        assert (b'content-type', b'text/event-stream') in start['headers']
+
+        first = (await communicator.receive_output(5))['body']
+        assert first.startswith(b'id: 1\nevent: tracker\n')
+        assert b'"Order Placed"' in first
+        assert (await communicator.receive_output(5))['body'].startswith(b'id: 2\n')
+
+        await sync_to_async(self.add_tracker)(3, 'Out For Delivery')
+        pushed = (await communicator.receive_output(5))['body']
+        assert pushed.startswith(b'id: 3\n')
+        assert b'"Out For Delivery"' in pushed
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def test_reconnect_resumes_after_last_event_id(self):
+        communicator = self.connect(headers=[(b'last-event-id', b'1')])
+        await self.start(communicator)
+        assert (await communicator.receive_output(5))['body'].startswith(b'id: 2\n')
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    @override_settings(TRACKER_STREAM_SECONDS=0)
+    async def test_stream_ends_after_its_time_limit(self):
+        communicator = self.connect(headers=[(b'last-event-id', b'2')])
+        await self.start(communicator)
+        end = await communicator.receive_output(5)
+        assert end['more_body'] is False
+        await communicator.wait(5)
+
+    async def test_only_get_is_allowed(self):
+        communicator = self.connect(method='POST')
+        assert (await self.start(communicator))['status'] == 405
+
+    async def test_the_token_may_come_in_the_query_string(self):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/v1/orders/{}/trackers/stream'.format(self.order.pk),
+            'query_string': 'token={}'.format(self.token).encode(),
+            'headers': [(b'last-event-id', b'1')],
+        })
+        assert (await self.start(communicator))['status'] == 200
+        assert (await communicator.receive_output(5))['body'].startswith(b'id: 2\n')
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def test_unknown_tokens_are_unauthorized(self):
+        start = await self.start(self.connect(token='nope'))
+        assert start['status'] == 401
+        assert (b'www-authenticate', b'Token') in start['headers']
+
+    async def test_other_users_orders_are_not_found(self):
+        stranger = await sync_to_async(User.objects.create)(
+            username='stranger', phone='0700000002', role=User.CUSTOMER)
+        token = await sync_to_async(Token.objects.create)(user=stranger)
+        assert (await self.start(self.connect(token=token.key)))['status'] == 404
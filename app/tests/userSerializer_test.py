@@ -9,7 +9,6 @@ from rest_framework.test import APIRequestFactory
 from app.serializers import UserSerializer
 
 from .factories import (
-    DeliverySpeedFactory,
     LocationFactory,
     OrderFactory,
     PaymentFactory,
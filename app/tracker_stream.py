@@ -0,0 +1,284 @@
+"""
+Server-Sent Events stream of an order's trackers.
+
+GET /api/v1/orders/<order id>/trackers/stream is answered by the plain ASGI
+handler below, mounted in project/asgi.py next to Django, so an idle watcher
+costs a coroutine instead of a worker. The stream starts with the trackers
+written so far (after Last-Event-ID on reconnects) and then pushes every new
+one as it is committed.
+
+Django 3.2 can only stream a response from a thread, so the handler bypasses
+its middleware and authenticates on its own: with an API token in the
+Authorization header, or in ?token= for EventSource clients, which cannot set
+headers. Watchers see the orders OrderViewSet would show them, others get a
+404 and unknown tokens a 401.
+
+New trackers are published with Postgres NOTIFY and picked up by one LISTEN
+thread per process; on other databases (the SQLite test runs) they are
+handed to the in-process broker when the transaction commits.
+"""
+import asyncio
+import json
+import logging
+import re
+import select
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import (
+    close_old_connections,
+    connection,
+    connections,
+    transaction,
+)
+from django.db.models.signals import post_save
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+
+from .models import Order, OrderTracker
+from .serializers import OrderTrackerSerializer
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'order_trackers'
+STREAM_PATH = re.compile(r'^/api/v1/orders/(?P<pk>[0-9a-fA-F-]{36})/trackers/stream/?$')
+QUEUE_SIZE = 100
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+class Broker:
+    """Fans notifications out to the queues of the watchers of each order."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.watchers = defaultdict(set)
+
+    def subscribe(self, order_id):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self.lock:
+            self.watchers[order_id].add((asyncio.get_event_loop(), queue))
+        return queue
+
+    def unsubscribe(self, order_id, queue):
+        with self.lock:
+            self.watchers[order_id] = {w for w in self.watchers[order_id] if w[1] is not queue}
+            if not self.watchers[order_id]:
+                del self.watchers[order_id]
+
+    def dispatch(self, payload):
+        """Thread safe: queues a published payload for every watcher of its order."""
+        event = json.loads(payload)
+        with self.lock:
+            watchers = list(self.watchers.get(event['order'], ()))
+        for loop, queue in watchers:
+            loop.call_soon_threadsafe(offer, queue, event['tracker'])
+
+
+def offer(queue, tracker):
+    # a watcher this far behind reconnects and catches up from the database
+    if not queue.full():
+        queue.put_nowait(tracker)
+
+
+broker = Broker()
+
+
+class PostgresListener(threading.Thread):
+    """LISTENs on its own connection and hands notifications to the broker."""
+    daemon = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.listen()
+            except Exception:
+                logger.exception("tracker listener lost its connection")
+                self.stopped.wait(1)
+
+    def listen(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        if settings.DATABASE_DIRECT_URL:
+            # LISTEN is session state, which pgbouncer's transaction pooling does not keep
+            conn = psycopg2.connect(settings.DATABASE_DIRECT_URL)
+        else:
+            conn = psycopg2.connect(**connections['default'].get_connection_params())
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute('LISTEN ' + CHANNEL)
+            while not self.stopped.is_set():
+                if select.select([conn], [], [], 1) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    broker.dispatch(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = PostgresListener(name='order-tracker-listener')
+            _listener.start()
+
+
+def stop_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stopped.set()
+            _listener.join()
+            _listener = None
+
+
+def publish_tracker(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or instance.order_id is None:
+        return
+    payload = JSONRenderer().render({
+        'order': str(instance.order_id),
+        'tracker': OrderTrackerSerializer(instance).data,
+    }).decode()
+    if uses_postgres():
+        # delivered by Postgres when (and only if) the transaction commits
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+    else:
+        transaction.on_commit(lambda: broker.dispatch(payload))
+
+
+def trackers_after(order_id, number):
+    # runs outside Django's request cycle, which would otherwise close expired connections
+    close_old_connections()
+    try:
+        trackers = OrderTracker.objects.filter(order_id=order_id, number__gt=number)
+        trackers = trackers.order_by('number')
+        return OrderTrackerSerializer(trackers, many=True).data
+    finally:
+        close_old_connections()
+
+
+def token_key(scope):
+    headers = dict(scope.get('headers') or [])
+    words = headers.get(b'authorization', b'').decode('latin-1').split()
+    if len(words) == 2 and words[0].lower() == 'token':
+        return words[1]
+    return parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token', [None])[0]
+
+
+def watch_status(scope, order_id):
+    """200 if the request may watch the order, 401 for an unknown token, 404 otherwise."""
+    close_old_connections()
+    try:
+        user = AnonymousUser()
+        key = token_key(scope)
+        if key is not None:
+            try:
+                user, _ = TokenAuthentication().authenticate_credentials(key)
+            except AuthenticationFailed:
+                return 401
+        if not Order.objects.visible_to(user).filter(pk=order_id).exists():
+            return 404
+        return 200
+    finally:
+        close_old_connections()
+
+
+def sse_event(tracker):
+    data = JSONRenderer().render(tracker).decode()
+    return 'id: {}\nevent: tracker\ndata: {}\n\n'.format(tracker['number'], data).encode()
+
+
+def last_event_id(scope):
+    headers = dict(scope.get('headers') or [])
+    try:
+        return int(headers.get(b'last-event-id', b'0'))
+    except ValueError:
+        return 0
+
+
+async def send_body(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def send_empty(send, status, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': list(headers)})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def stream_order_trackers(scope, receive, send, order_id):
+    """ASGI handler for one watcher."""
+    if scope['method'] != 'GET':
+        await send_empty(send, 405, [(b'allow', b'GET')])
+        return
+    order_id = order_id.lower()
+    status = await sync_to_async(watch_status)(scope, order_id)
+    if status != 200:
+        await send_empty(send, status, [(b'www-authenticate', b'Token')] if status == 401 else [])
+        return
+    queue = broker.subscribe(order_id)
+    if uses_postgres():
+        ensure_listener()
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        sent = last_event_id(scope)
+        # subscribed first, so nothing written meanwhile falls between history and live events
+        for tracker in await sync_to_async(trackers_after)(order_id, sent):
+            await send_body(send, sse_event(tracker))
+            sent = tracker['number']
+
+        deadline = time.monotonic() + settings.TRACKER_STREAM_SECONDS
+        while not disconnected.done() and time.monotonic() < deadline:
+            next_tracker = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait([next_tracker, disconnected],
+                                         timeout=settings.TRACKER_STREAM_KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_tracker not in done:
+                next_tracker.cancel()
+                if not disconnected.done():
+                    await send_body(send, b': keepalive\n\n')
+                continue
+            tracker = next_tracker.result()
+            if tracker['number'] > sent:
+                await send_body(send, sse_event(tracker))
+                sent = tracker['number']
+        if not disconnected.done():
+            # clients reconnect on their own, carrying Last-Event-ID
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(order_id, queue)
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+post_save.connect(publish_tracker, sender=OrderTracker)
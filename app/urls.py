@@ -19,7 +19,8 @@ from .views import (
     ProductViewSet,
     ShopViewSet,
     StockViewSet,
-    UserViewSet, OrderTrackerViewSet, BeyonicWebhook, ContactViewSet,
+    UserViewSet, OrderTrackerViewSet, BeyonicWebhook, ContactViewSet, DatabaseConnectionMetrics,
+    PrometheusMetrics,
 )
 
 
@@ -58,6 +59,8 @@ schema_view = get_schema_view(
 urlpatterns = [
     re_path('^', include(router.urls)),
     path(r'beyonic_webhook', csrf_exempt(BeyonicWebhook.as_view()), name='beyonic webhook'),
+    path(r'metrics', PrometheusMetrics.as_view(), name='metrics'),
+    path(r'metrics/db', DatabaseConnectionMetrics.as_view(), name='database-metrics'),
 ]
 
 if settings.DEBUG:
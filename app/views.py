@@ -1,12 +1,18 @@
+import logging
+
+from django.http import HttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
-from rest_framework.permissions import AllowAny
+from rest_framework.filters import OrderingFilter
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
-from django.db.models import Q
 
 from .models import (
     Announcement,
+    BeyonicEvent,
     Category,
     District,
     Location,
@@ -22,6 +28,7 @@ from .models import (
 from .serializers import (
     AnnouncementSerializer,
     CategorySerializer,
+    CheckoutSerializer,
     DistrictSerializer,
     LocationSerializer,
     OrderItemSerializer,
@@ -33,23 +40,42 @@ from .serializers import (
     UserSerializer,
     OrderTrackerSerializer, ContactSerializer,
 )
-
-
-class UserViewSet(viewsets.ModelViewSet):
+from .bulk import BulkViewSetMixin
+from .catalog import CatalogCacheMixin
+from .db_connections import pool_settings, stats as connection_stats
+from .eta import estimate_delivery
+from .fieldsets import SparseFieldsViewSetMixin
+from .instrumentation import PROMETHEUS_CONTENT_TYPE, exposition
+from .pagination import KeysetPagination
+from .pricing import recompute_totals
+from .relations import RelatedCountViewSetMixin
+from .search import search_products
+from .soft_delete import SoftDeleteViewSetMixin
+from .stock import adjust_stock
+from .suggest import suggest
+from .webhooks import HasBeyonicWebhookSecret
+
+logger = logging.getLogger(__name__)
+
+
+class UserViewSet(SparseFieldsViewSetMixin, RelatedCountViewSetMixin,
+                  BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = []
     filterset_fields = ['id', 'dob', 'verified', 'phone', 'role', 'payments', 'orders']
 
 
-class DistrictViewSet(viewsets.ModelViewSet):
+class DistrictViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin, RelatedCountViewSetMixin,
+                      BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = District.objects.all()
     serializer_class = DistrictSerializer
     permission_classes = []
     filterset_fields = ['id', 'name', 'locations']
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                      BulkViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role == User.CUSTOMER:
@@ -62,28 +88,46 @@ class LocationViewSet(viewsets.ModelViewSet):
     filterset_fields = ['id', 'lat', 'lng', 'customer', 'district', 'is_active']
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin, CatalogCacheMixin,
+                      RelatedCountViewSetMixin, BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = []
     filterset_fields = ['id', 'name', 'description', 'products']
 
 
-class StockViewSet(viewsets.ModelViewSet):
+class StockViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                   BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
+    # reserve_stock locks stock rows in this order
+    bulk_lock_ordering = ('product_id', 'pk')
     permission_classes = []
     filterset_fields = ['id', 'units_in_stock', 'units_on_order', 'created_at', 'name', 'product']
 
+    @action(detail=True, methods=['post'])
+    def adjust(self, request, pk=None):
+        """Atomically adds (or with a negative value removes) {"units": n} from units_in_stock."""
+        try:
+            units = int(request.data['units'])
+        except (KeyError, TypeError, ValueError):
+            return Response({"units": ["A valid integer is required."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        adjust_stock(self.get_object().pk, units)
+        stock = Stock.objects.get(pk=pk)
+        return Response(self.get_serializer(stock).data)
+
 
-class ShopViewSet(viewsets.ModelViewSet):
+class ShopViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin, CatalogCacheMixin,
+                  BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = Shop.objects.all()
     serializer_class = ShopSerializer
     permission_classes = []
     filterset_fields = ['id', 'name', 'is_special', 'products']
 
 
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                     BulkViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role == User.CUSTOMER:
@@ -96,55 +140,104 @@ class ContactViewSet(viewsets.ModelViewSet):
     filterset_fields = ['id', 'customer', 'is_active', 'phone']
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin, CatalogCacheMixin,
+                     BulkViewSetMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.defer('search_vector')
     serializer_class = ProductSerializer
     permission_classes = []
     filterset_fields = ['id', 'name', 'expiry_date', 'weight', 'discount',
                         'description', 'color', 'price', 'stocks', 'orderitems', 'category', 'shop']
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over product, category and shop names and descriptions, best first."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"q": ["This query parameter is required."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(search_products(
+            query, self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Typeahead: products and shops whose names (or later words of them) start with q."""
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({"limit": ["A valid integer is required."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(suggest(request.query_params.get('q', ''), limit))
+
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                     BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
     permission_classes = []
     filterset_fields = ['id', 'created_at', 'paid_at', 'amount', 'status', 'customer', 'order']
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                   BulkViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
-        user = self.request.user
-        try:
-            if user.role == User.CUSTOMER:
-                return Order.objects.filter(Q(customer=user) | Q(is_curated_list=True))
-            if user.role in [User.DEVELOPER, User.ADMIN]:
-                return Order.objects.all()
-            return Order.objects.filter(is_curated_list=True)
-        except Exception as e:
-            print(e)
-            return Order.objects.filter(is_curated_list=True)
+        return Order.objects.with_related().visible_to(self.request.user)
 
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
     permission_classes = []
-    filterset_fields = ['id', 'created_at', 'status', 'valid', 'delivery_method', 'expected_delivery_date_time',
-                        'delivery_date_time', 'total_amount', 'payments', 'driver', 'location', 'delivery_speed']
-
-
-class OrderItemViewSet(viewsets.ModelViewSet):
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['id', 'created_at', 'status', 'valid', 'delivery_method',
+                        'expected_delivery_date_time', 'delivery_date_time', 'total_amount',
+                        'payments', 'driver', 'location', 'delivery_speed',
+                        'current_tracker_number', 'current_tracker_name']
+    ordering_fields = ['created_at', 'current_tracker_number']
+
+    @action(detail=False, methods=['post'], serializer_class=CheckoutSerializer,
+            permission_classes=[IsAuthenticated])
+    def checkout(self, request):
+        """Places an order, its items, payment and first tracker in a single request."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        order = Order.objects.with_related().get(pk=order.pk)
+        return Response(OrderSerializer(order, context=self.get_serializer_context()).data,
+                        status=status.HTTP_201_CREATED)
+
+    def perform_bulk_create(self, orders):
+        # what OrderSerializer.create and save do for one order
+        for order in orders:
+            if not order.expected_delivery_date_time:
+                order.expected_delivery_date_time = estimate_delivery(
+                    order.location, order.delivery_method, order.delivery_speed)
+        super().perform_bulk_create(orders)
+        recompute_totals(Order.objects.filter(pk__in=[order.pk for order in orders]))
+
+    def perform_bulk_update(self, orders, validated, fields):
+        super().perform_bulk_update(orders, validated, fields)
+        recompute_totals(Order.objects.filter(pk__in=[order.pk for order in orders]))
+
+
+class OrderItemViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                       BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
+    pagination_class = KeysetPagination
     permission_classes = []
     filterset_fields = ['id', 'units', 'valid', 'product']
 
 
-class OrderTrackerViewSet(viewsets.ModelViewSet):
+class OrderTrackerViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                          BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = OrderTracker.objects.all()
     serializer_class = OrderTrackerSerializer
     permission_classes = []
     filterset_fields = ['name', 'order']
 
 
-class AnnouncementViewSet(viewsets.ModelViewSet):
+class AnnouncementViewSet(SparseFieldsViewSetMixin, SoftDeleteViewSetMixin,
+                          BulkViewSetMixin, viewsets.ModelViewSet):
     queryset = Announcement.objects.all()
     serializer_class = AnnouncementSerializer
     permission_classes = []
@@ -152,14 +245,34 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
 
 
 class BeyonicWebhook(APIView):
-    permission_classes = [AllowAny]
+    permission_classes = [HasBeyonicWebhookSecret]
 
     def post(self, request, format=None):
+        """
+        Stores the delivery in the BeyonicEvent inbox and acknowledges it at once.
+        The process_beyonic_events command applies it to the payment and order tracker.
+        """
         try:
-            print('webhook reached')
-            print(request.data)
-            # todo update ordertracker status to 3(goods purchased)
-            return Response('ACCEPT ' + request.data['remote_transaction_id'], status=status.HTTP_201_CREATED)
-        except Exception as e:
-            print(e)
+            remote_transaction_id = str(request.data['remote_transaction_id'])
+            BeyonicEvent.objects.create(
+                remote_transaction_id=remote_transaction_id, payload=request.data)
+            return Response('ACCEPT ' + remote_transaction_id, status=status.HTTP_201_CREATED)
+        except Exception:
+            logger.exception("rejected Beyonic webhook delivery")
         return Response({"error": 400}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DatabaseConnectionMetrics(APIView):
+    """Connection reuse of this worker process since it started, with its pool settings."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(dict(connection_stats.as_dict(), **pool_settings()))
+
+
+class PrometheusMetrics(APIView):
+    """The request histograms and connection counters of this worker process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return HttpResponse(exposition(), content_type=PROMETHEUS_CONTENT_TYPE)
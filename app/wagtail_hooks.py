@@ -56,8 +56,8 @@ class OrderAdmin(ModelAdmin):
     menu_order = 500
     add_to_settings_menu = False
     exclude_from_explorer = False
-    list_display = ("order_tracking_number", "valid", "created_at")
-    list_filter = ("customer",)
+    list_display = ("order_tracking_number", "valid", "current_tracker_name", "created_at")
+    list_filter = ("customer", "current_tracker_name")
     search_fields = ("customer",)
 
 
@@ -0,0 +1,124 @@
+"""
+Beyonic webhook inbox processing.
+
+BeyonicWebhook only appends a BeyonicEvent and answers ACCEPT, so Beyonic never
+waits on (or retries because of) our database work. Deliveries must carry
+BEYONIC_WEBHOOK_SECRET as their basic auth password, which Beyonic sends
+when BEYONIC_CALLBACK_URL is https://beyonic:<secret>@host/api/v1/beyonic_webhook.
+
+process_events() then applies the events in batches: duplicates of an
+already applied remote_transaction_id are skipped and the collection status
+is copied to the payment. A successful collection marks it paid and gives
+the order its "Goods Purchased" tracker. An event that cannot be applied is
+recorded with its error and never blocks the rest of the inbox.
+"""
+import base64
+import binascii
+import hmac
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.permissions import BasePermission
+
+from .models import BeyonicEvent, OrderTracker, Payment
+from .stock import confirm_stock
+
+logger = logging.getLogger(__name__)
+
+# Beyonic collection statuses that settle a payment, the others (new, pending,
+# instructions_sent) are recorded and ignored
+PAYMENT_STATUSES = {
+    'successful': Payment.PAID,
+    'failed': Payment.FAILED,
+    'reversed': Payment.FAILED,
+    'cancelled': Payment.CANCELLED,
+    'expired': Payment.EXPIRED,
+}
+
+
+class HasBeyonicWebhookSecret(BasePermission):
+    """The basic auth password of the delivery is BEYONIC_WEBHOOK_SECRET, which must be set."""
+
+    def has_permission(self, request, view):
+        secret = settings.BEYONIC_WEBHOOK_SECRET
+        scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if not secret or scheme.lower() != 'basic':
+            return False
+        try:
+            password = base64.b64decode(credentials).decode('utf-8').partition(':')[2]
+        except (binascii.Error, UnicodeDecodeError):
+            return False
+        return hmac.compare_digest(password.encode('utf-8'), secret.encode('utf-8'))
+
+
+def payment_id(payload):
+    """We send {'payment_id': ...} as collection request metadata, Beyonic echoes it back."""
+    for container in (payload, payload.get('data') or {}):
+        metadata = container.get('metadata') or {}
+        if metadata.get('payment_id'):
+            return metadata['payment_id']
+    return None
+
+
+def collection_status(payload):
+    for container in (payload, payload.get('data') or {}):
+        if container.get('status'):
+            return str(container['status']).lower()
+    return None
+
+
+def apply_event(event):
+    status = PAYMENT_STATUSES.get(collection_status(event.payload))
+    if status is None:
+        raise LookupError('Unsettled collection status {}'.format(
+            collection_status(event.payload)))
+    payment = Payment.objects.filter(pk=payment_id(event.payload)).select_related('order').first()
+    if payment is None:
+        raise LookupError('No payment for ' + event.remote_transaction_id)
+    if status != Payment.PAID:
+        if payment.status == Payment.PAID:
+            raise LookupError('Payment {} is already paid'.format(payment.pk))
+        payment.status = status
+        payment.save(update_fields=['status', 'updated_at'])
+        return
+
+    if payment.status != Payment.PAID:
+        payment.status = Payment.PAID
+        payment.paid_at = timezone.now()
+        payment.save(update_fields=['status', 'paid_at', 'updated_at'])
+    OrderTracker.objects.get_or_create(
+        order=payment.order, number=OrderTracker.GOODS_PURCHASED,
+        defaults={'name': OrderTracker.STAGE_NAMES[OrderTracker.GOODS_PURCHASED]},
+    )
+    confirm_stock(payment.order)
+
+
+def process_events(batch_size=100):
+    """Applies one batch of pending events and returns how many were handled."""
+    with transaction.atomic():
+        # skip_locked lets several workers drain the inbox side by side on Postgres
+        events = list(BeyonicEvent.objects.select_for_update(skip_locked=True).filter(
+            processed_at__isnull=True).order_by('created_at')[:batch_size])
+        applied = set(BeyonicEvent.objects.filter(
+            remote_transaction_id__in={event.remote_transaction_id for event in events},
+            processed_at__isnull=False, error__isnull=True,
+        ).values_list('remote_transaction_id', flat=True))
+        for event in events:
+            event.processed_at = timezone.now()
+            if event.remote_transaction_id in applied:
+                event.error = 'duplicate'
+                continue
+            try:
+                with transaction.atomic():
+                    apply_event(event)
+                applied.add(event.remote_transaction_id)
+            except (LookupError, ValidationError) as e:
+                event.error = str(e)[:255]
+            except Exception as e:
+                logger.exception("failed to apply Beyonic event %s", event.pk)
+                event.error = '{}: {}'.format(type(e).__name__, e)[:255]
+        BeyonicEvent.objects.bulk_update(events, ['processed_at', 'error'])
+    return len(events)
@@ -0,0 +1,18 @@
+"""
+gunicorn settings for the Procfile, the Dockerfile and `make run`.
+
+SERVER_MODE=asgi serves project.asgi with uvicorn workers: the async read
+views and the order tracker streams. The default serves project.wsgi with
+sync workers, GUNICORN_THREADS threads each. project/settings.py sizes the
+database connection pool of a worker from the same variables.
+"""
+import os
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'project.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'project.wsgi:application'
+    threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
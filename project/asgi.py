@@ -12,5 +12,18 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+os.environ.setdefault('SERVER_MODE', 'asgi')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once Django is set up
+from app.tracker_stream import STREAM_PATH, stream_order_trackers  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Django, except for the order tracker event streams which are served without a thread."""
+    if scope['type'] == 'http':
+        match = STREAM_PATH.match(scope['path'])
+        if match:
+            return await stream_order_trackers(scope, receive, send, match.group('pk'))
+    return await django_application(scope, receive, send)
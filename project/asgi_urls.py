@@ -0,0 +1,10 @@
+"""URLconf of the ASGI application: the async read views in front of project.urls."""
+from django.urls import include, path
+
+from app import async_views
+
+from . import urls
+
+urlpatterns = [
+    path('api/v1/', include(async_views.urlpatterns)),
+] + urls.urlpatterns
@@ -7,6 +7,7 @@ import sys
 from distutils.util import strtobool
 from pathlib import Path
 import cloudinary
+import dj_database_url
 import cloudinary_storage
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,7 +47,8 @@ INSTALLED_APPS = [
     'djoser',
 ]
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'app.middleware.WhiteNoiseMiddleware',
+    'app.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,7 +58,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'project.urls'
+# wsgi or asgi, see gunicorn.conf.py. Over ASGI project.asgi_urls adds the async views
+SERVER_MODE = os.environ.get('SERVER_MODE', default='wsgi')
+ROOT_URLCONF = 'project.asgi_urls' if SERVER_MODE == 'asgi' else 'project.urls'
 
 TEMPLATES = [
     {
@@ -92,9 +96,87 @@ DATABASES = {
     }
 }
 
+# DATABASE_URL (set by Heroku) takes precedence over the DATABASE_* variables
+if 'DATABASE_URL' in os.environ:
+    DATABASES['default'] = dj_database_url.parse(
+        os.environ['DATABASE_URL'],
+        ssl_require=bool(strtobool(os.environ.get('DATABASE_SSL_REQUIRE', default='True'))))
+
+# every test process, each `test --parallel` worker included, runs on its own in-memory SQLite
+# database restored from a cached snapshot of the migrated schema, see project/test_runner.py
+TEST_SCHEMA_CACHE = os.environ.get('TEST_SCHEMA_CACHE', default=BASE_DIR.parent / '.test_schema')
 if 'test' in sys.argv or 'test_coverage' in sys.argv:
-    DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
-    DATABASES['default']['NAME'] = BASE_DIR / 'konvdb'
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'konvdb',
+        # no test uses serialized_rollback
+        'TEST': {'SERIALIZE': False},
+    }
+    TEST_RUNNER = 'project.test_runner.SnapshotTestRunner'
+
+# seconds a thread keeps its connection between requests (0 closes it after every request), and
+# whether a kept connection is checked before the next request uses it, see app/db_connections.py
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', default=600))
+DATABASE_HEALTH_CHECKS = bool(strtobool(os.environ.get('DATABASE_HEALTH_CHECKS', default='True')))
+DATABASES['default']['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+# True when the database is reached through pgbouncer in transaction pooling mode: consecutive
+# transactions may run on different server connections, so there are no server side (named)
+# cursors, and the order tracker LISTEN connects to DATABASE_DIRECT_URL instead
+DATABASE_PGBOUNCER = bool(strtobool(os.environ.get('DATABASE_PGBOUNCER', default='False')))
+DATABASE_DIRECT_URL = os.environ.get('DATABASE_DIRECT_URL')
+if DATABASE_PGBOUNCER:
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# gunicorn workers and threads per sync worker, also read by gunicorn.conf.py. Every thread holds
+# its own connection, so the DATABASE_MAX_CONNECTIONS this app may open (the database's or
+# pgbouncer's limit) are split evenly into a pool of DATABASE_POOL_SIZE per worker.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', default=2))
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', default=1))
+DATABASE_MAX_CONNECTIONS = int(os.environ.get('DATABASE_MAX_CONNECTIONS', default=20))
+DATABASE_POOL_SIZE = max(1, DATABASE_MAX_CONNECTIONS // WEB_CONCURRENCY)
+
+# Cache
+# The catalog cache must be shared between workers in production, e.g.
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache CACHE_LOCATION=127.0.0.1:11211
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND',
+                                  default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', default=''),
+    }
+}
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', default=60 * 60 * 24))
+# seconds the catalog version lives in a LocMemCache, after which every worker sees the writes
+# of the others, see app/catalog.py; a shared cache keeps it until the next write
+CATALOG_VERSION_TIMEOUT = int(os.environ.get('CATALOG_VERSION_TIMEOUT', default=30))
+
+# minutes an unpaid order holds its reserved stock
+STOCK_RESERVATION_MINUTES = int(os.environ.get('STOCK_RESERVATION_MINUTES', default=30))
+
+# (lat, lng) deliveries leave from, used for ETAs
+DELIVERY_ORIGIN = (float(os.environ.get('DELIVERY_ORIGIN_LAT', default=0.3476)),
+                   float(os.environ.get('DELIVERY_ORIGIN_LNG', default=32.5825)))
+# seconds before the in memory district distance matrix is rebuilt
+ETA_MATRIX_SECONDS = int(os.environ.get('ETA_MATRIX_SECONDS', default=60 * 60))
+# upper bound on the entries (names and name words) of the in memory typeahead index
+SUGGEST_MAX_ENTRIES = int(os.environ.get('SUGGEST_MAX_ENTRIES', default=200000))
+# seconds before a process rebuilds its typeahead index to see the product and shop writes of others
+SUGGEST_INDEX_SECONDS = int(os.environ.get('SUGGEST_INDEX_SECONDS', default=5 * 60))
+# days soft deleted rows are kept before purge_soft_deleted removes them
+SOFT_DELETE_RETENTION_DAYS = int(os.environ.get('SOFT_DELETE_RETENTION_DAYS', default=30))
+# seconds an order tracker stream stays open (clients reconnect) and between keepalives
+TRACKER_STREAM_SECONDS = int(os.environ.get('TRACKER_STREAM_SECONDS', default=15 * 60))
+TRACKER_STREAM_KEEPALIVE = int(os.environ.get('TRACKER_STREAM_KEEPALIVE', default=15))
+# threads (and so database connections) per ASGI worker for the async views, by default the
+# worker's pool less the connection of Django's own sync thread
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', default=max(1, DATABASE_POOL_SIZE - 1)))
+# seconds of requests the instrumentation histograms cover, and the queries a request may run
+# before it is logged (views can set their own query_budget)
+INSTRUMENTATION_WINDOW_SECONDS = int(os.environ.get('INSTRUMENTATION_WINDOW_SECONDS',
+                                                    default=5 * 60))
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', default=20))
+# rows one request to the /bulk endpoints may create, update or delete, see app/bulk.py
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', default=5000))
 
 AUTH_USER_MODEL = "app.User"
 
@@ -135,7 +217,8 @@ USE_TZ = True
 
 STATIC_URL = os.environ.get('STATIC_URL', default='/static/')
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-STATIC_ROOT = os.path.join(PROJECT_ROOT, 'staticfiles')
+# where django_heroku used to put it, collectstatic and WhiteNoise rely on it
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Extra lookup directories for collectstatic to find static files
 STATICFILES_DIRS = (
@@ -192,6 +275,18 @@ CSRF_COOKIE_SECURE = os.environ.get('CSRF_COOKIE_SECURE', default=False)
 SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', default=False)
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', default='#um2g($a1-#2d(enmn!3pmg6axus*wbip_y#p!ezs0*$)(^!^o')
 BEYONIC_KEY = os.environ.get('BEYONIC_KEY', default='#um2g($afoobar')
+BEYONIC_API_BASE = os.environ.get('BEYONIC_API_BASE', default='https://app.beyonic.com/api/')
+# Beyonic sends the basic auth credentials of the callback url with every delivery, and the
+# webhook accepts only the password BEYONIC_WEBHOOK_SECRET, so the url should look like
+# https://beyonic:<secret>@host/api/v1/beyonic_webhook
+BEYONIC_CALLBACK_URL = os.environ.get('BEYONIC_CALLBACK_URL',
+                                      default='https://my.website/payments/callback')
+BEYONIC_WEBHOOK_SECRET = os.environ.get('BEYONIC_WEBHOOK_SECRET', default='')
+# outgoing collection requests: parallel sends, and retries backing off from BASE seconds
+# up to MAX_ATTEMPTS tries
+BEYONIC_CONCURRENCY = int(os.environ.get('BEYONIC_CONCURRENCY', default=8))
+BEYONIC_RETRY_BASE_SECONDS = int(os.environ.get('BEYONIC_RETRY_BASE_SECONDS', default=5))
+BEYONIC_MAX_ATTEMPTS = int(os.environ.get('BEYONIC_MAX_ATTEMPTS', default=8))
 ENV_ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS')
 # ALLOWED_HOSTS = ENV_ALLOWED_HOSTS.split(',') if ENV_ALLOWED_HOSTS is not None else []
 ALLOWED_HOSTS = ['*']
@@ -203,6 +298,8 @@ WSGI_APPLICATION = 'project.wsgi.application'
 try:
     import django_heroku
 
-    django_heroku.settings(locals())
+    # the database and static files are configured above, django_heroku would replace the
+    # connection settings and prepend the stock, sync only WhiteNoise middleware
+    django_heroku.settings(locals(), databases=False, staticfiles=False)
 except Exception as e:
     print(e)
@@ -0,0 +1,116 @@
+"""
+Test runner that restores SQLite test databases from a schema snapshot.
+
+Running every migration takes most of the suite's setup. The first run
+migrates a file database once and keeps it in TEST_SCHEMA_CACHE, named
+after a hash of all the migration files, so it is rebuilt only when a
+migration changes. Every test process restores that snapshot into its own
+in-memory database with SQLite's backup API. That includes each
+`test --parallel` worker, which therefore shares no database file with the
+others. Other database engines are set up by DiscoverRunner as usual,
+with a cloned test database per worker.
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.migrations.loader import MigrationLoader
+from django.test.runner import DiscoverRunner, ParallelTestSuite
+from django.test.runner import _init_worker as init_clone_worker
+
+# alias -> snapshot restored by the parallel workers, set before they fork
+snapshots = {}
+
+
+def schema_fingerprint():
+    digest = hashlib.sha1(django.get_version().encode())
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    for key, migration in sorted(loader.disk_migrations.items()):
+        digest.update(repr(key).encode())
+        digest.update(Path(sys.modules[migration.__module__].__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def build_snapshot(connection, path, verbosity):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # concurrent runs each migrate their own file, the last rename wins
+    building = path.with_name('{}.{}'.format(path.name, os.getpid()))
+    if building.exists():
+        building.unlink()
+    connection.close()
+    connection.settings_dict['NAME'] = str(building)
+    call_command('migrate', verbosity=max(verbosity - 1, 0), interactive=False,
+                 database=connection.alias, run_syncdb=True)
+    call_command('createcachetable', database=connection.alias)
+    connection.close()
+    os.replace(building, path)
+    for stale in path.parent.glob('{}-*.sqlite3'.format(connection.alias)):
+        if stale != path:
+            stale.unlink()
+
+
+def get_snapshot(connection, verbosity):
+    path = Path(settings.TEST_SCHEMA_CACHE) / '{}-{}.sqlite3'.format(
+        connection.alias, schema_fingerprint())
+    if not path.exists():
+        if verbosity >= 1:
+            print("Migrating the schema snapshot {}...".format(path))
+        build_snapshot(connection, path, verbosity)
+    return path
+
+
+def restore_snapshot(connection, snapshot, name):
+    # close() leaves in-memory databases open
+    BaseDatabaseWrapper.close(connection)
+    settings.DATABASES[connection.alias]['NAME'] = name
+    connection.settings_dict['NAME'] = name
+    connection.ensure_connection()
+    source = sqlite3.connect(str(snapshot))
+    try:
+        source.backup(connection.connection)
+    finally:
+        source.close()
+
+
+def memory_database_name(alias, worker=None):
+    suffix = alias if worker is None else '{}_{}'.format(alias, worker)
+    return 'file:memorydb_{}?mode=memory&cache=shared'.format(suffix)
+
+
+def init_snapshot_worker(counter):
+    init_clone_worker(counter)
+    from django.test import runner
+    for alias, snapshot in snapshots.items():
+        restore_snapshot(connections[alias], snapshot,
+                         memory_database_name(alias, runner._worker_id))
+
+
+class SnapshotParallelTestSuite(ParallelTestSuite):
+    init_worker = init_snapshot_worker
+
+
+class SnapshotTestRunner(DiscoverRunner):
+    parallel_test_suite = SnapshotParallelTestSuite
+
+    def setup_databases(self, aliases=None, **kwargs):
+        aliases = list(aliases or connections)
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            return super().setup_databases(aliases=aliases, **kwargs)
+        old_config = []
+        for alias in aliases:
+            connection = connections[alias]
+            old_config.append((connection, connection.settings_dict['NAME'], True))
+            with self.time_keeper.timed("  Restoring '{}'".format(alias)):
+                snapshots[alias] = get_snapshot(connection, self.verbosity)
+                restore_snapshot(connection, snapshots[alias], memory_database_name(alias))
+                if connection.settings_dict['TEST'].get('SERIALIZE', True):
+                    connection._test_serialized_contents = (
+                        connection.creation.serialize_db_to_string())
+        return old_config